@@ -0,0 +1,201 @@
+"""
+VIX / 回撤 / PE 策略的历史回测
+
+- 用与每日提醒相同的条件（signal_engine），对几十年的日线一次性整表计算每日档位
+- 计算各档位出现后 N 个交易日的远期收益、胜率（收益>0的比例）和命中率
+  （收益方向与规则表中档位的 direction 一致的比例，如加仓类收益>0、减仓收益<0）
+- 阈值网格扫描：回撤只计算一次，各组阈值在进程池中并行评估
+- 月度PE按月末（数值确定的日期）对齐到交易日，不提前使用当月的PE
+"""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from signal_engine import WINDOW, _as_column, _resolve_rules, compute_conditions, rolling_pullback
+
+
+DEFAULT_HORIZONS = (5, 20, 60)
+
+BACKTEST_CACHE_DIR = os.path.join(os.environ.get('MARKET_CACHE_DIR', '.market_cache'), 'backtest')
+
+
+def lag_monthly(values):
+    """
+    把月度观测值的日期从月初移到月末，避免回测中的前视偏差
+    multpl.com 的月度历史以每月1日标注，但数值（当月均价 / 过去12个月盈利）要到月末才确定，
+    直接按1日向前填充会在当月提前用到尚未公布的PE；非月初日期的观测值（如每日记录的最新值）当天即可获得，保持不变
+    :param values: 按日期的序列；标量或数组原样返回
+    """
+    if not isinstance(values, pd.Series):
+        return values
+    index = pd.DatetimeIndex(values.index)
+    lagged = index.where(index.day != 1, index + pd.offsets.MonthEnd(0))
+    return pd.Series(values.to_numpy(), index=lagged, name=values.name).sort_index(kind='stable')
+
+
+def forward_returns(prices, horizons=DEFAULT_HORIZONS):
+    """各持有期的远期收益（百分比），{持有期: 日期 × 代码 数组}；末尾不足持有期的位置为 NaN"""
+    values = prices.to_numpy(dtype='float64')
+    result = {}
+    for horizon in horizons:
+        future = np.full_like(values, np.nan)
+        if horizon < len(values):
+            future[:-horizon] = values[horizon:]
+        result[horizon] = (future / values - 1) * 100
+    return result
+
+
+def summarize(tiers, forward, rules=None):
+    """
+    按档位汇总远期收益
+    :param tiers: 日期 × 代码 的档位编号数组
+    :param forward: forward_returns 的结果
+    :param rules: 产生 tiers 的 CompiledRules，默认 DEFAULT_RULES
+    :return: DataFrame，每行一个 (档位, 持有期)，列为 signals/mean_return/median_return/win_rate/hit_rate
+    """
+    rules = _resolve_rules(rules)
+    rows = []
+    for tier, label in enumerate(rules.labels):
+        mask = tiers == tier
+        direction = rules.directions[tier]
+        for horizon, returns in forward.items():
+            selected = returns[mask]
+            selected = selected[~np.isnan(selected)]
+            count = len(selected)
+            rows.append({
+                'tier': tier,
+                'advice': label,
+                'horizon': horizon,
+                'signals': count,
+                'mean_return': selected.mean() if count else np.nan,
+                'median_return': np.median(selected) if count else np.nan,
+                'win_rate': (selected > 0).mean() if count else np.nan,
+                'hit_rate': (np.sign(selected) == direction).mean() if count and direction else np.nan,
+            })
+    return pd.DataFrame(rows)
+
+
+def run_backtest(prices, vix, pe, horizons=DEFAULT_HORIZONS, window=WINDOW, thresholds=None, rules=None):
+    """
+    回测策略
+    :param prices: 日期 × 代码 的收盘价宽表
+    :param vix: 按日期的 VIX 序列
+    :param pe: 按日期的 PE 序列（如月度历史，月初日期的观测值移到月末后按日期向前对齐，见 lag_monthly）或标量
+    :return: (signals, stats)
+             signals: 非"持有"档位的每日信号，列为 date/symbol/close/pullback/tier/advice/fwd_<N>
+             stats: summarize 的结果
+    """
+    rules = _resolve_rules(rules, thresholds)
+    _, pullback = rolling_pullback(prices, window)
+    tiers = rules.classify(compute_conditions(pullback, vix, lag_monthly(pe), rules=rules))
+    forward = forward_returns(prices, horizons)
+
+    rows, cols = np.nonzero(tiers != rules.hold)
+    signals = pd.DataFrame({
+        'date': prices.index[rows],
+        'symbol': prices.columns[cols],
+        'close': prices.to_numpy()[rows, cols],
+        'pullback': pullback.to_numpy()[rows, cols],
+        'tier': tiers[rows, cols],
+    })
+    signals['advice'] = np.asarray(rules.labels, dtype=object)[signals['tier'].to_numpy()]
+    for horizon, returns in forward.items():
+        signals[f'fwd_{horizon}'] = returns[rows, cols]
+
+    return signals, summarize(tiers, forward, rules)
+
+
+# 进程池中每个工作进程持有一份回撤、远期收益等数据，避免每组阈值重复传输
+_SWEEP_DATA = None
+
+
+def _init_sweep(data):
+    global _SWEEP_DATA
+    _SWEEP_DATA = data
+
+
+def _evaluate_thresholds(thresholds):
+    rules, pullback, vix, pe, forward = _SWEEP_DATA
+    rules = rules.with_params(thresholds)
+    stats = summarize(rules.classify(compute_conditions(pullback, vix, pe, rules=rules)), forward, rules)
+    return stats.assign(**thresholds)
+
+
+def sweep_thresholds(prices, vix, pe, grid, horizons=DEFAULT_HORIZONS, window=WINDOW, max_workers=None,
+                     rules=None):
+    """
+    阈值网格扫描
+    :param grid: {阈值名: 候选值列表}，阈值名为规则表 params 中的名称
+                 例：{'vix_low': range(20, 31, 5), 'vix_high': range(30, 46, 5)}
+                 下限不小于上限的组合（条件区间为空）会被跳过
+    :param max_workers: 进程数；为 1 时在当前进程中顺序计算
+    :param rules: 被扫描的 CompiledRules，默认 DEFAULT_RULES
+    :return: DataFrame，每组阈值 × 档位 × 持有期一行
+    """
+    rules = _resolve_rules(rules)
+    unknown = set(grid) - set(rules.params)
+    if unknown:
+        raise ValueError(f"未知的阈值: {sorted(unknown)}")
+
+    keys = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+    # 跳过上下限颠倒的组合（如 vix_low >= vix_high），否则结果里全是永远不出现的档位
+    valid = [thresholds for thresholds in combos if not rules.with_params(thresholds).empty_conditions()]
+    if not valid:
+        raise ValueError("阈值网格中没有有效的组合（各条件的下限均不小于上限）")
+    if len(valid) < len(combos):
+        print(f"跳过 {len(combos) - len(valid)} 组上下限颠倒的阈值")
+    combos = valid
+    _, pullback = rolling_pullback(prices, window)
+    # VIX、PE 预先对齐到交易日，各组阈值只需做比较运算
+    data = (rules, pullback, _as_column(vix, pullback.index), _as_column(lag_monthly(pe), pullback.index),
+            forward_returns(prices, horizons))
+
+    if max_workers == 1:
+        _init_sweep(data)
+        results = [_evaluate_thresholds(thresholds) for thresholds in combos]
+    else:
+        workers = max_workers or os.cpu_count() or 1
+        chunksize = max(1, len(combos) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep, initargs=(data,)) as executor:
+            results = list(executor.map(_evaluate_thresholds, combos, chunksize=chunksize))
+
+    return pd.concat(results, ignore_index=True)[keys + list(results[0].columns.drop(keys))]
+
+
+def main(start='1993-01-29', symbols=("SPY",), horizons=DEFAULT_HORIZONS):
+    """
+    下载（或读取缓存）历史日线和 PE 历史，输出默认阈值的回测结果和 VIX × 回撤 阈值网格
+    """
+    from market_data import get_daily_closes, get_sp500_pe_history
+
+    lookback_days = (pd.Timestamp.now().normalize() - pd.Timestamp(start)).days
+    closes = get_daily_closes(list(symbols) + ["^VIX"], lookback_days=lookback_days,
+                              cache_dir=BACKTEST_CACHE_DIR, max_history_days=lookback_days)
+    vix = closes.pop("^VIX").dropna()
+    prices = closes.dropna(how='all')
+    pe = get_sp500_pe_history()
+
+    print(f"回测区间: {prices.index[0].strftime('%Y-%m-%d')} ~ {prices.index[-1].strftime('%Y-%m-%d')}，"
+          f"{len(prices)} 个交易日，{prices.shape[1]} 个代码")
+
+    signals, stats = run_backtest(prices, vix, pe, horizons)
+    print("\n--- 默认阈值 ---")
+    print(stats[stats['signals'] > 0].to_string(index=False))
+    print(f"\n最近的信号:\n{signals.tail(10).to_string(index=False)}")
+
+    # 上下限成对扫描，颠倒的组合由 sweep_thresholds 跳过
+    grid = {'vix_low': range(20, 31, 5), 'vix_high': range(30, 46, 5),
+            'pullback_mid': range(10, 21, 5), 'pullback_high': range(15, 31, 5)}
+    sweep = sweep_thresholds(prices, vix, pe, grid, horizons)
+    # 大量加仓档取决于 vix_high/pullback_high，适度加仓档取决于全部四个阈值
+    best = sweep[sweep['tier'].isin([0, 1]) & (sweep['signals'] > 0)]
+    print("\n--- 阈值网格（大量加仓、适度加仓档） ---")
+    print(best.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
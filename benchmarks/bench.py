@@ -0,0 +1,200 @@
+"""
+离线基准测试：通过本地替身服务器回放录制（或合成）的数据，统计各阶段耗时和内存峰值
+
+阶段：
+- fetch      并发抓取列表页并提取IPO表格行（本地HTTP，冷缓存 / 热缓存，见 http_cache）
+- parse      parse_ipo_data
+- normalize  normalize_ipo_data
+- write      更新本地IPO库CSV、追加Parquet历史库
+- crawl      流式抓取（获取 -> 解析 -> 分块写入本地库和历史库，自动识别末页），内存峰值应与页数无关
+- enrich     新股上市后第1/5/20/60日表現（回放 yf.download，按上市季度批量下载，冷缓存 / 热缓存）
+- pe         获取 S&P 500 PE（本地HTTP，冷缓存）
+- market     获取多代码日线（回放 yf.download，冷缓存 / 热缓存）
+- signal     多代码信号计算
+
+用法：
+    python benchmarks/bench.py                          # 默认规模（11页、500个代码）
+    python benchmarks/bench.py --pages 1000 --symbols 10000
+    python benchmarks/bench.py --json bench.json        # 同时输出JSON，便于比较前后结果
+    python benchmarks/bench.py --record                 # 联网录制真实页面到 benchmarks/fixtures/
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fixtures  # noqa: E402
+import hk_ipo_scraper  # noqa: E402
+import http_cache  # noqa: E402
+import ipo_prices  # noqa: E402
+import market_data  # noqa: E402
+import valuation  # noqa: E402
+from signal_engine import compute_signal_panel  # noqa: E402
+
+
+class StageTimer:
+    """记录每个阶段的耗时、Python堆内存峰值（tracemalloc，不含lxml等C扩展的内存）和处理量"""
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.results = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        info = {'stage': name, 'items': None}
+        if self.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            # 被测函数的进度输出会干扰计时，统一屏蔽
+            with contextlib.redirect_stdout(io.StringIO()):
+                yield info
+        finally:
+            info['seconds'] = time.perf_counter() - start
+            if self.memory:
+                info['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1e6
+                tracemalloc.stop()
+            self.results.append(info)
+
+    def report(self):
+        print(f"{'stage':<14}{'seconds':>10}{'peak MB':>10}{'items':>10}")
+        for r in self.results:
+            peak = f"{r['peak_mb']:.1f}" if 'peak_mb' in r else '-'
+            items = r['items'] if r['items'] is not None else ''
+            print(f"{r['stage']:<14}{r['seconds']:>10.3f}{peak:>10}{items:>10}")
+
+
+def run(pages=11, rows=20, symbols=500, days=800, latency=0.0, max_workers=8, memory=True):
+    timer = StageTimer(memory)
+    page_html = fixtures.ipo_pages(pages, rows)
+    pe_html = fixtures.pe_table_html()
+    download = fixtures.make_download(days)
+    tickers = [f'S{i:05d}' for i in range(symbols)] + ['^VIX']
+
+    saved = hk_ipo_scraper.IPO_LIST_URL
+    with fixtures.StandInServer(page_html.items(), pe_html, delay=latency) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        hk_ipo_scraper.IPO_LIST_URL = server.ipo_url
+        valuation.configure(sources=[valuation.Source('bench_pe', 'pe', server.pe_url, 'multpl_table', 10)])
+        http_cache.configure(os.path.join(tmp, 'http'))
+        try:
+            for name in ('fetch_cold', 'fetch_warm'):
+                with timer.stage(name) as info:
+                    # 与 crawl_to_store 相同的抓取路径（按页码顺序产出，自动识别末页）
+                    raw_rows = [row for _, page_rows, _ in hk_ipo_scraper.iter_ipo_pages(
+                        1, max_workers=max_workers, max_pages=pages) if page_rows for row in page_rows]
+                    info['items'] = len(raw_rows)
+
+            with timer.stage('parse') as info:
+                df = hk_ipo_scraper.parse_ipo_data(raw_rows)
+                info['items'] = len(df)
+
+            with timer.stage('normalize') as info:
+                normalized = hk_ipo_scraper.normalize_ipo_data(df)
+                info['items'] = len(normalized)
+
+            with timer.stage('write') as info:
+                store_path = os.path.join(tmp, 'store.csv')
+                store, _, _ = hk_ipo_scraper.update_ipo_store(hk_ipo_scraper.load_ipo_store(store_path), df)
+                store.to_csv(store_path, index=False, encoding='utf-8-sig')
+                try:
+                    from ipo_history import append_ipo_history
+                    info['items'] = len(append_ipo_history(normalized, root=os.path.join(tmp, 'history')))
+                except ImportError:
+                    print("pyarrow未安装，跳过Parquet写入")
+
+            with timer.stage('crawl') as info:
+                _, added, _, _ = hk_ipo_scraper.crawl_to_store(
+                    os.path.join(tmp, 'crawl.csv'), os.path.join(tmp, 'crawl_history'), incremental=False,
+                    max_workers=max_workers, requests_per_second=None)
+                info['items'] = added
+
+            for name in ('enrich_cold', 'enrich_warm'):
+                with timer.stage(name) as info:
+                    enriched = ipo_prices.enrich_ipo_prices(df, cache_dir=tmp, download=download,
+                                                            now=fixtures.SYNTHETIC_END)
+                    info['items'] = int(enriched[ipo_prices.horizon_column(ipo_prices.HORIZONS[-1])].notna().sum())
+
+            with timer.stage('pe') as info:
+                info['items'] = market_data.get_sp500_pe(cache_dir=tmp)
+
+            lookback = int(days * 7 / 5)
+            for name in ('market_cold', 'market_warm'):
+                with timer.stage(name) as info:
+                    closes = market_data.get_daily_closes(tickers, lookback_days=lookback, cache_dir=tmp,
+                                                          download=download, max_symbols=len(tickers))
+                    info['items'] = closes.size
+
+            with timer.stage('signal') as info:
+                vix = closes.pop('^VIX')
+                panel = compute_signal_panel(closes, vix, 25.0)
+                info['items'] = panel['tier'].size
+        finally:
+            hk_ipo_scraper.IPO_LIST_URL = saved
+            valuation.configure()
+            http_cache.configure()
+
+    return timer
+
+
+def record(pages=11):
+    """联网录制真实页面和行情，保存到 benchmarks/fixtures/"""
+    import yfinance as yf
+
+    os.makedirs(fixtures.FIXTURE_DIR, exist_ok=True)
+    session = hk_ipo_scraper.create_session()
+    for page_num in range(1, pages + 1):
+        response = session.get(hk_ipo_scraper.IPO_LIST_URL.format(page_num=page_num),
+                               headers=hk_ipo_scraper.DEFAULT_HEADERS, timeout=hk_ipo_scraper.DEFAULT_TIMEOUT)
+        response.raise_for_status()
+        with open(os.path.join(fixtures.FIXTURE_DIR, f'aastocks_listedipo_p{page_num}.html'), 'wb') as f:
+            f.write(response.content)
+        print(f"已录制第 {page_num} 页")
+
+    import requests
+    pe_table = next(s for s in valuation.load_sources()[0] if s.metric == 'pe' and s.format == 'multpl_table')
+    response = requests.get(pe_table.url, headers=valuation.HEADERS, timeout=10)
+    response.raise_for_status()
+    with open(os.path.join(fixtures.FIXTURE_DIR, 'multpl_pe_by_month.html'), 'wb') as f:
+        f.write(response.content)
+    print("已录制 multpl PE 表格")
+
+    raw = yf.download(["SPY", "^VIX"], period="5y", progress=False)
+    for ticker, frame in market_data._split_by_ticker(raw, ["SPY", "^VIX"]).items():
+        frame.to_csv(os.path.join(fixtures.FIXTURE_DIR, f"yf_{ticker.replace('^', '_')}.csv"), index_label='Date')
+        print(f"已录制 {ticker} 日线")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线基准测试")
+    parser.add_argument('--pages', type=int, default=11, help="列表页数")
+    parser.add_argument('--rows', type=int, default=20, help="合成页面每页行数")
+    parser.add_argument('--symbols', type=int, default=500, help="信号计算的代码数")
+    parser.add_argument('--days', type=int, default=800, help="每个代码的交易日数")
+    parser.add_argument('--latency', type=float, default=0.0, help="替身服务器每个请求的延迟（秒）")
+    parser.add_argument('--workers', type=int, default=8, help="并发抓取的线程数")
+    parser.add_argument('--no-memory', action='store_true', help="不统计内存（tracemalloc 会拖慢计时）")
+    parser.add_argument('--json', help="将结果写入JSON文件")
+    parser.add_argument('--record', action='store_true', help="联网录制真实页面到 benchmarks/fixtures/")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.pages)
+        return
+
+    timer = run(args.pages, args.rows, args.symbols, args.days, args.latency, args.workers, not args.no_memory)
+    timer.report()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'stages': timer.results}, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    main()
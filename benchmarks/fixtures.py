@@ -0,0 +1,215 @@
+"""
+基准测试用的离线数据：aastocks 列表页、multpl.com PE 表格、yfinance 日线，以及本地替身HTTP服务器
+
+- 优先使用 benchmarks/fixtures/ 下录制的真实页面（bench.py --record 录制）
+- 没有录制文件或需要放大规模时，按相同的页面结构合成数据
+"""
+import glob
+import http.server
+import os
+import re
+import threading
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+IPO_HEADER = ['', '名稱 / 代號', '上市日期', '每手股數', '上市市值(億元)', '招股價', '上市價',
+              '超額倍數', '穩中一手', '中籤率', '現價', '首日表現', '累積表現']
+
+# 真实页面中IPO表格之外还有大量脚本和导航，合成页面用填充内容模拟这部分体积
+_FILLER = '<script>var cfg = {"a": 1, "b": [1, 2, 3]};</script><div class="nav"><a href="#">link</a></div>' * 200
+
+# 合成日线的最后一个交易日
+SYNTHETIC_END = '2026-10-16'
+
+
+def recorded_ipo_pages():
+    """已录制的列表页 {页码: HTML字节}"""
+    pages = {}
+    for path in glob.glob(os.path.join(FIXTURE_DIR, 'aastocks_listedipo_p*.html')):
+        page = int(re.search(r'_p(\d+)\.html$', path).group(1))
+        with open(path, 'rb') as f:
+            pages[page] = f.read()
+    return pages
+
+
+def synthetic_ipo_page(page_num, rows=20, total_pages=11, seed=0):
+    """按 aastocks 已上市IPO列表页的结构合成一页（代號按页码递减，保证跨页唯一）"""
+    rng = np.random.default_rng(seed + page_num)
+    base = pd.Timestamp('2026-10-01') - pd.Timedelta(days=7 * rows * (page_num - 1))
+    trs = ['<tr>' + ''.join(f'<td>{h}</td>' for h in IPO_HEADER) + '</tr>']
+    for i in range(rows):
+        code = 99999 - (page_num - 1) * rows - i
+        price = round(float(rng.uniform(1, 50)), 2)
+        first_day = rng.normal(5, 20)
+        mark = '跌穿上市價' if first_day < 0 else ''
+        listed = (base - pd.Timedelta(days=7 * i)).strftime('%Y/%m/%d')
+        cells = [
+            '<input type="checkbox"/>',
+            f'<a href="#">公司{page_num}-{i}</a>{mark} {code:05d}.HK',
+            listed,
+            f'{int(rng.choice([100, 200, 500, 1000])):,}',
+            f'{rng.uniform(5, 500):,.2f}',
+            f'{price * 0.9:.2f}-{price:.2f}',
+            f'{price:.2f}',
+            f'{rng.uniform(0.5, 3000):.2f}倍',
+            f'{int(rng.integers(1, 500))}手',
+            f'{rng.uniform(0.5, 100):.2f}%',
+            f'{price * (1 + rng.normal(0, 0.3)):.2f}',
+            f'{first_day:+.2f}%',
+            f'{rng.normal(0, 40):+.2f}%',
+        ]
+        trs.append('<tr>' + ''.join(f'<td>{c}</td>' for c in cells) + '</tr>')
+    trs.append('<tr><td></td><td>延遲報價最少15分鐘</td></tr>')
+    # 分页行在IPO表格内：当前页前后各5页的页码，末页没有「下一頁」
+    nav = ''.join(f'<a href="listedipo.aspx?s=3&o=0&page={p}">{p}</a> '
+                  for p in range(max(1, page_num - 5), min(total_pages, page_num + 5) + 1))
+    if page_num > 1:
+        nav = f'<a href="listedipo.aspx?s=3&o=0&page={page_num - 1}">上一頁</a> ' + nav
+    if page_num < total_pages:
+        nav += f'<a href="listedipo.aspx?s=3&o=0&page={page_num + 1}">下一頁</a>'
+    trs.append(f'<tr><td></td><td>{nav}</td></tr>')
+    return (
+        '<html><head><title>已上市新股 - AASTOCKS</title></head><body>'
+        f'{_FILLER}<div id="IPOListed"><table class="tblM"><tr><td>menu</td></tr></table>'
+        f'<table class="ns2">{"".join(trs)}</table></div>{_FILLER}'
+        '</body></html>'
+    ).encode('utf-8')
+
+
+def synthetic_calendar_page(page_num, rows=20, total_pages=3, seed=0):
+    """
+    英文IPO日历网站（纯配置的 TableAdapter 数据源）的一页：
+    Symbol | Company | Listing Date（MM/DD/YYYY）| Price | First Day，分页行为 Prev / 页码 / Next
+    """
+    rng = np.random.default_rng(seed + 1000 + page_num)
+    base = pd.Timestamp('2026-10-01') - pd.Timedelta(days=3 * rows * (page_num - 1))
+    trs = ['<tr><th>Symbol</th><th>Company</th><th>Listing Date</th><th>Price</th><th>First Day</th></tr>']
+    for i in range(rows):
+        n = (page_num - 1) * rows + i
+        symbol = ''.join(chr(65 + (n // 26 ** k) % 26) for k in range(3))
+        listed = (base - pd.Timedelta(days=3 * i)).strftime('%m/%d/%Y')
+        trs.append(f'<tr><td>{symbol}</td><td>Company {n} Inc.</td><td>{listed}</td>'
+                   f'<td>${rng.uniform(5, 40):.2f}</td><td>{rng.normal(10, 25):+.2f}%</td></tr>')
+    nav = ' '.join(str(p) for p in range(1, total_pages + 1))
+    if page_num > 1:
+        nav = 'Prev ' + nav
+    if page_num < total_pages:
+        nav += ' Next'
+    trs.append(f'<tr><td colspan="5">{nav}</td></tr>')
+    return (f'<html><body>{_FILLER}<table class="calendar">{"".join(trs)}</table>{_FILLER}</body></html>'
+            ).encode('utf-8')
+
+
+def ipo_pages(total_pages, rows=20):
+    """取 total_pages 页：有录制文件的页用录制内容，其余合成"""
+    recorded = recorded_ipo_pages()
+    return {p: recorded.get(p) or synthetic_ipo_page(p, rows, total_pages) for p in range(1, total_pages + 1)}
+
+
+def pe_table_html(months=1800, seed=0):
+    """multpl.com 月度PE表格（已录制时使用录制内容）"""
+    path = os.path.join(FIXTURE_DIR, 'multpl_pe_by_month.html')
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end='2026-10-01', periods=months, freq='MS')[::-1]
+    rows = ''.join(f'<tr><td>{d.strftime("%b %d, %Y")}</td><td>{"&#x2020; " if i == 0 else ""}{v:.2f}</td></tr>'
+                   for i, (d, v) in enumerate(zip(dates, rng.uniform(8, 40, months))))
+    return (f'<html><body>{_FILLER}<table id="datatable"><tr><th>Date</th><th>Value</th></tr>{rows}'
+            f'</table>{_FILLER}</body></html>').encode('utf-8')
+
+
+def synthetic_closes(symbols, days, seed=0, end=SYNTHETIC_END):
+    """几何随机游走的收盘价宽表（日期 × 代码）"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=end, periods=days)
+    returns = rng.normal(0.0003, 0.015, (days, len(symbols)))
+    return pd.DataFrame(100 * np.exp(np.cumsum(returns, axis=0)), index=index, columns=list(symbols))
+
+
+def make_download(days=800, seed=0):
+    """
+    替代 yf.download 的回放函数：返回与 yfinance 相同结构（Price × Ticker 两层列）的日线
+    录制的 benchmarks/fixtures/yf_<代码>.csv 优先，其余代码合成
+    """
+    def download(tickers, start=None, end=None, progress=False, **kwargs):
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        frames = {}
+        synthetic = synthetic_closes(tickers, days, seed)
+        for ticker in tickers:
+            path = os.path.join(FIXTURE_DIR, f"yf_{re.sub(r'[^0-9A-Za-z.-]', '_', ticker)}.csv")
+            if os.path.exists(path):
+                frame = pd.read_csv(path, index_col=0, parse_dates=True)
+            else:
+                close = synthetic[ticker]
+                frame = pd.DataFrame({'Close': close, 'High': close * 1.01, 'Low': close * 0.99,
+                                      'Open': close, 'Volume': 1_000_000})
+            if start is not None:
+                frame = frame[frame.index >= pd.Timestamp(start)]
+            if end is not None:
+                frame = frame[frame.index < pd.Timestamp(end)]
+            frames[ticker] = frame
+        raw = pd.concat(frames, axis=1).swaplevel(0, 1, axis=1).sort_index(axis=1)
+        raw.columns.names = ['Price', 'Ticker']
+        return raw
+
+    return download
+
+
+class StandInServer:
+    """
+    本地替身服务器
+    - /listedipo.aspx?page=N 返回第N页列表页
+    - /pe 返回 multpl PE 表格
+    requested 按请求顺序记录列表页的页码（并发抓取时顺序不确定）
+    """
+
+    def __init__(self, pages, pe_html, delay=0.0):
+        pages_by_num = dict(pages)
+        requested = self.requested = []
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path.endswith('listedipo.aspx'):
+                    page_num = int(parse_qs(parsed.query).get('page', ['1'])[0])
+                    requested.append(page_num)
+                    body = pages_by_num.get(page_num)
+                elif parsed.path == '/pe':
+                    body = pe_html
+                else:
+                    body = None
+                if delay:
+                    threading.Event().wait(delay)
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self._server.server_port}'
+        self.ipo_url = self.base_url + '/tc/stocks/market/ipo/listedipo.aspx?s=3&o=0&page={page_num}'
+        self.pe_url = self.base_url + '/pe'
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,85 @@
+"""
+命令行启动耗时：每条命令在新进程中运行多次，统计墙钟时间（含解释器启动和导入）
+
+对比 cli.py 的轻量子命令与直接导入完整模块的耗时，用于确认查询本地数据时没有加载 pandas / yfinance
+
+用法：
+    python benchmarks/startup.py                # 每条命令运行5次
+    python benchmarks/startup.py --repeat 10
+    python benchmarks/startup.py --importtime   # 额外列出 cli.py ipo query 导入最慢的模块
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fixtures  # noqa: E402
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, 'cli.py')
+
+
+def _write_store(path, pages=10, rows=100):
+    """合成一个本地IPO库（仅在基准进程中导入 pandas）"""
+    sys.path.insert(0, ROOT)
+    import hk_ipo_scraper
+
+    raw = [row for page in range(1, pages + 1)
+           for row in hk_ipo_scraper._parse_ipo_rows(fixtures.synthetic_ipo_page(page, rows, pages))]
+    hk_ipo_scraper.parse_ipo_data(raw).to_csv(path, index=False, encoding='utf-8-sig')
+
+
+def time_command(argv, repeat, cwd, env):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(argv, cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="命令行启动耗时")
+    parser.add_argument('--repeat', type=int, default=5, help="每条命令的运行次数")
+    parser.add_argument('--importtime', action='store_true', help="列出 ipo query 导入最慢的模块")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = os.path.join(tmp, 'hk_ipo_store.csv')
+        _write_store(store)
+        python = sys.executable
+        commands = {
+            'python -c pass': [python, '-c', 'pass'],
+            'cli.py --help': [python, CLI, '--help'],
+            'cli.py ipo query': [python, CLI, 'ipo', 'query', '--store', store, '--since', '2026-01-01'],
+            'import hk_ipo_scraper': [python, '-c', 'import hk_ipo_scraper'],
+            'import market_data': [python, '-c', 'import market_data'],
+            'import yfinance': [python, '-c', 'import yfinance'],
+        }
+        env = {**os.environ, 'PYTHONPATH': ROOT}
+        print(f"{'command':<26}{'median(s)':>10}{'min(s)':>10}")
+        for name, argv in commands.items():
+            timings = time_command(argv, args.repeat, tmp, env)
+            print(f"{name:<26}{statistics.median(timings):>10.3f}{min(timings):>10.3f}")
+
+        if args.importtime:
+            result = subprocess.run([python, '-X', 'importtime', CLI, 'ipo', 'query', '--store', store],
+                                    cwd=tmp, capture_output=True, text=True, env=env)
+            entries = []
+            for line in result.stderr.splitlines():
+                parts = line.split('|')
+                if len(parts) == 3 and parts[1].strip().isdigit():
+                    entries.append((int(parts[1]), parts[2].strip()))
+            print("\n导入最慢的模块（累计微秒）:")
+            for cumulative, module in sorted(entries, reverse=True)[:10]:
+                print(f"{cumulative:>10}  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+统一的命令行入口
+
+    python cli.py vix check                          每日 VIX / 回撤 / PE 检查并发送通知
+    python cli.py ipo crawl [--full] [--restart]      抓取港股IPO并更新本地库和历史库（中断后从断点继续）
+    python cli.py ipo query [--code 01234] [--name 科技] [--since 2024-01-01] [--limit 20] [--format csv]
+    python cli.py ipo stats [--by month|oversubscription|lot_odds] [--since 2024-01] [--until 2025-12]
+    python cli.py ipo markets [--source aastocks ...] [--out ipo_markets.csv]   多个市场的IPO列表合并抓取
+    python cli.py ipo enrich [--since 2020-01-01] [--out hk_ipo_returns.csv]   上市后第1/5/20/60日表現
+
+各子命令只在运行时导入自己需要的模块：ipo query 只用标准库读取本地库，不加载 pandas / yfinance；
+启动耗时见 benchmarks/startup.py
+全局选项：--quiet 不输出进度信息；--timings 结束时打印各阶段耗时
+"""
+import argparse
+import sys
+
+from instrumentation import export_metrics, metrics, set_quiet
+
+
+def vix_check(args):
+    from scheduler import _load_script
+
+    _load_script('vix-strategy.py', 'vix_strategy').main()
+
+
+def ipo_crawl(args):
+    import hk_ipo_scraper
+
+    hk_ipo_scraper.main(max_workers=args.workers, requests_per_second=args.rps, incremental=not args.full,
+                        store_path=args.store, snapshot=args.snapshot, history_root=args.history,
+                        resume=not args.restart, max_pages=args.max_pages)
+
+
+def ipo_query(args):
+    from ipo_query import query_store, write_rows
+
+    columns, rows = query_store(args.store, code=args.code, name=args.name, since=args.since, until=args.until,
+                                limit=args.limit)
+    if not columns:
+        print(f"本地库 {args.store} 不存在或为空，请先运行: python cli.py ipo crawl", file=sys.stderr)
+        return 1
+    if args.columns:
+        unknown = [c for c in args.columns if c not in columns]
+        if unknown:
+            print(f"未知的列: {unknown}（可用: {', '.join(columns)}）", file=sys.stderr)
+            return 1
+        columns = args.columns
+    write_rows(columns, rows, args.format)
+
+
+def ipo_stats(args):
+    from ipo_analytics import IpoAnalytics
+
+    analytics = IpoAnalytics(args.history)
+    analytics.refresh()
+    table = analytics.by_bucket(args.by, since=args.since, until=args.until)
+    if table.empty:
+        print(f"历史库 {args.history} 不存在或为空，请先运行: python cli.py ipo crawl", file=sys.stderr)
+        return 1
+    print(table.round(3).to_string())
+
+
+def ipo_markets(args):
+    import ipo_sources
+
+    try:
+        adapters = ipo_sources.load_adapters(args.config or ipo_sources.SOURCES_PATH, args.source)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.list:
+        for adapter in adapters:
+            print(f"{adapter.name:<16}{adapter.market:<6}{type(adapter).__name__}")
+        return
+    counts = ipo_sources.crawl_to_csv(args.out, adapters, max_pages=args.max_pages)
+    print(f"共 {sum(counts.values())} 条（{', '.join(f'{k}: {v}' for k, v in counts.items())}），保存到 {args.out}")
+
+
+def ipo_enrich(args):
+    from hk_ipo_scraper import load_ipo_store
+    from ipo_prices import enrich_ipo_prices, horizon_column
+    from ipo_query import _normalize_date
+
+    store = load_ipo_store(args.store)
+    if args.since:
+        store = store[store['上市日期'].map(_normalize_date) >= _normalize_date(args.since)]
+    if store.empty:
+        print(f"本地库 {args.store} 不存在或没有符合条件的新股，请先运行: python cli.py ipo crawl", file=sys.stderr)
+        return 1
+    enriched = enrich_ipo_prices(store, horizons=args.horizons)
+    enriched.to_csv(args.out, index=False, encoding='utf-8-sig')
+    columns = [horizon_column(h) for h in args.horizons]
+    print(f"{int(enriched[columns].notna().any(axis=1).sum())}/{len(enriched)} 只新股取到上市后日线，保存到 {args.out}")
+    print(enriched[columns].describe().round(2).to_string())
+
+
+def build_parser():
+    from ipo_query import STORE_PATH
+
+    parser = argparse.ArgumentParser(prog='cli.py', description="VIX 提醒与港股IPO数据工具")
+    parser.add_argument('--quiet', action='store_true', help="不输出逐页、逐批的进度信息")
+    parser.add_argument('--timings', action='store_true', help="结束时打印各阶段耗时")
+    groups = parser.add_subparsers(dest='group', required=True)
+
+    vix = groups.add_parser('vix', help="VIX / 回撤 / PE 策略").add_subparsers(dest='command', required=True)
+    check = vix.add_parser('check', help="检查最新信号并发送通知")
+    check.set_defaults(func=vix_check)
+
+    ipo = groups.add_parser('ipo', help="港股IPO数据").add_subparsers(dest='command', required=True)
+    crawl = ipo.add_parser('crawl', help="抓取并更新本地IPO库")
+    crawl.add_argument('--full', action='store_true', help="全量抓取所有页（默认增量）")
+    crawl.add_argument('--workers', type=int, default=4, help="全量抓取的并发线程数")
+    crawl.add_argument('--rps', type=float, default=4, help="每秒请求上限")
+    crawl.add_argument('--store', default=STORE_PATH, help="本地IPO库路径")
+    crawl.add_argument('--history', default='hk_ipo_history', help="Parquet历史库目录")
+    crawl.add_argument('--snapshot', action='store_true', help="额外保存一份带时间戳的CSV")
+    crawl.add_argument('--restart', action='store_true', help="忽略上次中断留下的断点，从第1页开始")
+    crawl.add_argument('--max-pages', type=int, default=1000, help="本次最多抓取的页数（末页自动识别）")
+    crawl.set_defaults(func=ipo_crawl)
+
+    query = ipo.add_parser('query', help="查询本地IPO库（不联网）")
+    query.add_argument('--store', default=STORE_PATH, help="本地IPO库路径")
+    query.add_argument('--code', help="代號")
+    query.add_argument('--name', help="名稱包含的文字")
+    query.add_argument('--since', help="上市日期下限，如 2024-01-01")
+    query.add_argument('--until', help="上市日期上限")
+    query.add_argument('--limit', type=int, help="最多输出的行数")
+    query.add_argument('--columns', nargs='+', help="只输出这些列")
+    query.add_argument('--format', choices=['table', 'csv', 'json'], default='table', help="输出格式")
+    query.set_defaults(func=ipo_query)
+
+    stats = ipo.add_parser('stats', help="按月份 / 超額倍數 / 中籤率分档统计首日和累積表現（不联网）")
+    stats.add_argument('--history', default='hk_ipo_history', help="Parquet历史库目录")
+    stats.add_argument('--by', choices=['month', 'oversubscription', 'lot_odds'], default='month', help="分组维度")
+    stats.add_argument('--since', help="上市月份下限，如 2024-01")
+    stats.add_argument('--until', help="上市月份上限")
+    stats.set_defaults(func=ipo_stats)
+
+    markets = ipo.add_parser('markets', help="按 ipo_sources.json 同时抓取多个市场的IPO列表，合并为统一字段的CSV")
+    markets.add_argument('--source', nargs='+', help="只抓取这些数据源（默认全部）")
+    markets.add_argument('--config', help="数据源配置文件（默认 ipo_sources.json）")
+    markets.add_argument('--out', default='ipo_markets.csv', help="输出CSV路径")
+    markets.add_argument('--max-pages', type=int, default=1000, help="每个数据源最多抓取的页数（末页自动识别）")
+    markets.add_argument('--list', action='store_true', help="只列出已配置的数据源")
+    markets.set_defaults(func=ipo_markets)
+
+    enrich = ipo.add_parser('enrich', help="批量下载新股上市后的日线，计算第N个交易日相对上市價的表現")
+    enrich.add_argument('--store', default=STORE_PATH, help="本地IPO库路径")
+    enrich.add_argument('--since', help="只计算此日期及之后上市的新股，如 2020-01-01")
+    enrich.add_argument('--horizons', type=int, nargs='+', default=[1, 5, 20, 60], help="交易日（第1日即首日）")
+    enrich.add_argument('--out', default='hk_ipo_returns.csv', help="输出CSV路径")
+    enrich.set_defaults(func=ipo_enrich)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.quiet:
+        set_quiet()
+    status = args.func(args)
+    if args.timings:
+        metrics.report()
+    export_metrics(f"{args.group}_{args.command}")
+    return status or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
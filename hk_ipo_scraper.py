@@ -1,101 +1,127 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 import pandas as pd
+import json
+import os
+import threading
 import time
-import re
 from datetime import datetime, timedelta
 
+from http_cache import default_cache
+from instrumentation import export_metrics, is_quiet, metrics, progress
+from ipo_query import STORE_PATH
+from ipo_sources import CHUNK_PAGES, IPO_FIELDS, MAX_PAGES, TableAdapter, iter_pages, iter_table_rows
 
-def fetch_hk_ipo_data(page_num=1):
+
+IPO_LIST_URL = 'https://www.aastocks.com/tc/stocks/market/ipo/listedipo.aspx?s=3&o=0&page={page_num}'
+
+# Session方式预热时访问的主页
+HOME_URL = 'https://www.aastocks.com/tc/'
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'zh-TW,zh;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Referer': 'https://www.aastocks.com/',
+}
+
+# 单次请求超时（秒），避免某一页卡住整个抓取
+DEFAULT_TIMEOUT = 15
+
+# 流式读取响应时每块的字节数
+CHUNK_SIZE = 64 * 1024
+
+# 输出列（即 ipo_sources 的统一字段）
+IPO_COLUMNS = list(IPO_FIELDS)
+
+# 代號为名稱单元格中的第一个5位数字；名稱中需要移除的标记
+_CODE_PATTERN = r'(\d{5})'
+_NAME_MARKS_PATTERN = r'(跌穿上市價|認購不足)'
+
+# 抓取方式按开销从低到高排列；某方式连续这么多页失败（而更高级的方式成功）后不再尝试
+FETCH_STRATEGIES = ('requests', 'session', 'selenium')
+MAX_STRATEGY_FAILURES = 2
+
+# 本地IPO库（以5位代號为键，路径 STORE_PATH 见 ipo_query），增量抓取时只需更新会变化的列
+MUTABLE_COLUMNS = ['現價', '累積表現']
+
+# 断点文件：本地库路径加此后缀，记录下一页页码，抓取完成后删除
+CHECKPOINT_SUFFIX = '.checkpoint.json'
+
+
+def create_session(pool_size=8):
+    """
+    创建带连接池的共享Session，供并发抓取时复用TCP/TLS连接
+    """
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def iter_ipo_rows(source):
+    """
+    流式提取aastocks页面中IPO表格（表头第2列含「名稱」「代號」）的数据行，见 ipo_sources.iter_table_rows
+    :param source: HTML字符串/字节串，或逐块产出字节串的可迭代对象（如 response.iter_content()）
+    """
+    return iter_table_rows(source, AASTOCKS.is_header)
+
+
+@metrics.timed('ipo_extract')
+def _parse_ipo_rows(body):
+    # 只统计提取IPO表格行的耗时（解析缓存命中时不调用）；抓取耗时按方式计入 ipo_fetch
+    return list(iter_ipo_rows(body))
+
+
+@metrics.timed('ipo_fetch', strategy='requests')
+def fetch_hk_ipo_data(page_num=1, session=None, timeout=DEFAULT_TIMEOUT, verbose=False, cache=None):
     """
     从aastocks网站获取港股IPO信息
+    :param session: 可选的共享Session（并发抓取时传入以复用连接）
+    :param timeout: 请求超时（秒）
+    :param verbose: 是否逐行打印提取到的数据（调试用）
+    :param cache: HttpCache，默认使用共用缓存（条件请求，内容未变时不重新解析）；
+                  传 False 时不使用缓存，边下载边解析且不保留整个响应
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'zh-TW,zh;q=0.9,en;q=0.8',
-        'Accept-Encoding': 'gzip, deflate',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Referer': 'https://www.aastocks.com/',
-    }
-    
-    url = f'https://www.aastocks.com/tc/stocks/market/ipo/listedipo.aspx?s=3&o=0&page={page_num}'
+    url = IPO_LIST_URL.format(page_num=page_num)
     
     try:
-        response = requests.get(url, headers=headers)
-        response.encoding = 'utf-8'
+        if cache is False:
+            http = session if session is not None else requests
+            response = http.get(url, headers=DEFAULT_HEADERS, timeout=timeout, stream=True)
+            status_code = response.status_code
+            content = response.content if status_code != 200 else None
+        else:
+            cache = cache or default_cache()
+            response = cache.get(url, session=session, headers=DEFAULT_HEADERS, timeout=timeout)
+            status_code, content = response.status_code, response.content
         
-        if response.status_code != 200:
-            print(f"请求失败，状态码: {response.status_code}")
-            print(f"响应内容: {response.text[:500]}...")  # 显示前500字符用于调试
+        if status_code != 200:
+            print(f"请求失败，状态码: {status_code}")
+            print(f"响应内容: {content[:500].decode('utf-8', errors='replace')}...")  # 显示前500字符用于调试
             return None
-            
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # 查找页面标题确认是否成功访问
-        title_tag = soup.find('title')
-        if title_tag:
-            print(f"页面标题: {title_tag.get_text().strip()}")
-        
-        # 查找包含IPO数据的主要容器
-        # 根据AASTOCKS网站的常见结构进行搜索
-        ipo_data_container = soup.find('div', {'id': re.compile(r'(?i)(ipo|new|stock)', re.IGNORECASE)}) or \
-                           soup.find('table', {'class': re.compile(r'(?i)(ipo|new|stock)', re.IGNORECASE)}) or \
-                           soup.find_all('div', {'class': re.compile(r'(?i)(content|main|data)', re.IGNORECASE)})
         
-        if ipo_data_container:
-            if hasattr(ipo_data_container, '__iter__'):
-                containers = ipo_data_container
-            else:
-                containers = [ipo_data_container]
-                
-            for container in containers:
-                # 查找表格
-                tables = container.find_all('table') if hasattr(container, 'find_all') else soup.find_all('table')
-                
-                for table in tables:
-                    # 获取表格头部
-                    headers = []
-                    header_row = table.find('thead')
-                    if header_row:
-                        headers = [th.get_text().strip() for th in header_row.find_all(['th', 'td'])]
-                    else:
-                        # 如果没有thead，查找第一行作为标题
-                        first_row = table.find('tr')
-                        if first_row:
-                            headers = [th.get_text().strip() for th in first_row.find_all(['th', 'td'])]
-                    
-                    if headers:
-                        print(f"发现表格，列名: {headers}")
-                        break
-                        
-                if headers:
-                    break
+        if cache is False:
+            # 单次流式解析，只提取IPO表格的数据行
+            all_rows_data = _parse_ipo_rows(response.iter_content(chunk_size=CHUNK_SIZE))
+        else:
+            all_rows_data = cache.parse(response, 'ipo_rows', _parse_ipo_rows)
         
-        # 获取所有表格行数据
-        all_rows_data = []
-        
-        # 查找所有表格
-        tables = soup.find_all('table')
-        for table_idx, table in enumerate(tables):
-            print(f"正在处理第 {table_idx+1} 个表格...")
-            
-            rows = table.find_all('tr')
-            for row_idx, row in enumerate(rows):
-                cells = row.find_all(['td', 'th'])
-                if cells:
-                    row_data = [cell.get_text().strip() for cell in cells]
-                    if any(cell_data for cell_data in row_data if cell_data):  # 确保不是全空行
-                        all_rows_data.append(row_data)
-                        print(f"  行 {row_idx+1}: {row_data}")
+        if verbose:
+            for row_idx, row_data in enumerate(all_rows_data):
+                print(f"  行 {row_idx+1}: {row_data}")
         
         if all_rows_data:
+            metrics.count('ipo_rows_fetched', len(all_rows_data))
             return all_rows_data
         else:
-            print("未找到有效的表格数据")
-            # 返回整个页面内容用于调试
-            return response.text
+            print("未找到IPO表格数据")
+            return None
         
     except requests.exceptions.RequestException as e:
         print(f"网络请求错误: {str(e)}")
@@ -105,108 +131,94 @@ def fetch_hk_ipo_data(page_num=1):
         return None
 
 
-def fetch_hk_ipo_with_requests_session(page_num=1):
+def warm_up_session(timeout=DEFAULT_TIMEOUT):
     """
-    使用Session保持连接，模拟更真实的浏览器行为
+    创建Session并先访问主页建立会话（获取cookie），之后的列表页请求复用该Session
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'zh-TW,zh;q=0.9,en;q=0.8',
-        'Accept-Encoding': 'gzip, deflate',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Referer': 'https://www.aastocks.com/',
-    }
-    
     session = requests.Session()
-    session.headers.update(headers)
-    
-    # 先访问主页建立会话
+    session.headers.update(DEFAULT_HEADERS)
+    session.get(HOME_URL, timeout=timeout)
+    time.sleep(1)  # 等待
+    return session
+
+
+@metrics.timed('ipo_fetch', strategy='session')
+def fetch_hk_ipo_with_requests_session(page_num=1, timeout=DEFAULT_TIMEOUT, session=None, cache=None):
+    """
+    使用Session保持连接，模拟更真实的浏览器行为
+    :param session: 已预热的Session（见 warm_up_session）；不传时临时创建并预热一个
+    :param cache: HttpCache，默认使用共用缓存
+    """
+    own_session = session is None
     try:
-        main_page_url = 'https://www.aastocks.com/tc/'
-        session.get(main_page_url)
-        time.sleep(1)  # 等待
+        if own_session:
+            session = warm_up_session(timeout)
         
         # 访问IPO页面
-        url = f'https://www.aastocks.com/tc/stocks/market/ipo/listedipo.aspx?s=3&o=0&page={page_num}'
-        response = session.get(url)
-        response.encoding = 'utf-8'
+        cache = cache or default_cache()
+        response = cache.get(IPO_LIST_URL.format(page_num=page_num), session=session, timeout=timeout)
         
         if response.status_code != 200:
             print(f"请求失败，状态码: {response.status_code}")
             return None
             
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # 查找IPO相关表格
-        tables = soup.find_all('table')
-        all_rows_data = []
-        
-        for table_idx, table in enumerate(tables):
-            print(f"处理表格 {table_idx+1}")
-            rows = table.find_all('tr')
-            for row in rows:
-                cells = row.find_all(['td', 'th'])
-                if cells:
-                    row_data = [cell.get_text().strip() for cell in cells]
-                    if any(data.strip() for data in row_data):  # 确保不是空行
-                        all_rows_data.append(row_data)
-        
-        return all_rows_data if all_rows_data else response.text
+        all_rows_data = cache.parse(response, 'ipo_rows', _parse_ipo_rows)
+        return all_rows_data if all_rows_data else None
         
     except Exception as e:
         print(f"Session请求时发生错误: {str(e)}")
         return None
+    finally:
+        if own_session and session is not None:
+            session.close()
 
 
-def fetch_hk_ipo_with_selenium():
+def create_chrome_driver():
+    """
+    启动无头Chrome；未安装selenium时抛出ImportError
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    
+    # 设置Chrome选项
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')  # 无头模式
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument(f"user-agent={DEFAULT_HEADERS['User-Agent']}")
+    
+    return webdriver.Chrome(options=chrome_options)
+
+
+@metrics.timed('ipo_fetch', strategy='selenium')
+def fetch_hk_ipo_with_selenium(page_num=1, driver=None):
     """
     使用Selenium获取IPO数据（当普通请求无效时）
+    :param driver: 复用的浏览器（见 create_chrome_driver）；不传时临时启动一个，用完关闭
     """
+    own_driver = driver is None
     try:
-        from selenium import webdriver
         from selenium.webdriver.common.by import By
         from selenium.webdriver.support.ui import WebDriverWait
         from selenium.webdriver.support import expected_conditions as EC
-        from selenium.webdriver.chrome.options import Options
-        
-        # 设置Chrome选项
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')  # 无头模式
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
         
-        driver = webdriver.Chrome(options=chrome_options)
+        if own_driver:
+            driver = create_chrome_driver()
         
-        url = 'https://www.aastocks.com/tc/stocks/market/ipo/listedipo.aspx?s=3&o=0&page=1'
-        driver.get(url)
+        driver.get(IPO_LIST_URL.format(page_num=page_num))
         
         # 等待页面加载
         try:
             # 等待主要的IPO表格加载
             wait = WebDriverWait(driver, 10)
-            table_element = wait.until(EC.presence_of_element_located((By.TAG_NAME, "table")))
-            
-            # 提取表格数据
-            rows = driver.find_elements(By.TAG_NAME, "tr")
-            data = []
-            
-            for row in rows:
-                cells = row.find_elements(By.TAG_NAME, "td")
-                if cells:
-                    row_data = [cell.text.strip() for cell in cells]
-                    if row_data:  # 只添加非空行
-                        data.append(row_data)
-            
-            driver.quit()
-            return data
-            
+            wait.until(EC.presence_of_element_located((By.TAG_NAME, "table")))
         except Exception as e:
             print(f"Selenium等待元素时发生错误: {str(e)}")
-            driver.quit()
             return None
+        
+        # 与其他方式使用同一个提取器，只取IPO表格的数据行
+        all_rows_data = list(iter_ipo_rows(driver.page_source))
+        return all_rows_data if all_rows_data else None
             
     except ImportError:
         print("Selenium未安装，请运行: pip install selenium")
@@ -214,174 +226,439 @@ def fetch_hk_ipo_with_selenium():
     except Exception as e:
         print(f"Selenium操作时发生错误: {str(e)}")
         return None
+    finally:
+        if own_driver and driver is not None:
+            driver.quit()
+
+
+def _record_attempt(strategy, raw_data):
+    """记录一次抓取尝试的结果，返回是否获取到有效数据"""
+    ok = bool(raw_data) and not isinstance(raw_data, str)
+    metrics.count('ipo_fetch_attempts', strategy=strategy, result='ok' if ok else 'empty')
+    return ok
+
+
+class FetchStrategyManager:
+    """
+    自适应选择抓取方式，整个抓取过程共用一个实例（线程安全）
+    - 每页从当前最便宜的可用方式开始，失败时才逐级升级（requests -> session -> selenium）
+    - 某方式在连续 max_failures 页上失败、而更高级的方式成功时，认为该方式已失效，后续页面直接跳过；
+      所有方式都失败的页（如超出末页）不计入
+    - Session只预热一次（访问主页），浏览器只启动一次，所有页面复用；浏览器不支持并发，串行使用
+    用法：
+        with FetchStrategyManager() as manager:
+            raw_data = manager.fetch(page_num)
+    """
+    
+    def __init__(self, session=None, timeout=DEFAULT_TIMEOUT, strategies=FETCH_STRATEGIES,
+                 max_failures=MAX_STRATEGY_FAILURES, pool_size=8):
+        self.timeout = timeout
+        self.strategies = list(strategies)
+        self.max_failures = max_failures
+        self._own_session = session is None
+        self.session = create_session(pool_size) if session is None else session
+        self._warm_session = None
+        self._driver = None
+        self._failures = {strategy: 0 for strategy in self.strategies}
+        self._unavailable = set()
+        self._lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+        self._driver_lock = threading.Lock()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        if self._own_session:
+            self.session.close()
+        if self._warm_session is not None:
+            self._warm_session.close()
+            self._warm_session = None
+        if self._driver is not None:
+            self._driver.quit()
+            self._driver = None
+    
+    def active_strategies(self):
+        """当前仍会尝试的方式，按开销从低到高"""
+        with self._lock:
+            return [s for s in self.strategies
+                    if s not in self._unavailable and self._failures[s] < self.max_failures]
+    
+    def _get_warm_session(self):
+        with self._warm_lock:
+            if self._warm_session is None:
+                self._warm_session = warm_up_session(self.timeout)
+            return self._warm_session
+    
+    def _fetch_with(self, strategy, page_num):
+        if strategy == 'requests':
+            return fetch_hk_ipo_data(page_num, session=self.session, timeout=self.timeout)
+        if strategy == 'session':
+            try:
+                session = self._get_warm_session()
+            except requests.exceptions.RequestException as e:
+                print(f"Session预热失败: {str(e)}")
+                return None
+            return fetch_hk_ipo_with_requests_session(page_num, timeout=self.timeout, session=session)
+        with self._driver_lock:
+            if self._driver is None:
+                try:
+                    self._driver = create_chrome_driver()
+                except ImportError:
+                    print("Selenium未安装，请运行: pip install selenium")
+                    with self._lock:
+                        self._unavailable.add(strategy)
+                    return None
+                except Exception as e:
+                    print(f"Selenium启动浏览器时发生错误: {str(e)}")
+                    return None
+            return fetch_hk_ipo_with_selenium(page_num, driver=self._driver)
+    
+    def fetch(self, page_num):
+        """
+        获取单页数据
+        :return: 行数据列表；所有方式都失败时返回None
+        """
+        failed = []
+        for strategy in self.active_strategies():
+            if failed:
+                progress(f"第 {page_num} 页{failed[-1]}方式未获取到有效数据，尝试使用{strategy}方式...")
+            raw_data = self._fetch_with(strategy, page_num)
+            if _record_attempt(strategy, raw_data):
+                self._update_failures(strategy, failed)
+                return raw_data
+            failed.append(strategy)
+        return None
+    
+    def _update_failures(self, succeeded, failed):
+        with self._lock:
+            self._failures[succeeded] = 0
+            for strategy in failed:
+                self._failures[strategy] += 1
+                if self._failures[strategy] == self.max_failures:
+                    progress(f"{strategy}方式已连续 {self.max_failures} 页失败，后续页面直接使用{succeeded}方式")
+
+
+def fetch_page_with_fallback(page_num, session=None, timeout=DEFAULT_TIMEOUT, manager=None):
+    """
+    获取单页数据：普通请求 -> Session方式 -> Selenium 逐级回退
+    :param manager: 多页共用的 FetchStrategyManager；不传时为本页临时创建一个
+    """
+    progress(f"正在获取第 {page_num} 页数据...")
+    
+    with metrics.timer('ipo_page'):
+        if manager is not None:
+            return manager.fetch(page_num)
+        with FetchStrategyManager(session=session, timeout=timeout) as manager:
+            return manager.fetch(page_num)
+
+
+class AastocksAdapter(TableAdapter):
+    """
+    aastocks 港股已上市新股列表（ipo_sources 的数据源适配器）
+    名稱和代號在第2列同一格（如 '公司A跌穿上市價 01234.HK'），其余列依次为 IPO_COLUMNS[2:]
+    每页通过 FetchStrategyManager 获取（requests -> session -> selenium 逐级回退），
+    抓取期间共用一个实例，open 时创建、close 时释放连接和浏览器
+    """
+    name = 'aastocks'
+    market = 'HK'
+    header = ('名稱', '代號')
+    header_column = 1
+    fields = {'名稱': 1, '代號': 1, **{column: i for i, column in enumerate(IPO_COLUMNS[2:], start=2)}}
+    code_pattern = _CODE_PATTERN
+    row_marker = '.HK'
+    exclude_pattern = '延遲報價|下一頁'
+    name_marks = _NAME_MARKS_PATTERN
+    headers = DEFAULT_HEADERS
+    timeout = DEFAULT_TIMEOUT
+    
+    def __init__(self, session=None, pool_size=None, **config):
+        super().__init__(**config)
+        self.session = session
+        self.pool_size = pool_size or self.max_workers
+        self._manager = None
+    
+    def page_url(self, page_num):
+        # 每次读取模块变量（基准测试会将其指向本地替身服务器）
+        return IPO_LIST_URL.format(page_num=page_num)
+    
+    def open(self):
+        self._manager = FetchStrategyManager(session=self.session, timeout=self.timeout, pool_size=self.pool_size)
+    
+    def close(self):
+        if self._manager is not None:
+            self._manager.close()
+            self._manager = None
+    
+    def fetch_rows(self, page_num):
+        return fetch_page_with_fallback(page_num, timeout=self.timeout, manager=self._manager)
+
+
+# 解析、规范化等不需要抓取的操作共用的实例
+AASTOCKS = AastocksAdapter()
 
 
+@metrics.timed('ipo_parse')
 def parse_ipo_data(raw_data):
     """
-    解析原始IPO数据，提取所需字段
+    解析原始IPO数据，提取所需字段（见 AastocksAdapter 的字段映射和 TableAdapter.parse）
+    整批按列处理（pandas字符串方法），不逐行构建；输出列仍为原始文本，类型转换见 normalize_ipo_data
+    """
+    if isinstance(raw_data, (str, bytes)):
+        # 如果是原始HTML文本，流式提取IPO表格的数据行后按列表处理
+        raw_data = list(iter_ipo_rows(raw_data))
+    return AASTOCKS.parse(raw_data if isinstance(raw_data, list) else [])
+
+
+@metrics.timed('ipo_normalize')
+def normalize_ipo_data(df):
+    """
+    将 parse_ipo_data 输出的文本列整批转换为数值/日期类型，便于后续筛选
+    - 上市日期 -> datetime64
+    - 每手股數、穩中一手 -> Int64（可空整数）
+    - 价格、市值、超額倍數 -> float64；招股價为区间时取上限
+    - 中籤率、首日表現、累積表現 -> float64，单位为百分比（'+17.1%' -> 17.1）
+    无法识别的值（如 '-'、'N/A'）转为缺失值
+    """
+    return AASTOCKS.normalize(df)
+
+
+def load_ipo_store(path=STORE_PATH):
+    """
+    读取本地IPO库，不存在时返回空表；所有列按字符串读取以保留代號前导0
     """
-    # 定义需要的列名（按用户要求的顺序）
-    columns = [
-        '名稱', '代號', '上市日期', '每手股數', '上市市值(億元)', 
-        '招股價', '上市價', '超額倍數', '穩中一手', '中籤率', 
-        '現價', '首日表現', '累積表現'
-    ]
+    try:
+        store = pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    except FileNotFoundError:
+        return pd.DataFrame(columns=IPO_COLUMNS)
+    return store.reindex(columns=IPO_COLUMNS, fill_value='')
+
+
+@metrics.timed('ipo_store_update')
+def update_ipo_store(store, df, insert_at=0):
+    """
+    将新抓取的数据合并进本地IPO库
+    - 库中没有的代號：整行插入到第 insert_at 行之前
+    - 库中已有的代號：只更新 MUTABLE_COLUMNS（現價、累積表現）
+    :param insert_at: 分块写入时传入本次抓取已新增的条数，使后抓到的（较早上市的）排在先抓到的之后
+    :return: (合并后的库, 新增条数, 更新条数)
+    """
+    if df.empty:
+        return store, 0, 0
     
-    parsed_data = []
+    df = df.drop_duplicates(subset='代號', keep='first').set_index('代號')
+    merged = store.drop_duplicates(subset='代號', keep='first').set_index('代號')
     
-    # 这里需要根据实际页面结构调整解析逻辑
-    # 目前我们先构建基本框架
-    if isinstance(raw_data, str):
-        # 如果是原始HTML文本，需要进一步解析
-        soup = BeautifulSoup(raw_data, 'html.parser')
-        # 尝试查找表格数据
-        tables = soup.find_all('table')
-        for table in tables:
-            rows = table.find_all('tr')
-            # 查找包含IPO数据的表格（通过表头识别）
-            for row_idx, row in enumerate(rows):
-                cells = row.find_all(['td', 'th'])
-                if cells:
-                    row_data = [cell.get_text().strip() for cell in cells]
-                    
-                    # 检查是否是表头行（包含"名稱"和"代號"）
-                    if len(row_data) > 1 and '名稱' in row_data[1] and '代號' in row_data[1]:
-                        # 找到表头，继续读取后续数据行
-                        for data_row in rows[row_idx+1:]:
-                            data_cells = data_row.find_all(['td', 'th'])
-                            if data_cells and len(data_cells) >= len(columns):
-                                data_row_data = [cell.get_text().strip() for cell in data_cells]
-                                # 过滤掉说明行和分页行
-                                if data_row_data[1] and '.HK' in data_row_data[1] and '延遲報價' not in data_row_data[1] and '下一頁' not in data_row_data[1]:
-                                    # 提取公司名称和代号（它们在同一个单元格）
-                                    name_code = data_row_data[1]
-                                    # 分离名称和代号
-                                    parts = name_code.split('.HK')
-                                    if len(parts) >= 1:
-                                        # 找到代号（通常是数字）
-                                        import re
-                                        code_match = re.search(r'(\d{5})', parts[0])
-                                        if code_match:
-                                            code = code_match.group(1)
-                                            name = parts[0].replace(code, '').strip()
-                                            # 移除"跌穿上市價"等标记
-                                            name = re.sub(r'(跌穿上市價|認購不足)', '', name).strip()
-                                            
-                                            # 构建清洗后的数据行
-                                            cleaned_row = [
-                                                name,  # 名稱
-                                                code,  # 代號
-                                                data_row_data[2] if len(data_row_data) > 2 else '',  # 上市日期
-                                                data_row_data[3] if len(data_row_data) > 3 else '',  # 每手股數
-                                                data_row_data[4] if len(data_row_data) > 4 else '',  # 上市市值
-                                                data_row_data[5] if len(data_row_data) > 5 else '',  # 招股價
-                                                data_row_data[6] if len(data_row_data) > 6 else '',  # 上市價
-                                                data_row_data[7] if len(data_row_data) > 7 else '',  # 超額倍數
-                                                data_row_data[8] if len(data_row_data) > 8 else '',  # 穩中一手
-                                                data_row_data[9] if len(data_row_data) > 9 else '',  # 中籤率
-                                                data_row_data[10] if len(data_row_data) > 10 else '',  # 現價
-                                                data_row_data[11] if len(data_row_data) > 11 else '',  # 首日表現
-                                                data_row_data[12] if len(data_row_data) > 12 else '',  # 累積表現
-                                            ]
-                                            parsed_data.append(cleaned_row)
-                        break
-    elif isinstance(raw_data, list):
-        # 如果已经是解析后的数据列表
-        for row_data in raw_data:
-            if isinstance(row_data, list) and len(row_data) > 1:
-                # 检查是否是数据行（包含.HK）
-                if '.HK' in str(row_data[1]) and '延遲報價' not in str(row_data[1]) and '下一頁' not in str(row_data[1]):
-                    name_code = row_data[1]
-                    parts = name_code.split('.HK')
-                    if len(parts) >= 1:
-                        import re
-                        code_match = re.search(r'(\d{5})', parts[0])
-                        if code_match:
-                            code = code_match.group(1)
-                            name = parts[0].replace(code, '').strip()
-                            name = re.sub(r'(跌穿上市價|認購不足)', '', name).strip()
-                            
-                            cleaned_row = [
-                                name,
-                                code,
-                                row_data[2] if len(row_data) > 2 else '',
-                                row_data[3] if len(row_data) > 3 else '',
-                                row_data[4] if len(row_data) > 4 else '',
-                                row_data[5] if len(row_data) > 5 else '',
-                                row_data[6] if len(row_data) > 6 else '',
-                                row_data[7] if len(row_data) > 7 else '',
-                                row_data[8] if len(row_data) > 8 else '',
-                                row_data[9] if len(row_data) > 9 else '',
-                                row_data[10] if len(row_data) > 10 else '',
-                                row_data[11] if len(row_data) > 11 else '',
-                                row_data[12] if len(row_data) > 12 else '',
-                            ]
-                            parsed_data.append(cleaned_row)
+    known = df.index.isin(merged.index)
+    existing = df[known]
+    changed = (merged.loc[existing.index, MUTABLE_COLUMNS] != existing[MUTABLE_COLUMNS]).any(axis=1)
+    merged.loc[existing.index, MUTABLE_COLUMNS] = existing[MUTABLE_COLUMNS]
     
-    # 创建DataFrame
-    if parsed_data:
-        df = pd.DataFrame(parsed_data, columns=columns)
-    else:
-        df = pd.DataFrame(columns=columns)
+    new_rows = df[~known]
+    # 新上市的排在前面，与网站的排序保持一致
+    merged = pd.concat([merged.iloc[:insert_at], new_rows, merged.iloc[insert_at:]])
     
-    return df
+    return merged.reset_index()[IPO_COLUMNS], len(new_rows), int(changed.sum())
 
 
-def main():
+def iter_ipo_pages(start_page=1, max_workers=1, requests_per_second=None, max_pages=MAX_PAGES,
+                   session=None, timeout=DEFAULT_TIMEOUT):
     """
-    主函数：获取港股IPO数据并保存到CSV
+    按页码顺序逐页产出 (page_num, raw_data, is_last)，自动识别末页（见 ipo_sources.iter_pages）
+    某页所有抓取方式都失败时产出 (page_num, None, False) 后停止，调用方据此保存断点
     """
-    print("开始获取港股IPO数据...")
+    adapter = AastocksAdapter(session=session, timeout=timeout, pool_size=max(1, max_workers))
+    return iter_pages(adapter, start_page, max_workers=max_workers, requests_per_second=requests_per_second,
+                      max_pages=max_pages)
+
+
+def _checkpoint_path(store_path):
+    return store_path + CHECKPOINT_SUFFIX
+
+
+def _remove_checkpoint(store_path):
+    try:
+        os.remove(_checkpoint_path(store_path))
+    except FileNotFoundError:
+        pass
+
+
+def _past_last_page(page_num):
+    """断点页获取失败时检查前一页是否为末页（断点已超出末页，而不是网络问题）"""
+    if page_num <= 1:
+        return False
+    with AastocksAdapter() as adapter:
+        raw_data = adapter.fetch_rows(page_num - 1)
+    return bool(raw_data) and adapter.is_last_page(raw_data)
+
+
+def load_checkpoint(store_path=STORE_PATH):
+    """读取上次中断的抓取断点，没有断点时返回 None"""
+    try:
+        with open(_checkpoint_path(store_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _save_checkpoint(store_path, checkpoint):
+    path = _checkpoint_path(store_path)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+def _write_store(store, store_path):
+    # 先写临时文件再替换，中断时不会留下不完整的本地库
+    with metrics.timer('ipo_store_write'):
+        store.to_csv(store_path + '.tmp', index=False, encoding='utf-8-sig')
+        os.replace(store_path + '.tmp', store_path)
+
+
+def crawl_to_store(store_path=STORE_PATH, history_root='hk_ipo_history', incremental=True, max_workers=4,
+                   requests_per_second=4, chunk_pages=CHUNK_PAGES, max_pages=MAX_PAGES, resume=True):
+    """
+    流式抓取：逐页 获取 -> 提取行，每 chunk_pages 页整块解析、合并进本地库、规范化后追加到历史库并保存断点
+    原始行和解析结果只保留当前一块，内存占用与总页数无关（本地库本身常驻内存，按代號合并需要）
+    :param incremental: 遇到整页都是已知代號时停止翻页；本地库为空时自动改为全量
+    :param resume: 存在断点时从断点页继续（上次中断前已写入的页不再重复抓取）
+    :return: (本地库, 新增条数, 更新条数, 是否已抓取到末页或增量停止点)
+    """
+    store = load_ipo_store(store_path)
+    incremental = incremental and not store.empty
+    start_page, added, updated = 1, 0, 0
+    checkpoint = load_checkpoint(store_path) if resume else None
+    if checkpoint:
+        start_page, added, updated = checkpoint['next_page'], checkpoint['added'], checkpoint['updated']
+        incremental = checkpoint['incremental']
+        print(f"从断点继续抓取: 第 {start_page} 页（{checkpoint['updated_at']} 中断）")
+    elif incremental:
+        progress(f"本地库已有 {len(store)} 条记录，进行增量抓取...")
+    known_codes = set(store['代號'])
     
-    all_data = []  # 存储所有页面的数据
+    saved = False
+    append_ipo_history = None
+    try:
+        from ipo_history import append_ipo_history
+    except ImportError:
+        print("pyarrow未安装，跳过写入历史库，请运行: pip install pyarrow")
     
-    # 遍历从page=1到page=11的所有页面
-    for page_num in range(1, 12):  # 1到11（包含）
-        print(f"正在获取第 {page_num} 页数据...")
-        
-        # 首先尝试使用普通请求获取数据
-        raw_data = fetch_hk_ipo_data(page_num)
-        
-        if not raw_data or isinstance(raw_data, str):
-            print(f"第 {page_num} 页普通请求未获取到有效数据，尝试使用Session方式...")
-            raw_data = fetch_hk_ipo_with_requests_session(page_num)
-        
-        if not raw_data or isinstance(raw_data, str):
-            print(f"第 {page_num} 页Session方式也未获取到有效数据，尝试使用Selenium...")
-            raw_data = fetch_hk_ipo_with_selenium(page_num)
-        
-        if raw_data:
-            print(f"第 {page_num} 页获取到 {len(raw_data) if isinstance(raw_data, list) else 'raw text'} 条记录")
-            all_data.extend(raw_data)  # 将当前页数据添加到总数据中
-        else:
-            print(f"第 {page_num} 页未能获取到任何数据")
+    def write(rows, next_page):
+        nonlocal store, added, updated, saved
+        df = parse_ipo_data(rows)
+        store, chunk_added, chunk_updated = update_ipo_store(store, df, insert_at=added)
+        added, updated = added + chunk_added, updated + chunk_updated
+        _write_store(store, store_path)
+        if append_ipo_history is not None:
+            with metrics.timer('ipo_history_append'):
+                append_ipo_history(normalize_ipo_data(df), root=history_root)
+        metrics.count('ipo_rows_added', chunk_added)
+        metrics.count('ipo_rows_updated', chunk_updated)
+        # 本块写入完成后再记录断点，中断后重复处理同一块也不会产生重复数据
+        _save_checkpoint(store_path, {'next_page': next_page, 'added': added, 'updated': updated,
+                                      'incremental': incremental, 'updated_at': datetime.now().isoformat()})
+        saved = True
+        progress(f"已写入至第 {next_page - 1} 页: 新增 {added} 条，更新 {updated} 条")
     
-    if all_data:
-        print(f"总共获取到 {len(all_data)} 条记录")
+    # 增量抓取逐页判断是否停止，不预取
+    pages = iter_ipo_pages(start_page, max_workers=1 if incremental else max_workers,
+                           requests_per_second=requests_per_second, max_pages=max_pages)
+    chunk, chunk_size, failed, stopped, reached_end, next_page = [], 0, False, False, False, start_page
+    for page_num, raw_data, is_last in pages:
+        if raw_data is None:
+            failed = True
+            break
+        next_page = page_num + 1
+        reached_end = is_last
         
-        # 解析所有数据
-        df = parse_ipo_data(all_data)
-        
-        # 打印前几行以检查数据
-        print("获取的数据预览:")
-        if not df.empty:
-            print(df.head())
-        else:
-            print("DataFrame为空")
+        chunk.extend(raw_data)
+        chunk_size += 1
+        new_codes = AASTOCKS.page_codes(raw_data) - known_codes
+        progress(f"第 {page_num} 页获取到 {len(raw_data)} 行，其中新代號 {len(new_codes)} 个")
+        stopped = incremental and not new_codes
+        if chunk_size >= chunk_pages or stopped:
+            write(chunk, next_page)
+            chunk, chunk_size = [], 0
+        if stopped:
+            pages.close()
+            break
+    if chunk:
+        write(chunk, next_page)
+    
+    # 获取失败或达到翻页上限（未到末页）时保留断点，下次运行从断点页继续
+    complete = not failed and (stopped or reached_end)
+    if failed and checkpoint and next_page == start_page and _past_last_page(start_page):
+        # 断点指向末页之后（上次实际已抓取完成），删除断点，下次从第1页开始
+        print(f"断点第 {start_page} 页已超出末页，已删除断点，下次运行将从第1页开始")
+        complete = True
+    if complete:
+        _remove_checkpoint(store_path)
+    elif failed and saved:
+        print(f"第 {next_page} 页未能获取到任何数据，已保存断点，下次运行将从第 {next_page} 页继续")
+    elif failed and checkpoint:
+        print(f"第 {next_page} 页未能获取到任何数据，保留原断点，下次运行将从第 {next_page} 页继续")
+    elif failed:
+        print(f"第 {next_page} 页未能获取到任何数据")
+    elif saved:
+        print(f"已达到翻页上限 {max_pages} 页，已保存断点，下次运行将从第 {next_page} 页继续")
+    return store, added, updated, complete
+
+
+def main(max_workers=4, requests_per_second=4, incremental=True, store_path=STORE_PATH,
+         snapshot=False, history_root='hk_ipo_history', resume=True, max_pages=MAX_PAGES):
+    """
+    主函数：获取港股IPO数据并保存到本地IPO库
+    :param max_workers: 并发抓取的线程数（全量抓取时使用）
+    :param requests_per_second: 对aastocks的每秒请求上限（None表示不限速）
+    :param incremental: 本地库已有数据时只抓取到已知代號为止
+    :param store_path: 本地IPO库路径
+    :param snapshot: 是否额外保存一份带时间戳的CSV
+    :param history_root: Parquet历史库目录
+    :param resume: 上次抓取中断时从断点页继续
+    :param max_pages: 本次最多抓取的页数（末页由分页自动识别）
+    """
+    progress("开始获取港股IPO数据...")
+    
+    store, added, updated, complete = crawl_to_store(
+        store_path, history_root, incremental=incremental, max_workers=max_workers,
+        requests_per_second=requests_per_second, max_pages=max_pages, resume=resume)
+    
+    if not store.empty:
+        print(f"本地库已更新: 新增 {added} 条，更新 {updated} 条，共 {len(store)} 条，保存到 {store_path}")
+        if not complete and os.path.exists(_checkpoint_path(store_path)):
+            print("本次抓取未完成，下次运行将从断点继续")
         
-        # 生成文件名（包含当前时间）
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f'hk_ipo_data_{timestamp}.csv'
+        # 历史库已在抓取过程中分块追加，这里只重新计算变化了的月份的汇总
+        analytics = None
+        if os.path.isdir(history_root):
+            try:
+                from ipo_analytics import IpoAnalytics
+                analytics = IpoAnalytics(history_root)
+                with metrics.timer('ipo_analytics_refresh'):
+                    months = analytics.refresh()
+                print(f"历史库已更新 {len(months)} 个月份分区，保存到 {history_root}")
+            except ImportError:
+                pass
         
-        # 保存到CSV
-        df.to_csv(filename, index=False, encoding='utf-8-sig')
-        print(f"数据已保存到 {filename}")
+        if snapshot:
+            # 生成文件名（包含当前时间）
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f'hk_ipo_data_{timestamp}.csv'
+            
+            # 保存到CSV
+            store.to_csv(filename, index=False, encoding='utf-8-sig')
+            print(f"数据已保存到 {filename}")
         
         # 显示数据摘要
         print(f"\n数据摘要:")
-        print(f"总记录数: {len(df)}")
-        print(f"列数: {len(df.columns)}")
-        print(f"列名: {list(df.columns)}")
+        print(f"总记录数: {len(store)}")
+        if analytics is not None:
+            recent = analytics.by_month().tail(6)
+            print("近6个月首日表現:")
+            print(recent[['listings', 'first_day_mean', 'first_day_win_rate']].round(2).to_string())
     else:
         print("未能获取到任何数据，请检查网络连接和网站访问权限")
         
@@ -410,4 +687,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    if not is_quiet():
+        metrics.report()
+    export_metrics('hk_ipo')
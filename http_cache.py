@@ -0,0 +1,222 @@
+"""
+抓取页面的HTTP响应缓存（aastocks 列表页、multpl.com PE 表格共用）
+
+- 每次请求都带上次的 ETag / Last-Modified 做条件请求，服务器返回 304 时直接使用本地副本
+- 响应内容按 SHA-1 哈希；内容与上次相同时（包括服务器不支持条件请求的情况）跳过重新解析，
+  直接读取上次的解析结果（见 HttpCache.parse，解析结果需可JSON序列化）
+- 磁盘占用有上限：超过 max_bytes 时淘汰最久未使用的URL
+- 默认目录为行情缓存目录下的 http/，与行情缓存一起被 CI 缓存
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import metrics
+
+
+HTTP_CACHE_DIR = os.environ.get('HTTP_CACHE_DIR',
+                                os.path.join(os.environ.get('MARKET_CACHE_DIR', '.market_cache'), 'http'))
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# content 为响应体；changed 表示内容与上次缓存的不同；revalidated 表示服务器返回了 304
+CachedResponse = namedtuple('CachedResponse', ['url', 'status_code', 'content', 'digest', 'changed', 'revalidated'])
+
+
+def _url_key(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def _write_atomic(path, data):
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+class HttpCache:
+    """
+    磁盘HTTP响应缓存（线程安全，可供并发抓取的多个线程共用）
+    - index.json：每个URL的 ETag、Last-Modified、内容哈希、占用字节数、最近使用时间、已缓存的解析结果
+    - <URL哈希>.body：响应体；<URL哈希>.<名称>.json：解析结果
+    """
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None
+        self._session = None
+
+    @property
+    def session(self):
+        """未指定 session 的请求共用的连接池（常驻运行时复用连接）"""
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+            return self._session
+
+    def _path(self, key, suffix='.body'):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(os.path.join(self.cache_dir, 'index.json'), encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        _write_atomic(os.path.join(self.cache_dir, 'index.json'),
+                      json.dumps(self._index, ensure_ascii=False).encode('utf-8'))
+
+    def _evict(self):
+        """超过 max_bytes 时按最近使用时间淘汰"""
+        index = self._index
+        total = sum(entry['size'] for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k]['used_at']):
+            if total <= self.max_bytes:
+                break
+            total -= index.pop(key)['size']
+            for path in glob.glob(self._path(key, '.*')):
+                os.remove(path)
+
+    def _read_body(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def get(self, url, session=None, headers=None, timeout=10):
+        """
+        条件GET：有缓存时带 If-None-Match / If-Modified-Since
+        :param session: requests.Session；默认使用缓存自带的连接池
+        :return: CachedResponse；状态码非200/304时原样返回且不缓存
+        """
+        key = _url_key(url)
+        with self._lock:
+            entry = self._load_index().get(key)
+            cached_body = self._read_body(key) if entry else None
+
+        request_headers = dict(headers or {})
+        if cached_body is not None:
+            if entry.get('etag'):
+                request_headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                request_headers['If-Modified-Since'] = entry['last_modified']
+
+        http = session if session is not None else self.session
+        response = http.get(url, headers=request_headers, timeout=timeout)
+
+        if response.status_code == 304 and cached_body is not None:
+            metrics.count('http_cache', result='not_modified')
+            with self._lock:
+                entry = self._load_index().get(key, entry)
+                entry['used_at'] = time.time()
+                self._save_index()
+            return CachedResponse(url, 200, cached_body, entry['digest'], False, True)
+
+        if response.status_code != 200:
+            return CachedResponse(url, response.status_code, response.content, None, True, False)
+
+        content = response.content
+        digest = hashlib.sha1(content).hexdigest()
+        changed = cached_body is None or entry['digest'] != digest
+        metrics.count('http_cache', result='changed' if changed else 'unchanged')
+
+        with self._lock:
+            index = self._load_index()
+            previous = index.get(key) or {}
+            parsed = previous.get('parsed', {}) if not changed else {}
+            if changed:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                _write_atomic(self._path(key), content)
+                for name in previous.get('parsed', {}):
+                    try:
+                        os.remove(self._path(key, f'.{name}.json'))
+                    except FileNotFoundError:
+                        pass
+            index[key] = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'digest': digest,
+                'size': len(content) + sum(previous.get('parsed_sizes', {}).get(name, 0) for name in parsed),
+                'used_at': time.time(),
+                'parsed': parsed,
+                'parsed_sizes': {name: previous['parsed_sizes'][name] for name in parsed},
+            }
+            self._evict()
+            self._save_index()
+        return CachedResponse(url, 200, content, digest, changed, False)
+
+    def parse(self, response, name, parse):
+        """
+        解析响应并缓存结果；响应内容与上次解析时相同时直接读取上次的结果
+        :param response: get 返回的 CachedResponse
+        :param name: 解析结果的名称（同一URL可有多种解析）
+        :param parse: 解析函数，参数为响应体bytes，返回值需可JSON序列化
+        """
+        key = _url_key(response.url)
+        path = self._path(key, f'.{name}.json')
+        with self._lock:
+            entry = self._load_index().get(key)
+            cached = entry is not None and entry.get('parsed', {}).get(name) == response.digest
+        if cached and response.digest:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    result = json.load(f)
+                metrics.count('http_cache_parse', result='hit')
+                return result
+            except (FileNotFoundError, ValueError):
+                pass
+
+        metrics.count('http_cache_parse', result='miss')
+        result = parse(response.content)
+        if not response.digest:
+            return result
+
+        data = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            entry = self._load_index().get(key)
+            # 期间该URL已被更新或淘汰时不保存，避免解析结果与缓存内容不一致
+            if entry is None or entry['digest'] != response.digest:
+                return result
+            _write_atomic(path, data)
+            entry['size'] += len(data) - entry['parsed_sizes'].get(name, 0)
+            entry['parsed'][name] = response.digest
+            entry['parsed_sizes'][name] = len(data)
+            self._evict()
+            self._save_index()
+        return result
+
+
+_default_cache = None
+
+
+def default_cache():
+    """进程内共用的缓存实例（目录 HTTP_CACHE_DIR）"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = HttpCache()
+    return _default_cache
+
+
+def configure(cache_dir=HTTP_CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """替换共用的缓存实例（如基准测试时指向临时目录）"""
+    global _default_cache
+    _default_cache = HttpCache(cache_dir, max_bytes)
+    return _default_cache
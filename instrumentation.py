@@ -0,0 +1,194 @@
+"""
+运行指标：各阶段的计时和计数，导出为 JSON Lines 或 Prometheus textfile
+
+用法：
+    from instrumentation import metrics, progress
+
+    with metrics.timer('ipo_fetch', strategy='requests'):
+        ...
+    metrics.count('ipo_rows', len(rows))
+    progress("正在获取第 1 页数据...")   # 安静模式下不输出
+
+环境变量：
+- METRICS_JSONL      每次运行结束后向该文件追加一行JSON（便于长期比较每日运行耗时）
+- METRICS_TEXTFILE   每次运行结束后覆盖写入 Prometheus textfile（node_exporter textfile collector）
+- QUIET_MODE=1       安静模式：不输出逐页、逐批的进度信息，错误和结果仍然输出
+"""
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+
+METRICS_JSONL = os.environ.get('METRICS_JSONL')
+METRICS_TEXTFILE = os.environ.get('METRICS_TEXTFILE')
+PROMETHEUS_PREFIX = 'vixalert'
+
+_quiet = os.environ.get('QUIET_MODE', '').lower() in ('1', 'true', 'yes')
+
+
+def set_quiet(quiet=True):
+    """开启或关闭安静模式"""
+    global _quiet
+    _quiet = quiet
+
+
+def is_quiet():
+    return _quiet
+
+
+def progress(*args, **kwargs):
+    """输出进度信息；安静模式下忽略"""
+    if not _quiet:
+        print(*args, **kwargs)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """
+    线程安全的计时器和计数器（并发抓取的多个线程共用一个实例）
+    计时器按 (名称, 标签) 汇总为 次数/总耗时/最大耗时，计数器按 (名称, 标签) 累加
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._timers = {}
+            self._counters = {}
+            self.started_at = time.time()
+
+    def observe(self, name, seconds, **labels):
+        """记录一次耗时"""
+        key = _key(name, labels)
+        with self._lock:
+            stat = self._timers.setdefault(key, [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] = max(stat[2], seconds)
+
+    def count(self, name, value=1, **labels):
+        """计数器累加 value"""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """计时上下文；抛出异常时同样记录耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """计时装饰器"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """当前所有指标，{'timers': [...], 'counters': [...]}"""
+        with self._lock:
+            timers = [{'name': name, 'labels': dict(labels), 'count': count,
+                       'total_seconds': round(total, 6), 'max_seconds': round(longest, 6)}
+                      for (name, labels), (count, total, longest) in sorted(self._timers.items())]
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self._counters.items())]
+        return {'timers': timers, 'counters': counters}
+
+    def export_jsonl(self, path, **run_info):
+        """向 path 追加一行：本次运行的开始时间、耗时、run_info 和全部指标"""
+        record = {
+            'started_at': datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+            'duration_seconds': round(time.time() - self.started_at, 6),
+            **run_info,
+            **self.snapshot(),
+        }
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def export_prometheus(self, path, prefix=PROMETHEUS_PREFIX, **run_info):
+        """
+        以 Prometheus 文本格式写入 path（先写临时文件再替换，避免采集到半个文件）
+        计时器输出为 summary（_sum/_count）和 _max gauge，计数器输出为 counter（_total）
+        """
+        snapshot = self.snapshot()
+        lines = []
+        declared = set()
+
+        def declare(metric, kind):
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} {kind}")
+
+        for timer in snapshot['timers']:
+            metric = f"{prefix}_{timer['name']}_seconds"
+            labels = _format_labels({**run_info, **timer['labels']})
+            declare(metric, 'summary')
+            lines.append(f"{metric}_sum{labels} {timer['total_seconds']}")
+            lines.append(f"{metric}_count{labels} {timer['count']}")
+        for timer in snapshot['timers']:
+            metric = f"{prefix}_{timer['name']}_seconds_max"
+            declare(metric, 'gauge')
+            lines.append(f"{metric}{_format_labels({**run_info, **timer['labels']})} {timer['max_seconds']}")
+        for counter in snapshot['counters']:
+            metric = f"{prefix}_{counter['name']}_total"
+            declare(metric, 'counter')
+            lines.append(f"{metric}{_format_labels({**run_info, **counter['labels']})} {counter['value']}")
+
+        labels = _format_labels(run_info)
+        declare(f"{prefix}_last_run_timestamp_seconds", 'gauge')
+        lines.append(f"{prefix}_last_run_timestamp_seconds{labels} {round(self.started_at, 3)}")
+        declare(f"{prefix}_last_run_duration_seconds", 'gauge')
+        lines.append(f"{prefix}_last_run_duration_seconds{labels} {round(time.time() - self.started_at, 6)}")
+
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(path + '.tmp', path)
+
+    def report(self):
+        """打印各计时器的汇总（按总耗时降序）"""
+        timers = sorted(self.snapshot()['timers'], key=lambda t: -t['total_seconds'])
+        if not timers:
+            return
+        print(f"\n{'阶段':<28}{'次数':>6}{'总耗时(s)':>12}{'最大(s)':>10}")
+        for t in timers:
+            labels = ','.join(f"{k}={v}" for k, v in t['labels'].items())
+            name = f"{t['name']}{{{labels}}}" if labels else t['name']
+            print(f"{name:<28}{t['count']:>6}{t['total_seconds']:>12.3f}{t['max_seconds']:>10.3f}")
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape_label(v)}"' for k, v in sorted(labels.items())) + '}'
+
+
+# 进程内共用的指标实例
+metrics = Metrics()
+
+
+def export_metrics(job):
+    """按环境变量 METRICS_JSONL / METRICS_TEXTFILE 导出本次运行的指标，job 用于区分不同脚本"""
+    if METRICS_JSONL:
+        metrics.export_jsonl(METRICS_JSONL, job=job)
+    if METRICS_TEXTFILE:
+        metrics.export_prometheus(METRICS_TEXTFILE, job=job)
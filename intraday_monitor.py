@@ -0,0 +1,362 @@
+"""
+盘中VIX/回撤监控：逐笔处理行情，条件越过边界时立即按规则表发出档位建议
+
+- 前 window 个交易日收盘价的最高点用单调队列维护：每笔行情只做一次减法和除法，
+  换日时把上一交易日最后价格作为收盘价压入队列（均摊 O(1)），不重新扫描整个窗口
+- 与每日提醒（vix-strategy）使用同一份规则表（signal_engine），最高点同样不含当日
+- 条件带滞回：已满足的条件要越过阈值 band 以上才变为不满足（如 VIX 阈值 40、band 0.5：
+  升破 40 触发后，要跌到 39.5 以下才解除），避免在阈值附近反复触发
+- 同一代码进入同一档位时只通知一次，cooldown 内离开后再次进入也不重复通知
+- 行情来源可替换：YahooPollingFeed 轮询 yfinance 分钟线，ReplayFeed 回放本地CSV（测试用）
+- 常驻调度（scheduler.py 的 intraday 任务）每 N 分钟调用 check()：每次轮询一次，监控器在同一交易日内常驻，
+  最高点、滞回状态和已通知的档位在各次调用间保留
+
+用法：
+    python intraday_monitor.py                          # 轮询 SPY 和 ^VIX，每60秒一次
+    python intraday_monitor.py --replay ticks.csv       # 回放本地行情（列：time,symbol,price）
+"""
+import argparse
+import os
+import time
+from collections import deque, namedtuple
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import metrics, progress
+from signal_engine import WINDOW, _resolve_rules
+
+
+MARKET_TZ = 'America/New_York'
+
+# 各字段的滞回宽度（与字段同单位：VIX点数、回撤百分点、PE）
+DEFAULT_BANDS = {'vix': 0.5, 'pullback': 0.25, 'pe': 0.0}
+
+Tick = namedtuple('Tick', ['time', 'symbol', 'price'])
+
+Alert = namedtuple('Alert', ['time', 'symbol', 'tier', 'advice', 'price', 'high', 'pullback', 'vix', 'pe'])
+
+
+class RunningMax:
+    """
+    最近 window 个值的最大值（单调递减队列）
+    push 均摊 O(1)，max O(1)；不足 window 个值时 max 为 NaN（与 rolling_pullback 的 min_periods 一致）
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._queue = deque()  # (序号, 值)，值从队首到队尾递减
+        self._count = 0
+
+    def push(self, value):
+        while self._queue and self._queue[-1][1] <= value:
+            self._queue.pop()
+        self._queue.append((self._count, value))
+        self._count += 1
+        while self._queue[0][0] <= self._count - 1 - self.window:
+            self._queue.popleft()
+
+    @property
+    def max(self):
+        if self._count < self.window:
+            return np.nan
+        return self._queue[0][1]
+
+
+class HysteresisConditions:
+    """
+    带滞回的条件求值：条件上一次为真时，阈值向放宽方向移动 band
+    （gt/ge 阈值减 band，lt/le 阈值加 band），上一次为假时使用原阈值
+    """
+
+    def __init__(self, rules, bands=None):
+        self.rules = rules
+        bands = {**DEFAULT_BANDS, **(bands or {})}
+        self._checks = {}
+        for name, (field, checks) in rules.conditions.items():
+            band = bands.get(field, 0.0)
+            loosened = [(compare, threshold - band if compare in (np.greater, np.greater_equal) else threshold + band)
+                        for compare, threshold in checks]
+            self._checks[name] = (field, checks, loosened)
+        self.state = {name: False for name in self._checks}
+
+    def evaluate(self, fields):
+        """:param fields: {字段名: 标量}；返回 {条件名: bool}"""
+        for name, (field, checks, loosened) in self._checks.items():
+            value = fields[field]
+            active = loosened if self.state[name] else checks
+            self.state[name] = all(bool(compare(value, threshold)) for compare, threshold in active)
+        return dict(self.state)
+
+
+class _SymbolState:
+    def __init__(self, window, rules, bands):
+        self.high = RunningMax(window)
+        self.conditions = HysteresisConditions(rules, bands)
+        self.session = None
+        self.session_end = None
+        self.price = None
+        self.tier = rules.hold
+        self.notified = {}  # 档位 -> 最近通知时间
+
+
+class IntradayMonitor:
+    """
+    逐笔行情监控
+    :param symbols: 监控的代码
+    :param daily_closes: 日期 × 代码 的日线收盘价，用于初始化最高点（只使用首笔行情所在交易日之前的）
+    :param pe: PE 数值（盘中不变）
+    :param bands: 各字段的滞回宽度，默认 DEFAULT_BANDS
+    :param cooldown: 同一档位两次通知的最小间隔
+    :param notify: 回调 notify(alert)，档位变为非"持有"档位且需要通知时调用
+    """
+
+    def __init__(self, symbols, daily_closes=None, pe=None, vix_symbol='^VIX', window=WINDOW, rules=None,
+                 bands=None, cooldown=timedelta(hours=4), notify=None):
+        self.rules = _resolve_rules(rules)
+        self.vix_symbol = vix_symbol
+        self.pe = np.nan if pe is None else float(pe)
+        self.cooldown = pd.Timedelta(cooldown)
+        self.notify = notify
+        self.vix = np.nan
+        self._daily_closes = daily_closes
+        self._states = {symbol: _SymbolState(window, self.rules, bands) for symbol in symbols}
+
+    def _roll_session(self, state, symbol, session):
+        """进入新交易日：首次时用历史日线初始化，之后把上一交易日的最后价格作为收盘价压入"""
+        if state.session is None:
+            if self._daily_closes is not None and symbol in self._daily_closes:
+                closes = self._daily_closes[symbol].dropna()
+                for close in closes[closes.index < session].to_numpy():
+                    state.high.push(float(close))
+        elif state.price is not None:
+            state.high.push(state.price)
+        state.session = session
+        state.session_end = (session + pd.Timedelta(days=1)).tz_localize(MARKET_TZ)
+
+    def on_tick(self, tick):
+        """
+        处理一笔行情
+        :return: 本笔行情触发的 Alert 列表
+        """
+        metrics.count('intraday_ticks')
+        if tick.symbol == self.vix_symbol:
+            self.vix = float(tick.price)
+            return [alert for symbol in self._states if (alert := self._evaluate(symbol, tick.time))]
+
+        state = self._states.get(tick.symbol)
+        if state is None:
+            return []
+        # 同一交易日内只比较时间，不做时区换算
+        if state.session_end is None or tick.time >= state.session_end:
+            session = pd.Timestamp(tick.time).tz_convert(MARKET_TZ).tz_localize(None).normalize()
+            self._roll_session(state, tick.symbol, session)
+        state.price = float(tick.price)
+        alert = self._evaluate(tick.symbol, tick.time)
+        return [alert] if alert else []
+
+    def _classify(self, conditions):
+        """CompiledRules.classify 的标量版本：逐笔行情只有一组条件，不必构造数组"""
+        for tier, (all_names, any_names) in enumerate(self.rules.tiers):
+            if all(conditions[n] for n in all_names) and (not any_names or any(conditions[n] for n in any_names)):
+                return tier
+        return self.rules.hold
+
+    def _evaluate(self, symbol, when):
+        state = self._states[symbol]
+        high = state.high.max
+        if state.price is None or np.isnan(high) or np.isnan(self.vix):
+            return None
+        pullback = (high - state.price) / high * 100
+        conditions = state.conditions.evaluate({'vix': self.vix, 'pullback': pullback, 'pe': self.pe})
+        tier = self._classify(conditions)
+        if tier == state.tier:
+            return None
+
+        state.tier = tier
+        if tier == self.rules.hold:
+            return None
+        when = pd.Timestamp(when)
+        last = state.notified.get(tier)
+        if last is not None and when - last < self.cooldown:
+            return None
+        state.notified[tier] = when
+        metrics.count('intraday_alerts', tier=tier)
+        alert = Alert(when, symbol, tier, self.rules.labels[tier], state.price, high, pullback, self.vix, self.pe)
+        if self.notify is not None:
+            self.notify(alert)
+        return alert
+
+    def run(self, feed):
+        """处理行情源中的所有行情，返回触发的 Alert 列表"""
+        alerts = []
+        for tick in feed:
+            alerts.extend(self.on_tick(tick))
+        return alerts
+
+
+def _as_market_time(value):
+    value = pd.Timestamp(value)
+    return value.tz_localize(MARKET_TZ) if value.tzinfo is None else value
+
+
+class ReplayFeed:
+    """
+    回放本地行情CSV（列：time,symbol,price；time 不带时区时按纽约时间），按时间顺序输出 Tick
+    :param speed: None 表示不等待；1 表示按原始时间间隔实时回放，2 表示两倍速
+    """
+
+    def __init__(self, source, speed=None):
+        self.source = source
+        self.speed = speed
+
+    def __iter__(self):
+        frame = self.source if isinstance(self.source, pd.DataFrame) else pd.read_csv(self.source)
+        frame = frame.assign(time=frame['time'].map(_as_market_time)).sort_values('time', kind='stable')
+        previous = None
+        for when, symbol, price in frame[['time', 'symbol', 'price']].itertuples(index=False):
+            if self.speed and previous is not None:
+                time.sleep(max(0.0, (when - previous).total_seconds() / self.speed))
+            previous = when
+            yield Tick(when, symbol, float(price))
+
+
+class YahooPollingFeed:
+    """
+    轮询 yfinance 当日分钟线，每次一个批量请求取得所有代码的最新价格；价格时间未变化的代码不重复输出
+    :param max_polls: 轮询次数上限（None 表示不限）
+    """
+
+    def __init__(self, symbols, interval=60, download=None, max_polls=None):
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.download = download
+        self.max_polls = max_polls
+
+    def poll(self):
+        import yfinance as yf
+
+        download = self.download or yf.download
+        with metrics.timer('intraday_poll'):
+            raw = download(self.symbols, period='1d', interval='1m', progress=False)
+        if raw is None or raw.empty:
+            return []
+        closes = raw['Close']
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(self.symbols[0])
+        ticks = []
+        for symbol in self.symbols:
+            if symbol not in closes:
+                continue
+            series = closes[symbol].dropna()
+            if not series.empty:
+                ticks.append(Tick(_as_market_time(series.index[-1]), symbol, float(series.iloc[-1])))
+        return ticks
+
+    def __iter__(self):
+        seen = {}
+        polls = 0
+        while self.max_polls is None or polls < self.max_polls:
+            polls += 1
+            try:
+                ticks = self.poll()
+            except Exception as e:
+                print(f"⚠️ 获取盘中行情失败: {e}")
+                ticks = []
+            for tick in ticks:
+                if seen.get(tick.symbol) != tick.time:
+                    seen[tick.symbol] = tick.time
+                    yield tick
+            if self.max_polls is None or polls < self.max_polls:
+                time.sleep(self.interval)
+
+
+def format_alert(alert):
+    """通知标题和内容（Markdown）"""
+    title = f"⚡ 盘中信号: {alert.symbol} {alert.advice}"
+    content = (
+        f"- 时间: {alert.time.tz_convert(MARKET_TZ).strftime('%Y-%m-%d %H:%M')} (纽约)\n"
+        f"- {alert.symbol} 价格: {alert.price:.2f}，近期高点: {alert.high:.2f}\n"
+        f"- 回撤: {alert.pullback:.2f}%\n"
+        f"- VIX: {alert.vix:.2f}\n"
+        f"- S&P 500 PE: {'获取失败' if np.isnan(alert.pe) else f'{alert.pe:.2f}'}\n"
+        f"- 建议操作: {alert.advice}"
+    )
+    return title, content
+
+
+def _make_notify(send_key):
+    """打印 Alert，指定 send_key 时同时发送微信通知"""
+    def notify(alert):
+        title, content = format_alert(alert)
+        print(f"\n{title}\n{content}")
+        if send_key:
+            from notifier import NotificationDispatcher
+            with NotificationDispatcher() as dispatcher:
+                dispatcher.add(title, content, send_key)
+                for result in dispatcher.flush():
+                    print("✅ 微信通知发送成功！" if result.error is None else f"❌ 发送失败: {result.error}")
+    return notify
+
+
+# 常驻运行时各次 check() 共用的监控器：{代码元组: (交易日, IntradayMonitor)}
+_resident = {}
+
+
+def check(symbols=('SPY',), send_key=None, download=None, now=None):
+    """
+    轮询一次盘中行情，交给常驻的 IntradayMonitor 处理（scheduler.py 的 intraday 任务按 every_minutes 调用）
+    同一交易日内复用同一个监控器，档位不变或在冷却期内不重复通知；进入新交易日时重新读取日线和 PE
+    :param send_key: Server酱 SendKey，默认读取环境变量 SERVERCHAN_SEND_KEY；都没有时只打印
+    :param download: 分钟线下载函数，默认 yf.download（见 YahooPollingFeed）
+    :return: 本次触发的 Alert 列表
+    """
+    symbols = tuple(symbols)
+    now = pd.Timestamp.now(tz=MARKET_TZ) if now is None else pd.Timestamp(now).tz_convert(MARKET_TZ)
+    session = now.tz_localize(None).normalize()
+    resident = _resident.get(symbols)
+    if resident is None or resident[0] != session:
+        from market_data import get_daily_closes, get_sp500_pe
+
+        send_key = send_key or os.environ.get('SERVERCHAN_SEND_KEY')
+        monitor = IntradayMonitor(symbols, daily_closes=get_daily_closes(list(symbols), lookback_days=120),
+                                  pe=get_sp500_pe(), notify=_make_notify(send_key))
+        _resident[symbols] = resident = (session, monitor)
+    monitor = resident[1]
+
+    alerts = monitor.run(YahooPollingFeed(list(symbols) + [monitor.vix_symbol], download=download, max_polls=1))
+    progress(f"盘中检查: {', '.join(symbols)}，VIX {monitor.vix:.2f}，触发 {len(alerts)} 次信号")
+    return alerts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="盘中VIX/回撤监控")
+    parser.add_argument('--symbols', nargs='+', default=['SPY'], help="监控的代码")
+    parser.add_argument('--interval', type=int, default=60, help="轮询间隔（秒）")
+    parser.add_argument('--replay', help="回放本地行情CSV（列：time,symbol,price）")
+    parser.add_argument('--speed', type=float, help="回放速度倍数（不指定则不等待）")
+    parser.add_argument('--send-key', default=os.environ.get('SERVERCHAN_SEND_KEY'),
+                        help="Server酱 SendKey（默认读取环境变量 SERVERCHAN_SEND_KEY；不指定则只打印）")
+    args = parser.parse_args()
+
+    from market_data import get_daily_closes, get_sp500_pe
+
+    closes = get_daily_closes(args.symbols, lookback_days=120)
+    pe = get_sp500_pe()
+
+    monitor = IntradayMonitor(args.symbols, daily_closes=closes, pe=pe, notify=_make_notify(args.send_key))
+    if args.replay:
+        feed = ReplayFeed(args.replay, speed=args.speed)
+    else:
+        feed = YahooPollingFeed(args.symbols + [monitor.vix_symbol], interval=args.interval)
+    progress(f"开始监控: {', '.join(args.symbols)}，VIX 代码 {monitor.vix_symbol}")
+    try:
+        alerts = monitor.run(feed)
+    except KeyboardInterrupt:
+        return
+    progress(f"行情结束，共触发 {len(alerts)} 次信号")
+
+
+if __name__ == "__main__":
+    main()
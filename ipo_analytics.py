@@ -0,0 +1,299 @@
+"""
+港股IPO统计分析：基于 Parquet 历史库（ipo_history）预先计算、增量维护的汇总和索引
+
+目录结构（与历史库分区放在一起，下划线开头的目录不会被当作分区读取）：
+    hk_ipo_history/_analytics/
+        stats.parquet   每个 (上市月份, 维度, 分组) 的充分统计量：条数、和、平方和、正值数、与超額倍數的交叉和
+        index.parquet   按上市日期排序的覆盖索引：代號、名稱、上市日期及主要数值列
+        state.json      各月份分区文件的 (修改时间, 大小)，用于判断哪些月份需要重新计算
+
+- refresh() 只重新计算新增或变化了的月份分区；各月份的统计量可以直接相加，
+  因此任意时间范围、任意分组的均值、标准差、胜率和相关系数都由少量汇总行求出，不必重新扫描历史
+- 维度：month（按上市月份）、oversubscription（超額倍數分档）、lot_odds（中籤率分档）
+- 相关系数为 log10(超額倍數) 与首日/累積表現的皮尔逊相关（超額倍數跨几个数量级，取对数后更稳定）
+- 按代號查询、按上市日期区间筛选只查内存中的索引（代號 -> 索引行 的映射、按日期二分查找），
+  需要完整记录时只读取对应的月份分区；代號映射随索引增量维护
+"""
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import pyarrow.parquet as pq
+
+from ipo_history import (HISTORY_ROOT, HISTORY_SCHEMA, PARTITION_COLUMN, PARTITION_FILE, _OPERATORS, _partition_dir,
+                         read_ipo_history)
+
+
+ANALYTICS_DIR = '_analytics'
+
+# 统计的收益指标：名称 -> 列
+METRICS = {'first_day': '首日表現', 'cumulative': '累積表現'}
+
+OVERSUBSCRIPTION_EDGES = [0, 1, 10, 50, 100, 500, 1000, np.inf]
+OVERSUBSCRIPTION_LABELS = ['<1x', '1-10x', '10-50x', '50-100x', '100-500x', '500-1000x', '>=1000x']
+LOT_ODDS_EDGES = [0, 5, 10, 25, 50, 80, np.inf]
+LOT_ODDS_LABELS = ['<5%', '5-10%', '10-25%', '25-50%', '50-80%', '>=80%']
+
+DIMENSIONS = ('month', 'oversubscription', 'lot_odds')
+
+INDEX_COLUMNS = ['代號', '名稱', '上市日期', '超額倍數', '中籤率', '首日表現', '累積表現']
+
+
+def _month_stats(df):
+    """按月份计算充分统计量，每个 (月份, 维度, 分组) 一行；df 需带 listing_month 列"""
+    oversubscription = df['超額倍數'].to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_x = np.where(oversubscription > 0, np.log10(oversubscription), np.nan)
+    columns = {'listings': np.ones(len(df), dtype='int64')}
+    for metric, column in METRICS.items():
+        y = df[column].to_numpy(dtype='float64')
+        valid = ~np.isnan(y)
+        pair = valid & ~np.isnan(log_x)
+        px, py = np.where(pair, log_x, 0.0), np.where(pair, y, 0.0)
+        y0 = np.where(valid, y, 0.0)
+        columns.update({
+            f'{metric}_n': valid.astype('int64'),
+            f'{metric}_sum': y0,
+            f'{metric}_sumsq': y0 * y0,
+            f'{metric}_wins': (y0 > 0).astype('int64'),
+            f'{metric}_pair_n': pair.astype('int64'),
+            f'{metric}_sx': px,
+            f'{metric}_sxx': px * px,
+            f'{metric}_sy': py,
+            f'{metric}_syy': py * py,
+            f'{metric}_sxy': px * py,
+        })
+    values = pd.DataFrame(columns, index=df.index)
+
+    month = df[PARTITION_COLUMN]
+    buckets = {
+        'month': month,
+        'oversubscription': pd.cut(df['超額倍數'], OVERSUBSCRIPTION_EDGES, labels=OVERSUBSCRIPTION_LABELS,
+                                   right=False),
+        'lot_odds': pd.cut(df['中籤率'], LOT_ODDS_EDGES, labels=LOT_ODDS_LABELS, right=False),
+    }
+    parts = []
+    for dimension, bucket in buckets.items():
+        grouped = values.groupby([month.rename(PARTITION_COLUMN), bucket.astype(object).rename('bucket')],
+                                 dropna=True).sum()
+        parts.append(grouped.reset_index().assign(dimension=dimension))
+    return pd.concat(parts, ignore_index=True)
+
+
+def _summarize(stats):
+    """由相加后的统计量求出均值、标准差、胜率和相关系数"""
+    out = pd.DataFrame({'listings': stats['listings']}, index=stats.index)
+    for metric in METRICS:
+        n = stats[f'{metric}_n']
+        mean = stats[f'{metric}_sum'] / n.where(n > 0)
+        variance = (stats[f'{metric}_sumsq'] - n * mean ** 2) / (n - 1).where(n > 1)
+        out[f'{metric}_mean'] = mean
+        out[f'{metric}_std'] = np.sqrt(variance.clip(lower=0))
+        out[f'{metric}_win_rate'] = stats[f'{metric}_wins'] / n.where(n > 0)
+
+        pn = stats[f'{metric}_pair_n']
+        sx, sy = stats[f'{metric}_sx'], stats[f'{metric}_sy']
+        cov = pn * stats[f'{metric}_sxy'] - sx * sy
+        denominator = np.sqrt((pn * stats[f'{metric}_sxx'] - sx ** 2) * (pn * stats[f'{metric}_syy'] - sy ** 2))
+        out[f'{metric}_corr_oversubscription'] = cov / denominator.where(denominator > 0)
+    return out
+
+
+def _read_month(root, month):
+    """读取一个月份分区的索引列；root 为 None 时返回同样列和类型的空表"""
+    if root is None:
+        table = HISTORY_SCHEMA.empty_table().select(INDEX_COLUMNS)
+    else:
+        path = os.path.join(_partition_dir(root, month), PARTITION_FILE)
+        table = pq.read_table(path, schema=HISTORY_SCHEMA, columns=INDEX_COLUMNS)
+    return table.to_pandas().assign(**{PARTITION_COLUMN: month})
+
+
+def _concat(frames, ignore_index=True):
+    frames = [frame for frame in frames if not frame.empty] or frames[:1]
+    return pd.concat(frames, ignore_index=ignore_index)
+
+
+def _add_codes(codes, index):
+    """把索引行登记到 {代號: [(月份, 行标签), ...]}"""
+    for label, code, month in zip(index.index, index['代號'], index[PARTITION_COLUMN]):
+        codes.setdefault(code, []).append((month, label))
+
+
+def _write_atomic(df, path):
+    df.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+
+class IpoAnalytics:
+    """
+    IPO历史库上的汇总查询；汇总和索引常驻内存，常驻进程中多次查询只需毫秒级
+    用法：
+        analytics = IpoAnalytics()
+        analytics.refresh()                      # 增量更新（只计算变化了的月份）
+        analytics.by_month(since='2024-01')
+        analytics.by_bucket('oversubscription')
+        analytics.screen(since='2025-01-01', where=[('首日表現', '<', 0)])
+    """
+
+    def __init__(self, root=HISTORY_ROOT):
+        self.root = root
+        self.dir = os.path.join(root, ANALYTICS_DIR)
+        self._stats = None
+        self._by_dimension = {}
+        self._index = None
+        self._codes = {}
+        self._state = None
+
+    def _path(self, name):
+        return os.path.join(self.dir, name)
+
+    def _load(self):
+        if self._state is not None:
+            return
+        try:
+            with open(self._path('state.json'), encoding='utf-8') as f:
+                self._state = json.load(f)
+            self._stats = pd.read_parquet(self._path('stats.parquet'))
+            self._index = pd.read_parquet(self._path('index.parquet'))
+        except (FileNotFoundError, ValueError):
+            self._state = {}
+            self._index = _read_month(None, None)
+            self._stats = _month_stats(self._index)
+        self._split_stats()
+        self._codes = {}
+        _add_codes(self._codes, self._index)
+
+    def _split_stats(self):
+        # 按维度预先拆分，查询时不必每次在全部汇总行上筛选
+        self._by_dimension = {dimension: group.drop(columns='dimension')
+                              for dimension, group in self._stats.groupby('dimension')}
+
+    def _partitions(self):
+        """当前历史库的 {月份: [修改时间ns, 大小]}"""
+        partitions = {}
+        for path in glob.glob(os.path.join(self.root, f'{PARTITION_COLUMN}=*', PARTITION_FILE)):
+            month = os.path.basename(os.path.dirname(path)).split('=', 1)[1]
+            info = os.stat(path)
+            partitions[month] = [info.st_mtime_ns, info.st_size]
+        return partitions
+
+    def refresh(self):
+        """
+        重新计算新增或变化了的月份分区，删除已不存在的月份
+        :return: 重新计算的月份列表
+        """
+        self._load()
+        partitions = self._partitions()
+        changed = sorted(m for m, signature in partitions.items() if self._state.get(m) != signature)
+        removed = set(self._state) - set(partitions)
+        if not changed and not removed:
+            return []
+
+        stale = set(changed) | removed
+        stale_rows = self._index[PARTITION_COLUMN].isin(stale)
+        for code in self._index.loc[stale_rows, '代號'].unique():
+            entries = [entry for entry in self._codes.get(code, []) if entry[0] not in stale]
+            if entries:
+                self._codes[code] = entries
+            else:
+                self._codes.pop(code, None)
+
+        stats = [self._stats[~self._stats[PARTITION_COLUMN].isin(stale)]]
+        index = [self._index[~stale_rows]]
+        if changed:
+            rows = pd.concat([_read_month(self.root, month) for month in changed], ignore_index=True)
+            stats.append(_month_stats(rows))
+            # 新行接着已有的行标签编号，保留下来的行标签不变，代號映射只需登记新行
+            rows.index = rows.index + (int(self._index.index.max()) + 1 if len(self._index) else 0)
+            _add_codes(self._codes, rows)
+            index.append(rows)
+
+        self._stats = _concat(stats)
+        self._index = _concat(index, ignore_index=False).sort_values(['上市日期', '代號'])
+        self._state = partitions
+        self._split_stats()
+
+        os.makedirs(self.dir, exist_ok=True)
+        _write_atomic(self._stats, self._path('stats.parquet'))
+        _write_atomic(self._index, self._path('index.parquet'))
+        with open(self._path('state.json') + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self._state, f)
+        os.replace(self._path('state.json') + '.tmp', self._path('state.json'))
+        return changed
+
+    def _select(self, dimension, since=None, until=None):
+        self._load()
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"未知的维度: {dimension}（可用: {', '.join(DIMENSIONS)}）")
+        stats = self._by_dimension.get(dimension, self._stats.iloc[:0].drop(columns='dimension'))
+        if since:
+            stats = stats[stats[PARTITION_COLUMN] >= pd.Timestamp(since).strftime('%Y-%m')]
+        if until:
+            stats = stats[stats[PARTITION_COLUMN] <= pd.Timestamp(until).strftime('%Y-%m')]
+        return stats
+
+    def by_month(self, since=None, until=None):
+        """按上市月份汇总（月份为 'YYYY-MM'）"""
+        stats = self._select('month', since, until)
+        numeric = stats.drop(columns='bucket').set_index(PARTITION_COLUMN).sort_index()
+        return _summarize(numeric)
+
+    def by_bucket(self, dimension, since=None, until=None):
+        """
+        按超額倍數或中籤率分档汇总
+        :param dimension: 'oversubscription' / 'lot_odds'（'month' 等同 by_month）
+        :param since, until: 上市月份范围（含）
+        """
+        if dimension == 'month':
+            return self.by_month(since, until)
+        stats = self._select(dimension, since, until)
+        labels = OVERSUBSCRIPTION_LABELS if dimension == 'oversubscription' else LOT_ODDS_LABELS
+        summed = stats.drop(columns=PARTITION_COLUMN).groupby('bucket').sum()
+        return _summarize(summed.reindex([label for label in labels if label in summed.index]))
+
+    def overall(self, since=None, until=None):
+        """整体汇总（一行）"""
+        stats = self._select('month', since, until)
+        summed = stats.drop(columns=['bucket', PARTITION_COLUMN]).sum().to_frame('all').T
+        return _summarize(summed).iloc[0]
+
+    def screen(self, since=None, until=None, where=None, codes=None):
+        """
+        在索引上筛选（不读取分区）
+        :param since, until: 上市日期范围（含），二分查找
+        :param where: [(列名, 运算符, 值), ...]，列为 INDEX_COLUMNS 之一，运算符同 read_ipo_history
+        :param codes: 只保留这些代號
+        :return: 按上市日期排序的 DataFrame（INDEX_COLUMNS）
+        """
+        self._load()
+        index = self._index
+        if codes is not None:
+            # 按代號映射直接取行，不扫描整个索引
+            labels = [label for c in dict.fromkeys(str(c).zfill(5) for c in codes)
+                      for _, label in self._codes.get(c, [])]
+            index = index.loc[labels].sort_values(['上市日期', '代號'])
+        dates = index['上市日期'].to_numpy()
+        start = 0 if since is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(since)), 'left')
+        end = len(index) if until is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(until)), 'right')
+        result = index.iloc[start:end]
+        for column, op, value in where or []:
+            if op not in _OPERATORS:
+                raise ValueError(f"不支持的运算符: {op}")
+            result = result[_OPERATORS[op](result[column], value)]
+        return result[INDEX_COLUMNS].reset_index(drop=True)
+
+    def lookup(self, code):
+        """
+        按代號读取完整记录：先在索引中找到所在月份，只读取该月份分区
+        :return: DataFrame（0或1行）
+        """
+        self._load()
+        code = str(code).zfill(5)
+        months = sorted({month for month, _ in self._codes.get(code, [])})
+        if not months:
+            return pd.DataFrame(columns=HISTORY_SCHEMA.names)
+        return read_ipo_history(filters=[('代號', '==', code), (PARTITION_COLUMN, 'in', months)], root=self.root)
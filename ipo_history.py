@@ -0,0 +1,169 @@
+"""
+港股IPO历史数据的列式存储（Parquet，按上市月份分区）
+
+目录结构：
+    hk_ipo_history/
+        listing_month=2024-01/part-0.parquet
+        listing_month=2024-02/part-0.parquet
+        ...
+
+- 追加时只重写本次数据涉及的月份分区，同一代號以最新一次抓取为准
+- 读取时筛选条件下推到Parquet：按上市日期筛选会先裁剪月份分区，其余条件利用行组统计信息跳过数据
+"""
+import glob
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+HISTORY_ROOT = 'hk_ipo_history'
+PARTITION_COLUMN = 'listing_month'
+PARTITION_FILE = 'part-0.parquet'
+
+# 与 hk_ipo_scraper.normalize_ipo_data 的输出一致，固定类型以保证各分区schema相同
+HISTORY_SCHEMA = pa.schema([
+    ('名稱', pa.string()),
+    ('代號', pa.string()),
+    ('上市日期', pa.timestamp('ns')),
+    ('每手股數', pa.int64()),
+    ('上市市值(億元)', pa.float64()),
+    ('招股價', pa.float64()),
+    ('上市價', pa.float64()),
+    ('超額倍數', pa.float64()),
+    ('穩中一手', pa.int64()),
+    ('中籤率', pa.float64()),
+    ('現價', pa.float64()),
+    ('首日表現', pa.float64()),
+    ('累積表現', pa.float64()),
+])
+
+_OPERATORS = {
+    '==': lambda field, value: field == value,
+    '!=': lambda field, value: field != value,
+    '<': lambda field, value: field < value,
+    '<=': lambda field, value: field <= value,
+    '>': lambda field, value: field > value,
+    '>=': lambda field, value: field >= value,
+    'in': lambda field, value: field.isin(list(value)),
+}
+
+
+def _partition_dir(root, month):
+    return os.path.join(root, f'{PARTITION_COLUMN}={month}')
+
+
+def _to_table(df):
+    df = df.reindex(columns=HISTORY_SCHEMA.names)
+    df['上市日期'] = pd.to_datetime(df['上市日期']).astype('datetime64[ns]')
+    return pa.Table.from_pandas(df, schema=HISTORY_SCHEMA, preserve_index=False)
+
+
+def append_ipo_history(df, root=HISTORY_ROOT):
+    """
+    将规范化后的IPO数据（normalize_ipo_data 的输出）写入历史库
+    只读取并重写涉及到的月份分区；分区内按代號去重，保留本次的新值
+    :return: 被写入的月份分区列表
+    """
+    df = df[df['上市日期'].notna()]
+    if df.empty:
+        return []
+
+    months = pd.to_datetime(df['上市日期']).dt.strftime('%Y-%m')
+    written = []
+    for month, month_df in df.groupby(months, sort=True):
+        path = os.path.join(_partition_dir(root, month), PARTITION_FILE)
+        table = _to_table(month_df)
+        if os.path.exists(path):
+            existing = pq.read_table(path, schema=HISTORY_SCHEMA)
+            # 新数据在前，按代號去重时保留新值
+            merged = pa.concat_tables([table, existing]).to_pandas()
+            merged = merged.drop_duplicates(subset='代號', keep='first')
+            table = pa.Table.from_pandas(merged, schema=HISTORY_SCHEMA, preserve_index=False)
+
+        table = table.sort_by([('上市日期', 'ascending'), ('代號', 'ascending')])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再替换，避免中断时留下损坏的分区
+        tmp_path = path + '.tmp'
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        written.append(month)
+
+    return written
+
+
+def _month_bounds(filters):
+    """根据上市日期上的条件推出需要扫描的月份范围，用于裁剪分区"""
+    lower = upper = None
+    for column, op, value in filters:
+        if column != '上市日期' or op not in ('>', '>=', '==', '<', '<='):
+            continue
+        month = pd.Timestamp(value).strftime('%Y-%m')
+        if op in ('>', '>=', '=='):
+            lower = month if lower is None else max(lower, month)
+        if op in ('<', '<=', '=='):
+            upper = month if upper is None else min(upper, month)
+    return lower, upper
+
+
+def read_ipo_history(filters=None, columns=None, root=HISTORY_ROOT):
+    """
+    读取IPO历史数据，筛选条件下推到Parquet扫描
+    :param filters: [(列名, 运算符, 值), ...]，条件之间为"且"关系；运算符支持 == != < <= > >= in
+                    例：上市日期晚于2024-01-01且首日破发
+                    [('上市日期', '>', '2024-01-01'), ('首日表現', '<', 0)]
+    :param columns: 只读取的列（None表示全部）
+    :return: DataFrame，按上市日期、代號排序
+    """
+    filters = list(filters or [])
+    columns = list(columns) if columns else HISTORY_SCHEMA.names
+    if not glob.glob(os.path.join(root, f'{PARTITION_COLUMN}=*', PARTITION_FILE)):
+        return pd.DataFrame(columns=columns)
+
+    partitioning = ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor='hive')
+    dataset = ds.dataset(root, format='parquet', partitioning=partitioning, schema=HISTORY_SCHEMA.append(
+        pa.field(PARTITION_COLUMN, pa.string())))
+
+    expression = None
+
+    def add(condition):
+        nonlocal expression
+        expression = condition if expression is None else expression & condition
+
+    lower, upper = _month_bounds(filters)
+    if lower is not None:
+        add(ds.field(PARTITION_COLUMN) >= lower)
+    if upper is not None:
+        add(ds.field(PARTITION_COLUMN) <= upper)
+
+    for column, op, value in filters:
+        if op not in _OPERATORS:
+            raise ValueError(f"不支持的运算符: {op}")
+        if column == '上市日期':
+            value = pa.scalar(pd.Timestamp(value), type=pa.timestamp('ns'))
+        add(_OPERATORS[op](ds.field(column), value))
+
+    table = dataset.to_table(columns=columns, filter=expression)
+    df = table.to_pandas()
+
+    sort_keys = [key for key in ('上市日期', '代號') if key in df.columns]
+    if sort_keys:
+        df = df.sort_values(sort_keys, ignore_index=True)
+    return df
+
+
+def import_csv_snapshots(pattern='hk_ipo_data_*.csv', root=HISTORY_ROOT):
+    """
+    将以往按时间戳保存的CSV快照导入历史库（按文件名即时间顺序导入，后面的快照覆盖前面的值）
+    :return: 导入的文件数
+    """
+    from hk_ipo_scraper import normalize_ipo_data
+
+    paths = sorted(glob.glob(pattern))
+    for path in paths:
+        snapshot = pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+        append_ipo_history(normalize_ipo_data(snapshot), root=root)
+        print(f"已导入 {path}: {len(snapshot)} 条记录")
+    return len(paths)
@@ -0,0 +1,267 @@
+"""
+新股上市后的价格路径：批量下载上市后的日线，计算第1/5/20/60个交易日收盘相对上市價的表現
+
+- 代號按市场换算为 Yahoo 代码：港股 '00700' -> '0700.HK'，A股 6/9 开头 -> .SS、其余 -> .SZ，美股原样
+- 每只新股只需要上市后 WINDOW_DAYS 天的日线：按上市季度分组，每组一次 yf.download 多代码请求
+  （每次最多 BATCH_SIZE 个代码），几千只新股只需几十次请求
+- 收盘价缓存在 <cache_dir>/ipo_prices/closes.parquet，窗口已完全过去的新股不再请求；
+  上市不足 WINDOW_DAYS 天的每 ttl 最多更新一次，下载不到数据的（如已退市）每 MISSING_TTL 重试一次
+- 收盘价使用未复权价格（auto_adjust=False，Yahoo 的 Close 已按拆合股调整），与上市價可比
+- 表現整批计算（按代码和日期排序后二分查找各新股的第N个交易日），不逐只循环
+
+用法：
+    enriched = enrich_ipo_prices(parse_ipo_data(raw_data))
+    python cli.py ipo enrich [--out hk_ipo_returns.csv]
+"""
+import json
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import metrics, progress
+from market_data import CACHE_DIR, _split_by_ticker
+
+
+# 计算表現的交易日（第1日即首日收盘）
+HORIZONS = (1, 5, 20, 60)
+
+# 上市后需要的自然日数：60个交易日约84个自然日，再留出节假日的余量
+WINDOW_DAYS = 120
+
+# 每次 yf.download 的代码数上限
+BATCH_SIZE = 100
+
+# 窗口未结束的新股多久更新一次；下载不到数据的代码多久重试一次
+PRICES_TTL = timedelta(hours=12)
+MISSING_TTL = timedelta(days=7)
+
+TICKER_COLUMN = 'Yahoo代號'
+
+
+def horizon_column(horizon):
+    return f'第{horizon}日表現'
+
+
+def yahoo_ticker(code, market='HK'):
+    """代號 -> Yahoo 代码，无法换算时返回 None"""
+    code = str(code).strip()
+    if market == 'HK':
+        return f'{int(code):04d}.HK' if code.isdigit() else None
+    if market == 'CN':
+        if not (code.isdigit() and len(code) == 6):
+            return None
+        return f'{code}.SS' if code[0] in '69' else f'{code}.SZ'
+    if market == 'US':
+        return code.upper() or None
+    return None
+
+
+def _listings(df):
+    """
+    新股列表 -> [Yahoo代码, 上市日期, 上市價]
+    df 可以是 parse_ipo_data 的文本输出，也可以是 normalize_ipo_data / ipo_sources 的规范化输出；
+    没有 市場 列时视为港股
+    """
+    listed = df['上市日期']
+    if not pd.api.types.is_datetime64_any_dtype(listed):
+        listed = pd.to_datetime(listed.astype(str).str.strip().str.replace('/', '-', regex=False),
+                                format='%Y-%m-%d', errors='coerce')
+    base = df['上市價']
+    if not pd.api.types.is_numeric_dtype(base):
+        # 与 normalize_ipo_data 相同：价格可能是区间，取最后一个数字
+        base = pd.to_numeric(base.astype(str).str.extract(r'([\d,]*\.?\d+)\s*$', expand=False)
+                             .str.replace(',', '', regex=False), errors='coerce')
+    markets = df['市場'] if '市場' in df.columns else pd.Series('HK', index=df.index)
+    tickers = [yahoo_ticker(code, market) for code, market in zip(df['代號'], markets)]
+    return pd.DataFrame({'ticker': tickers, 'listed': pd.DatetimeIndex(listed).normalize(),
+                         'base': base.astype('float64')}, index=df.index)
+
+
+def _prices_dir(cache_dir):
+    return os.path.join(cache_dir, 'ipo_prices')
+
+
+def _load_meta(cache_dir):
+    try:
+        with open(os.path.join(_prices_dir(cache_dir), 'meta.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_meta(cache_dir, meta):
+    path = os.path.join(_prices_dir(cache_dir), 'meta.json')
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+def _load_closes(cache_dir):
+    try:
+        return pd.read_parquet(os.path.join(_prices_dir(cache_dir), 'closes.parquet'))
+    except FileNotFoundError:
+        return pd.DataFrame({'Ticker': pd.Series(dtype='string'), 'Date': pd.Series(dtype='datetime64[ns]'),
+                             'Close': pd.Series(dtype='float64')})
+
+
+def _save_closes(cache_dir, closes):
+    # 先写临时文件再替换，中断时不会留下不完整的缓存
+    path = os.path.join(_prices_dir(cache_dir), 'closes.parquet')
+    closes.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+
+def _needs_download(entry, now):
+    if entry is None:
+        return True
+    checked_at = pd.Timestamp(entry['checked_at'])
+    if not entry['rows']:
+        return now - checked_at >= MISSING_TTL
+    return not entry['complete'] and now - checked_at >= PRICES_TTL
+
+
+def _batches(windows):
+    """
+    {缓存键: (代码, 窗口起, 窗口止)} -> 按上市季度分组、每组最多 BATCH_SIZE 个代码的批次
+    :return: [(缓存键列表, 代码列表, 批次起始日, 批次结束日), ...]
+    """
+    frame = pd.DataFrame([(key, *window) for key, window in windows.items()],
+                         columns=['key', 'ticker', 'start', 'end']).sort_values('start')
+    batches = []
+    for _, group in frame.groupby(frame['start'].dt.to_period('Q'), sort=True):
+        for i in range(0, len(group), BATCH_SIZE):
+            part = group.iloc[i:i + BATCH_SIZE]
+            batches.append((list(part['key']), list(dict.fromkeys(part['ticker'])),
+                            part['start'].min(), part['end'].max()))
+    return batches
+
+
+def get_ipo_closes(listings, cache_dir=CACHE_DIR, download=None, now=None):
+    """
+    获取各新股上市后 WINDOW_DAYS 天的收盘价（只下载缓存中缺少或需要更新的）
+    :param listings: _listings 的输出
+    :param download: 下载函数，默认 yf.download（测试或基准时可替换）
+    :return: [Ticker, Date, Close] 的长表，按 Ticker、Date 排序
+    """
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now).tz_localize(None)
+    today = now.normalize()
+    os.makedirs(_prices_dir(cache_dir), exist_ok=True)
+    meta = _load_meta(cache_dir)
+    closes = _load_closes(cache_dir)
+
+    # 同一代码可能先后对应不同的新股（港股代號会重用），缓存按 代码@上市日期 记录
+    windows = {}
+    for ticker, listed in listings[['ticker', 'listed']].dropna().drop_duplicates().itertuples(index=False):
+        if listed > today:
+            continue
+        key = f"{ticker}@{listed.strftime('%Y-%m-%d')}"
+        if _needs_download(meta.get(key), now):
+            windows[key] = (ticker, listed, listed + timedelta(days=WINDOW_DAYS))
+        else:
+            metrics.count('ipo_prices_cache', result='hit')
+    metrics.count('ipo_prices_cache', len(windows), result='miss')
+
+    batches = _batches(windows) if windows else []
+    fresh = []
+    for number, (keys, tickers, start, end) in enumerate(batches, 1):
+        if download is None:
+            # 只有确实需要下载时才导入 yfinance
+            import yfinance as yf
+            download = yf.download
+        progress(f"下载新股日线 {number}/{len(batches)}: {len(tickers)} 个代码，"
+                 f"{start.strftime('%Y-%m-%d')} ~ {end.strftime('%Y-%m-%d')}")
+        try:
+            with metrics.timer('ipo_prices_download'):
+                raw = download(tickers, start=start.strftime('%Y-%m-%d'),
+                               end=(min(end, today) + timedelta(days=1)).strftime('%Y-%m-%d'),
+                               progress=False, auto_adjust=False)
+        except Exception as e:
+            metrics.count('ipo_prices_download_errors')
+            print(f"⚠️ 新股日线下载失败，使用缓存数据: {e}")
+            continue
+        downloaded = {ticker: bars['Close'].dropna() for ticker, bars in _split_by_ticker(raw, tickers).items()}
+        if not downloaded:
+            # 整批都没有数据多半是网络或上游问题，不记为缺失，下次运行重试
+            metrics.count('ipo_prices_download_errors')
+            print(f"⚠️ 新股日线下载结果为空（{len(tickers)} 个代码），下次运行重试")
+            continue
+        fresh.extend(pd.DataFrame({'Ticker': ticker, 'Date': bars.index, 'Close': bars.to_numpy(dtype='float64')})
+                     for ticker, bars in downloaded.items())
+        for key in keys:
+            ticker, listed, window_end = windows[key]
+            dates = downloaded[ticker].index if ticker in downloaded else pd.DatetimeIndex([])
+            rows = int(((dates >= listed) & (dates <= window_end)).sum())
+            meta[key] = {'checked_at': now.isoformat(), 'rows': rows, 'complete': bool(window_end < today)}
+        metrics.count('ipo_prices_tickers_downloaded', len(tickers))
+
+    if fresh:
+        closes = pd.concat([closes] + fresh, ignore_index=True)
+        closes['Ticker'] = closes['Ticker'].astype('string')
+        closes['Date'] = pd.to_datetime(closes['Date']).astype('datetime64[ns]')
+        # 重新下载的日期以新数据为准
+        closes = closes.drop_duplicates(subset=['Ticker', 'Date'], keep='last')
+        _save_closes(cache_dir, closes.sort_values(['Ticker', 'Date'], ignore_index=True))
+    _save_meta(cache_dir, meta)
+
+    wanted = closes[closes['Ticker'].isin(set(listings['ticker'].dropna()))]
+    return wanted.sort_values(['Ticker', 'Date'], ignore_index=True)
+
+
+def horizon_returns(closes, listings, horizons=HORIZONS):
+    """
+    各新股第N个交易日（上市日为第1日）收盘相对上市價的表現，单位为百分比（与 首日表現 相同）
+    整批计算：收盘价按 (代码, 日期) 排序后，用二分查找定位每只新股上市日在其中的位置，再按偏移取值；
+    该交易日不存在（上市不足N个交易日、超出 WINDOW_DAYS 或没有数据）时为缺失值
+    :return: 与 listings 同索引的 DataFrame，列为 第N日表現
+    """
+    out = pd.DataFrame(index=listings.index)
+    if closes.empty:
+        for horizon in horizons:
+            out[horizon_column(horizon)] = np.nan
+        return out
+
+    codes = pd.Index(pd.unique(pd.concat([closes['Ticker'].astype(object), listings['ticker'].dropna()])))
+    day = np.timedelta64(1, 'D')
+    close_code = codes.get_indexer(closes['Ticker'].astype(object))
+    close_day = (closes['Date'].to_numpy(dtype='datetime64[ns]') - np.datetime64(0, 'ns')) // day
+    order = np.lexsort((close_day, close_code))
+    close_code, close_day = close_code[order], close_day[order]
+    close_value = closes['Close'].to_numpy(dtype='float64')[order]
+    close_key = close_code.astype('int64') * 100_000 + close_day
+
+    valid = listings['ticker'].notna().to_numpy() & listings['listed'].notna().to_numpy()
+    listing_code = np.full(len(listings), -1, dtype='int64')
+    listing_code[valid] = codes.get_indexer(listings['ticker'][valid].astype(object))
+    listing_day = np.zeros(len(listings), dtype='int64')
+    listing_day[valid] = (listings['listed'][valid].to_numpy(dtype='datetime64[ns]') - np.datetime64(0, 'ns')) // day
+    first = np.searchsorted(close_key, listing_code * 100_000 + listing_day, side='left')
+    base = listings['base'].to_numpy(dtype='float64')
+
+    for horizon in horizons:
+        position = first + horizon - 1
+        inside = position < len(close_key)
+        position = np.where(inside, position, 0)
+        found = valid & inside & (close_code[position] == listing_code) & (close_day[position] <= listing_day + WINDOW_DAYS)
+        values = np.where(found, close_value[position], np.nan)
+        out[horizon_column(horizon)] = (values / base - 1) * 100
+    return out
+
+
+@metrics.timed('ipo_enrich')
+def enrich_ipo_prices(df, horizons=HORIZONS, cache_dir=CACHE_DIR, download=None, now=None):
+    """
+    为新股列表加上 Yahoo代號 和各交易日的表現列
+    :param df: parse_ipo_data 输出（或规范化后的数据、ipo_sources 的多市场数据）
+    :return: df 的副本，末尾加上 Yahoo代號、第1日表現、第5日表現...
+    """
+    listings = _listings(df)
+    closes = get_ipo_closes(listings, cache_dir=cache_dir, download=download, now=now)
+    out = df.copy()
+    out[TICKER_COLUMN] = listings['ticker']
+    returns = horizon_returns(closes, listings, horizons)
+    for column in returns.columns:
+        out[column] = returns[column]
+    metrics.count('ipo_enriched', int(returns.notna().any(axis=1).sum()))
+    return out
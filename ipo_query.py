@@ -0,0 +1,93 @@
+"""
+本地IPO库（hk_ipo_scraper 维护的 hk_ipo_store.csv）的快速查询
+
+只使用标准库，不导入 pandas / requests，命令行即时查询时几十毫秒即可返回（见 cli.py ipo query）
+"""
+import csv
+import json
+import re
+import sys
+import unicodedata
+
+
+# 本地IPO库路径（hk_ipo_scraper 也从这里导入，查询时不必加载 hk_ipo_scraper 和 pandas）
+STORE_PATH = 'hk_ipo_store.csv'
+
+DATE_COLUMN = '上市日期'
+
+
+def _normalize_date(text):
+    """'2023/01/15'、'2023-01-15' -> '2023-01-15'，无法识别时返回空字符串"""
+    match = re.match(r'\s*(\d{4})[/-](\d{1,2})[/-](\d{1,2})', text or '')
+    if not match:
+        return ''
+    year, month, day = match.groups()
+    return f"{year}-{int(month):02d}-{int(day):02d}"
+
+
+def read_store(path=STORE_PATH):
+    """读取本地IPO库，返回 (列名列表, 行字典列表)；文件不存在时返回空结果"""
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            return list(reader.fieldnames or []), list(reader)
+    except FileNotFoundError:
+        return [], []
+
+
+def query_store(path=STORE_PATH, code=None, name=None, since=None, until=None, limit=None):
+    """
+    按条件筛选本地IPO库（保持库中的顺序，即新上市的在前）
+    :param code: 代號（不足5位时左侧补0）
+    :param name: 名稱包含的文字
+    :param since: 上市日期下限（含），如 '2024-01-01'
+    :param until: 上市日期上限（含）
+    :param limit: 最多返回的行数
+    :return: (列名列表, 行字典列表)
+    """
+    columns, rows = read_store(path)
+    code = code.zfill(5) if code else None
+    since = _normalize_date(since) if since else None
+    until = _normalize_date(until) if until else None
+
+    result = []
+    for row in rows:
+        if code and row.get('代號') != code:
+            continue
+        if name and name not in row.get('名稱', ''):
+            continue
+        if since or until:
+            listed = _normalize_date(row.get(DATE_COLUMN))
+            if not listed or (since and listed < since) or (until and listed > until):
+                continue
+        result.append(row)
+        if limit and len(result) >= limit:
+            break
+    return columns, result
+
+
+def _width(text):
+    return sum(2 if unicodedata.east_asian_width(ch) in ('W', 'F') else 1 for ch in text)
+
+
+def format_table(columns, rows):
+    """按显示宽度对齐的文本表格（中文字符按两个字符宽度计算）"""
+    widths = [max([_width(c)] + [_width(row.get(c, '')) for row in rows]) for c in columns]
+    lines = []
+    for values in [columns] + [[row.get(c, '') for c in columns] for row in rows]:
+        lines.append('  '.join(v + ' ' * (w - _width(v)) for v, w in zip(values, widths)).rstrip())
+    return '\n'.join(lines)
+
+
+def write_rows(columns, rows, fmt='table', out=None):
+    """输出查询结果，fmt 为 table / csv / json"""
+    out = out or sys.stdout
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    elif fmt == 'json':
+        json.dump([{c: row.get(c, '') for c in columns} for row in rows], out, ensure_ascii=False, indent=1)
+        out.write('\n')
+    else:
+        out.write(format_table(columns, rows) + '\n')
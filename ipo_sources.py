@@ -0,0 +1,562 @@
+"""
+多市场IPO列表抓取：每个数据源一个适配器，抓取、解析和翻页由共用的引擎完成
+
+适配器（TableAdapter 及其子类）只描述网站特有的部分：
+- 列表页URL和分页：url 模板中的 {page_num}；分页行中「下一頁」「上一頁」的文字
+- 表格定位：表头行某一列同时包含的关键字
+- 字段映射：统一字段在表格中的列下标、代號的正则、数据行的标记，以及日期格式和数值单位
+流式提取表格行、按列解析、类型转换、末页识别和按页码顺序的并发预取都是共用的；
+crawl_sources 在各自的线程中同时抓取多个数据源，输出统一字段（IPO_SCHEMA）的表
+
+数据源在 ipo_sources.json 中配置（可用环境变量 IPO_SOURCES 指定其他文件）：
+- 带 "adapter": "模块:类名" 的项使用代码中定义的适配器（如 aastocks 需要多种抓取方式逐级回退）
+- 其余项为纯配置的表格网站，键与 TableAdapter 的类属性相同；新增市场时只需增加一项，例如
+    {"name": "example_us", "market": "US", "url": "https://example.com/ipo?page={page_num}",
+     "header": ["Symbol"], "fields": {"代號": 0, "名稱": 1, "上市日期": 2, "上市價": 3, "首日表現": 4},
+     "code_pattern": "^([A-Z][A-Z.]*)$", "next_page_text": "Next", "prev_page_text": "Prev",
+     "date_format": "%m-%d-%Y", "unit_pattern": "[%+$\\\\s]"}
+  （代號正则需锚定整格，否则分页行「Prev 1 2 Next」也会被当作数据行；该示例的抓取见 tests/test_ipo_sources.py）
+
+用法：
+    python ipo_sources.py                           # 抓取所有数据源，保存到 ipo_markets.csv
+    python ipo_sources.py --source aastocks --max-pages 5
+"""
+import argparse
+import importlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+from lxml import etree
+
+from http_cache import default_cache
+from instrumentation import export_metrics, is_quiet, metrics, progress
+
+
+SOURCES_PATH = os.environ.get('IPO_SOURCES',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ipo_sources.json'))
+
+# 多市场合并输出的路径
+MARKETS_PATH = 'ipo_markets.csv'
+
+# 统一字段（即港股本地库的列，按用户要求的顺序）；其他市场没有的字段留空
+IPO_FIELDS = [
+    '名稱', '代號', '上市日期', '每手股數', '上市市值(億元)',
+    '招股價', '上市價', '超額倍數', '穩中一手', '中籤率',
+    '現價', '首日表現', '累積表現'
+]
+
+# 多市场合并的列：市場（HK / CN / US ...）、數據源（适配器名称）加统一字段
+IPO_SCHEMA = ['市場', '數據源'] + IPO_FIELDS
+
+# 翻页上限（分页识别失败时避免无限翻页）；每处理 CHUNK_PAGES 页解析并输出一次
+MAX_PAGES = 1000
+CHUNK_PAGES = 10
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+}
+
+_LAST_NUMBER_PATTERN = r'([\d,]*\.?\d+)\s*$'
+_PAGE_NUMBER_PATTERN = r'(?<!\d)\d{1,4}(?!\d)'
+
+
+class HostRateLimiter:
+    """
+    按主机限速：同一主机两次请求的发起时间至少间隔 1/requests_per_second 秒（线程安全）
+    """
+
+    def __init__(self, requests_per_second=None):
+        self.min_interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        if not self.min_interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _cell_text(cell):
+    return ''.join(cell.itertext()).strip()
+
+
+def iter_table_rows(source, is_header):
+    """
+    单次流式解析HTML，只产出第一个含表头行的表格中表头之后的数据行
+    - 使用lxml的增量解析器，边读边解析，已处理的行会被立即释放
+    - 找到目标表格并读完后即停止，不再解析页面剩余部分
+    :param source: HTML字符串/字节串，或逐块产出字节串的可迭代对象（如 response.iter_content()）
+    :param is_header: 判断表头行的函数，参数为单元格文本列表
+    :return: 生成器，每次产出一行单元格文本列表
+    """
+    if isinstance(source, (str, bytes)):
+        source = [source]
+
+    parser = etree.HTMLPullParser(events=('start', 'end'), tag=('table', 'tr'), encoding='utf-8')
+    target = None
+    tr_depth = 0
+
+    for chunk in source:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        parser.feed(chunk)
+
+        for event, elem in parser.read_events():
+            if elem.tag == 'table':
+                if event == 'start':
+                    continue
+                if elem is target:
+                    return
+                release = tr_depth == 0
+            else:
+                if event == 'start':
+                    tr_depth += 1
+                    continue
+                tr_depth -= 1
+
+                owner = next(elem.iterancestors('table'), None)
+                if target is None:
+                    if is_header([_cell_text(cell) for cell in elem if cell.tag in ('td', 'th')]):
+                        target = owner
+                elif owner is target:
+                    row_data = [_cell_text(cell) for cell in elem if cell.tag in ('td', 'th')]
+                    if any(row_data):  # 确保不是全空行
+                        yield row_data
+                release = tr_depth == 0 or (target is not None and owner is target)
+
+            # 释放已处理完的元素，保持内存占用与页面大小无关
+            if release:
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+    parser.close()
+
+
+class TableAdapter:
+    """
+    列表页为HTML表格的IPO数据源，由类属性描述（构造参数或 ipo_sources.json 中的同名键可覆盖）：
+    - url: 列表页URL模板，含 {page_num}
+    - header / header_column: 表头行第 header_column 列同时包含的关键字，用于定位IPO表格
+    - fields: 统一字段 -> 列下标；名稱和代號在同一格时下标相同，代號之外的部分即为名稱
+    - code_pattern: 从代號列提取代號的正则（取第1组）；row_marker: 数据行代號列必含的文字（其后的内容忽略）；
+      exclude_pattern: 代號列匹配时不是数据行；name_marks: 名稱中需要移除的标记
+    - next_page_text / prev_page_text: 分页行的识别文字，没有「下一页」的分页行所在页为末页
+    - date_format: 上市日期的格式（'/' 先统一替换为 '-'）
+    - integer_fields / price_fields / unit_pattern: 类型转换方式，见 normalize
+    - max_workers / requests_per_second: crawl_sources 抓取该数据源的并发数和每秒请求上限
+    需要特殊抓取方式的网站由子类覆盖 fetch_rows，抓取期间共用的连接、浏览器在 open / close 中创建和释放
+    """
+    name = None
+    market = None
+    url = None
+    header = ()
+    header_column = 0
+    fields = {}
+    code_pattern = r'(\S+)'
+    row_marker = None
+    exclude_pattern = None
+    name_marks = None
+    next_page_text = '下一頁'
+    prev_page_text = '上一頁'
+    date_format = '%Y-%m-%d'
+    integer_fields = ('每手股數', '穩中一手')
+    price_fields = ('招股價', '上市價', '現價')
+    unit_pattern = r'[倍手%+\s]'
+    headers = DEFAULT_HEADERS
+    timeout = 15
+    max_workers = 4
+    requests_per_second = 4
+
+    def __init__(self, **config):
+        for key, value in config.items():
+            if key.startswith('_') or callable(getattr(type(self), key, None)) or not hasattr(type(self), key):
+                raise ValueError(f"数据源 {config.get('name', self.name)} 的配置项未知: {key}")
+            setattr(self, key, value)
+        if not self.name or not self.market:
+            raise ValueError(f"数据源缺少 name 或 market: {config}")
+        self.fields = {field: int(column) for field, column in self.fields.items()}
+        unknown = set(self.fields) - set(IPO_FIELDS)
+        if unknown or '代號' not in self.fields:
+            raise ValueError(f"数据源 {self.name} 的字段映射无效（需含 代號，未知字段: {sorted(unknown)}）")
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def page_url(self, page_num):
+        return self.url.format(page_num=page_num)
+
+    def is_header(self, cells):
+        return len(cells) > self.header_column and all(k in cells[self.header_column] for k in self.header)
+
+    def iter_rows(self, source):
+        """流式提取IPO表格的数据行，见 iter_table_rows"""
+        return iter_table_rows(source, self.is_header)
+
+    def fetch_rows(self, page_num):
+        """
+        获取一页IPO表格的数据行（经 http_cache 条件请求，页面未变时直接使用上次的提取结果）
+        :return: 行数据列表；请求失败或页面没有IPO表格时返回None
+        """
+        progress(f"正在获取 {self.name} 第 {page_num} 页数据...")
+        cache = default_cache()
+        try:
+            with metrics.timer('ipo_page', source=self.name):
+                response = cache.get(self.page_url(page_num), headers=self.headers, timeout=self.timeout)
+                if response.status_code != 200:
+                    print(f"{self.name} 第 {page_num} 页请求失败，状态码: {response.status_code}")
+                    return None
+                rows = cache.parse(response, f'{self.name}_rows', lambda body: list(self.iter_rows(body)))
+        except requests.exceptions.RequestException as e:
+            print(f"{self.name} 第 {page_num} 页网络请求错误: {str(e)}")
+            return None
+        metrics.count('ipo_rows_fetched', len(rows), source=self.name)
+        return rows or None
+
+    def pagination(self, rows):
+        """
+        从分页行（含「下一页」或「上一页」的文字）识别分页信息
+        :return: (是否有下一页, 分页行中出现的最大页码)；页面没有分页行时为 (None, None)
+        """
+        for row in rows:
+            text = ' '.join(row)
+            if self.next_page_text in text or self.prev_page_text in text:
+                numbers = [int(n) for n in re.findall(_PAGE_NUMBER_PATTERN, text)]
+                return self.next_page_text in text, max(numbers, default=None)
+        return None, None
+
+    def is_last_page(self, rows):
+        """末页：分页行中没有「下一页」；页面没有分页行时，以没有IPO数据行的页为末页"""
+        has_next, _ = self.pagination(rows)
+        return has_next is False or (has_next is None and not self.page_codes(rows))
+
+    def _code_prefix(self, text):
+        """代號列中数据行的部分，不是数据行时返回None"""
+        if self.row_marker is not None and self.row_marker not in text:
+            return None
+        if self.exclude_pattern and re.search(self.exclude_pattern, text):
+            return None
+        return text.split(self.row_marker, 1)[0] if self.row_marker is not None else text
+
+    def page_codes(self, rows):
+        """页面数据行中的代號（不解析整页，增量抓取逐页判断是否停止时使用）"""
+        column = self.fields['代號']
+        codes = set()
+        for row in rows:
+            prefix = self._code_prefix(row[column]) if len(row) > column else None
+            match = re.search(self.code_pattern, prefix) if prefix is not None else None
+            if match:
+                codes.add(match.group(1))
+        return codes
+
+    def parse(self, rows):
+        """
+        表格行 -> 统一字段（IPO_FIELDS）的 DataFrame，仍为原始文本，类型转换见 normalize
+        整批按列处理（pandas字符串方法），不逐行构建；没有代號的行（说明行、分页行）被过滤
+        """
+        width = max(self.fields.values()) + 1
+        rows = [row[:width] for row in rows if isinstance(row, list) and len(row) > 1]
+        if not rows:
+            return pd.DataFrame(columns=IPO_FIELDS)
+
+        # 列数不足的行补空字符串
+        raw = pd.DataFrame(rows).reindex(columns=range(width)).fillna('').astype(str)
+
+        code_column = self.fields['代號']
+        cell = raw[code_column]
+        is_data = pd.Series(True, index=raw.index)
+        if self.row_marker is not None:
+            is_data &= cell.str.contains(self.row_marker, regex=False)
+        if self.exclude_pattern:
+            is_data &= ~cell.str.contains(self.exclude_pattern)
+        raw = raw[is_data]
+
+        prefix = raw[code_column]
+        if self.row_marker is not None:
+            prefix = prefix.str.split(self.row_marker, n=1).str[0]
+        code = prefix.str.extract(self.code_pattern, expand=False)
+        has_code = code.notna()
+        raw, prefix, code = raw[has_code], prefix[has_code], code[has_code]
+
+        if self.fields.get('名稱') == code_column:
+            # 名稱和代號在同一格：去掉代号即为名称
+            name = prefix.str.replace(self.code_pattern, '', n=1, regex=True)
+        elif '名稱' in self.fields:
+            name = raw[self.fields['名稱']]
+        else:
+            name = pd.Series('', index=raw.index)
+        if self.name_marks:
+            name = name.str.replace(self.name_marks, '', regex=True)
+
+        df = pd.DataFrame({'名稱': name.str.strip(), '代號': code}, index=raw.index)
+        for field in IPO_FIELDS[2:]:
+            df[field] = raw[self.fields[field]] if field in self.fields else ''
+
+        return df.reset_index(drop=True)
+
+    def normalize(self, df):
+        """
+        将 parse 输出的文本列整批转换为数值/日期类型，便于后续筛选
+        - 上市日期 -> datetime64（按 date_format）
+        - integer_fields -> Int64（可空整数）
+        - price_fields -> float64；价格为区间（如 '3.10-3.50'）时取最后一个数字
+        - 其余数值列去掉 unit_pattern 匹配的单位后转为 float64，百分比列单位为百分比（'+17.1%' -> 17.1）
+        无法识别的值（如 '-'、'N/A'）转为缺失值
+        """
+        out = pd.DataFrame(index=df.index)
+        out['名稱'] = df['名稱'].astype('string')
+        out['代號'] = df['代號'].astype('string')
+
+        dates = df['上市日期'].astype(str).str.strip().str.replace('/', '-', regex=False)
+        out['上市日期'] = pd.to_datetime(dates, format=self.date_format, errors='coerce')
+
+        for column in IPO_FIELDS[3:]:
+            text = df[column].astype(str)
+            if column in self.price_fields:
+                text = text.str.extract(_LAST_NUMBER_PATTERN, expand=False)
+            else:
+                text = text.str.replace(self.unit_pattern, '', regex=True)
+            values = pd.to_numeric(text.str.replace(',', '', regex=False), errors='coerce')
+            out[column] = values.round().astype('Int64') if column in self.integer_fields else values.astype('float64')
+
+        return out
+
+    def records(self, rows):
+        """表格行 -> IPO_SCHEMA 的规范化 DataFrame（多市场合并时使用）"""
+        df = self.normalize(self.parse(rows))
+        df.insert(0, '數據源', self.name)
+        df.insert(0, '市場', self.market)
+        return df
+
+
+def load_adapters(path=SOURCES_PATH, names=None):
+    """
+    按配置创建适配器
+    :param names: 只创建这些名称的数据源（默认全部）
+    """
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    adapters = []
+    for spec in config['sources']:
+        if names and spec.get('name') not in names:
+            continue
+        spec = dict(spec)
+        target = spec.pop('adapter', None)
+        if target:
+            # 代码中定义的适配器按需导入（如 hk_ipo_scraper 本身也导入本模块）
+            module, _, class_name = target.partition(':')
+            adapter_class = getattr(importlib.import_module(module), class_name)
+        else:
+            adapter_class = TableAdapter
+        adapters.append(adapter_class(**spec))
+    unknown = set(names or ()) - {adapter.name for adapter in adapters}
+    if unknown:
+        raise ValueError(f"未知的数据源: {sorted(unknown)}（可用: {', '.join(s.get('name', '?') for s in config['sources'])}）")
+    return adapters
+
+
+def iter_pages(adapter, start_page=1, max_workers=1, requests_per_second=None, max_pages=MAX_PAGES):
+    """
+    按页码顺序逐页产出 (page_num, rows, is_last)，自动识别末页
+    - 最多同时抓取 max_workers 页（只预取分页行中已出现的页码），内存占用与总页数无关
+    - 末页见 TableAdapter.is_last_page，该页的 is_last 为 True；达到 max_pages 上限而停止时最后一页仍为 False
+    - 某页获取失败时产出 (page_num, None, False) 后停止，调用方据此保存断点
+    调用方提前结束迭代（如增量抓取遇到已知代號）时，尚未开始的请求会被取消；
+    适配器在迭代期间保持打开（open / close）
+    """
+    last_page = start_page + max_pages - 1
+    max_workers = max(1, max_workers)
+    limiter = HostRateLimiter(requests_per_second)
+
+    def worker(page_num):
+        limiter.wait(adapter.page_url(page_num))
+        try:
+            return adapter.fetch_rows(page_num)
+        except Exception as e:
+            print(f"{adapter.name} 第 {page_num} 页获取时发生错误: {str(e)}")
+            return None
+
+    # horizon 为已知存在的最大页码，只预取到这里，避免请求末页之后不存在的页
+    horizon, next_page = start_page, start_page
+    pending = deque()
+    with adapter, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            while True:
+                while len(pending) < max_workers and next_page <= min(horizon, last_page):
+                    pending.append((next_page, executor.submit(worker, next_page)))
+                    next_page += 1
+                if not pending:
+                    return
+                page_num, future = pending.popleft()
+                rows = future.result()
+                if not rows:
+                    yield page_num, None, False
+                    return
+
+                is_last = adapter.is_last_page(rows)
+                yield page_num, rows, is_last
+                if is_last:
+                    progress(f"{adapter.name} 第 {page_num} 页为末页")
+                    return
+                _, max_seen = adapter.pagination(rows)
+                horizon = max(horizon, page_num + 1, max_seen or 0)
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def iter_source_chunks(adapters, max_pages=MAX_PAGES, chunk_pages=CHUNK_PAGES):
+    """
+    在各自的线程中同时抓取多个数据源，逐块产出 (adapter, DataFrame)，DataFrame 为 IPO_SCHEMA 的规范化数据
+    - 每个数据源按自己的 max_workers / requests_per_second 翻页抓取，每 chunk_pages 页在该线程中整块解析
+    - 块经有上限的队列交给调用方，调用方处理不过来时抓取线程等待，内存占用与总页数无关
+    - 某个数据源获取失败或出错只停止该数据源，其余继续
+    """
+    adapters = list(adapters)
+    chunks = queue.Queue(maxsize=2 * max(1, len(adapters)))
+    stop = threading.Event()
+    finished = object()
+
+    def put(item):
+        # 调用方提前结束迭代后不再等待队列空位
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(adapter):
+        try:
+            pages = iter_pages(adapter, max_workers=adapter.max_workers,
+                               requests_per_second=adapter.requests_per_second, max_pages=max_pages)
+            rows, count = [], 0
+            for page_num, page_rows, _ in pages:
+                if page_rows is None:
+                    print(f"{adapter.name} 第 {page_num} 页未能获取到数据，停止抓取该数据源")
+                    break
+                rows.extend(page_rows)
+                count += 1
+                if count >= chunk_pages:
+                    if not put((adapter, adapter.records(rows))):
+                        pages.close()
+                        return
+                    rows, count = [], 0
+            if rows:
+                put((adapter, adapter.records(rows)))
+        except Exception as e:
+            print(f"数据源 {adapter.name} 抓取时发生错误: {str(e)}")
+        finally:
+            put((adapter, finished))
+
+    threads = [threading.Thread(target=run, args=(adapter,), name=f'ipo-{adapter.name}', daemon=True)
+               for adapter in adapters]
+    for thread in threads:
+        thread.start()
+    remaining = len(threads)
+    try:
+        while remaining:
+            adapter, df = chunks.get()
+            if df is finished:
+                remaining -= 1
+                continue
+            metrics.count('ipo_source_rows', len(df), source=adapter.name)
+            yield adapter, df
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+@metrics.timed('ipo_sources_crawl')
+def crawl_sources(adapters=None, max_pages=MAX_PAGES, chunk_pages=CHUNK_PAGES):
+    """
+    同时抓取多个数据源，返回合并后的 IPO_SCHEMA 表（同一市场同一代號只保留最先抓到的一行）
+    :param adapters: 适配器列表，默认按 ipo_sources.json 创建全部数据源
+    """
+    if adapters is None:
+        adapters = load_adapters()
+    frames = [df for _, df in iter_source_chunks(adapters, max_pages=max_pages, chunk_pages=chunk_pages)]
+    if not frames:
+        return pd.DataFrame(columns=IPO_SCHEMA)
+    combined = pd.concat(frames, ignore_index=True)
+    return combined.drop_duplicates(subset=['市場', '代號'], keep='first').reset_index(drop=True)
+
+
+def crawl_to_csv(out_path=MARKETS_PATH, adapters=None, max_pages=MAX_PAGES, chunk_pages=CHUNK_PAGES):
+    """
+    同时抓取多个数据源，逐块追加写入一个CSV（先写临时文件，完成后替换）
+    :return: 各数据源写入的行数 {名称: 行数}
+    """
+    if adapters is None:
+        adapters = load_adapters()
+    counts = {adapter.name: 0 for adapter in adapters}
+    seen = set()
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8-sig') as f:
+        pd.DataFrame(columns=IPO_SCHEMA).to_csv(f, index=False)
+        for adapter, df in iter_source_chunks(adapters, max_pages=max_pages, chunk_pages=chunk_pages):
+            keys = list(zip(df['市場'], df['代號']))
+            keep = [key not in seen for key in keys]
+            seen.update(keys)
+            df = df[keep]
+            df.to_csv(f, index=False, header=False, date_format='%Y-%m-%d')
+            counts[adapter.name] += len(df)
+            progress(f"{adapter.name} 已写入 {counts[adapter.name]} 条")
+    os.replace(tmp_path, out_path)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="同时抓取多个市场的IPO列表，合并为统一字段的CSV")
+    parser.add_argument('--source', nargs='+', help="只抓取这些数据源（默认 ipo_sources.json 中的全部）")
+    parser.add_argument('--config', default=SOURCES_PATH, help="数据源配置文件")
+    parser.add_argument('--out', default=MARKETS_PATH, help="输出CSV路径")
+    parser.add_argument('--max-pages', type=int, default=MAX_PAGES, help="每个数据源最多抓取的页数")
+    parser.add_argument('--list', action='store_true', help="只列出已配置的数据源")
+    args = parser.parse_args(argv)
+
+    adapters = load_adapters(args.config, args.source)
+    if args.list:
+        for adapter in adapters:
+            print(f"{adapter.name:<16}{adapter.market:<6}{type(adapter).__name__}")
+        return
+    counts = crawl_to_csv(args.out, adapters, max_pages=args.max_pages)
+    for name, count in counts.items():
+        print(f"{name}: {count} 条")
+    print(f"共 {sum(counts.values())} 条，保存到 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
+    if not is_quiet():
+        metrics.report()
+    export_metrics('ipo_sources')
@@ -0,0 +1,379 @@
+"""
+行情数据本地缓存：日线（按代码、日期）和 S&P 500 估值指标（PE、CAPE、盈利收益率）观测值
+
+- 日线按代码保存为CSV，只下载缓存中缺少的日期；多个代码合并为一次 yf.download 批量请求
+- 缓存是否过期按美股交易日判断：已包含最近一个已收盘交易日则不再请求；
+  节假日等情况下最多每 ttl 检查一次；盘中下载到的当日日线在该交易日收盘后重新下载
+- 上游请求失败时退回使用已缓存的数据
+- 缓存有界：每个代码最多保留 max_history_days 天，代码数超过 max_symbols 时淘汰最久未使用的
+  （本次请求的代码不淘汰）
+"""
+import json
+import os
+import re
+from datetime import timedelta
+
+import pandas as pd
+
+import valuation
+from instrumentation import metrics, progress
+
+
+CACHE_DIR = os.environ.get('MARKET_CACHE_DIR', '.market_cache')
+
+# 距上次检查不足 ttl 时直接使用缓存
+BARS_TTL = timedelta(hours=1)
+PE_TTL = timedelta(hours=12)
+
+MAX_HISTORY_DAYS = 3 * 365
+MAX_SYMBOLS = 200
+
+# 美股收盘时间（纽约时间），留出数据源更新的余量
+MARKET_TZ = 'America/New_York'
+SESSION_CLOSE = timedelta(hours=16, minutes=15)
+
+# 估值指标在 meta.json 中的键：指标 -> (最新值, 月度历史)
+VALUATION_KEYS = {metric: (f'SP500_{metric.upper()}', f'SP500_{metric.upper()}_HISTORY')
+                  for metric in valuation.METRICS}
+PE_SYMBOL, PE_HISTORY_KEY = VALUATION_KEYS['pe']
+
+
+def last_completed_session(now=None):
+    """最近一个已收盘的美股交易日（不含节假日判断，节假日由 ttl 兜底）"""
+    now = pd.Timestamp.now(tz=MARKET_TZ) if now is None else pd.Timestamp(now).tz_convert(MARKET_TZ)
+    day = now.normalize()
+    if now - day < SESSION_CLOSE:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.tz_localize(None)
+
+
+def _symbol_path(cache_dir, symbol):
+    # ^VIX 等代码中的特殊字符不适合作文件名
+    return os.path.join(cache_dir, 'bars', re.sub(r'[^0-9A-Za-z.\-]', '_', symbol) + '.csv')
+
+
+def _load_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'meta.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_meta(cache_dir, meta):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, 'meta.json')
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def _load_bars(cache_dir, symbol):
+    try:
+        return pd.read_csv(_symbol_path(cache_dir, symbol), index_col=0, parse_dates=True)
+    except FileNotFoundError:
+        return None
+
+
+def _save_bars(cache_dir, symbol, bars):
+    path = _symbol_path(cache_dir, symbol)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    bars.to_csv(path + '.tmp', index_label='Date')
+    os.replace(path + '.tmp', path)
+
+
+def _split_by_ticker(raw, symbols):
+    """将 yf.download 的多代码结果拆成 {代码: 日线}，兼容 MultiIndex 和单层列"""
+    frames = {}
+    if raw is None or raw.empty:
+        return frames
+    if isinstance(raw.columns, pd.MultiIndex):
+        level = 'Ticker' if 'Ticker' in raw.columns.names else 1
+        tickers = set(raw.columns.get_level_values(level))
+        for symbol in symbols:
+            if symbol in tickers:
+                frames[symbol] = raw.xs(symbol, axis=1, level=level).dropna(how='all')
+    elif len(symbols) == 1:
+        frames[symbols[0]] = raw.dropna(how='all')
+    for frame in frames.values():
+        frame.index = pd.DatetimeIndex(frame.index).tz_localize(None).normalize()
+        frame.columns.name = None
+    return frames
+
+
+def _evict(cache_dir, meta, max_symbols, keep=()):
+    """
+    代码数超过上限时，按最近使用时间淘汰
+    :param keep: 本次调用用到的代码，不淘汰（即使代码数超过上限），否则刚下载的数据会被立即删除
+    """
+    reserved = {key for keys in VALUATION_KEYS.values() for key in keys}
+    symbols = [s for s in meta if s not in reserved]
+    if len(symbols) <= max_symbols:
+        return
+    keep = set(keep)
+    candidates = sorted((s for s in symbols if s not in keep), key=lambda s: meta[s].get('used_at', ''))
+    for symbol in candidates[:len(symbols) - max_symbols]:
+        try:
+            os.remove(_symbol_path(cache_dir, symbol))
+        except FileNotFoundError:
+            pass
+        del meta[symbol]
+
+
+def get_daily_bars(symbols, lookback_days=90, cache_dir=CACHE_DIR, ttl=BARS_TTL,
+                   max_history_days=MAX_HISTORY_DAYS, max_symbols=MAX_SYMBOLS, download=None, now=None):
+    """
+    获取多个代码最近 lookback_days 个自然日的日线（与 yf.download(period=...) 的窗口一致）
+    :param download: 下载函数，默认 yf.download（测试或基准时可替换）
+    :return: {代码: 日线DataFrame}；某代码既无缓存又下载失败时不包含该代码
+    """
+    symbols = list(dict.fromkeys(symbols))
+    now = pd.Timestamp.now(tz=MARKET_TZ) if now is None else pd.Timestamp(now).tz_convert(MARKET_TZ)
+    today = now.tz_localize(None).normalize()
+    window_start = today - timedelta(days=lookback_days)
+    expected = last_completed_session(now)
+
+    meta = _load_meta(cache_dir)
+    cached = {symbol: _load_bars(cache_dir, symbol) for symbol in symbols}
+
+    # 按起始日期分组，同一组的代码用一次批量请求
+    groups = {}
+    for symbol in symbols:
+        bars = cached[symbol]
+        checked_at = meta.get(symbol, {}).get('checked_at')
+        # 已从更早的日期请求过的代码（如上市不久、历史本来就短）不再重复回补
+        requested_from = meta.get(symbol, {}).get('requested_from')
+        covered = requested_from is not None and pd.Timestamp(requested_from) <= window_start
+        # 盘中下载的当日日线只是临时价格：该交易日收盘后必须重新下载，不能当作收盘价
+        partial = meta.get(symbol, {}).get('partial')
+        partial_closed = partial is not None and pd.Timestamp(partial) <= expected
+        if bars is None or bars.empty or (bars.index[0] > window_start + timedelta(days=7) and not covered):
+            start = window_start
+        elif bars.index[-1] >= expected and not partial_closed:
+            metrics.count('market_cache', result='hit')
+            continue
+        elif checked_at and now - pd.Timestamp(checked_at) < ttl and not partial_closed:
+            metrics.count('market_cache', result='recently_checked')
+            continue
+        else:
+            # 从最后一个缓存日重新下载，覆盖盘中下载到的不完整日线
+            start = bars.index[-1]
+        metrics.count('market_cache', result='miss' if start == window_start else 'stale')
+        groups.setdefault(start, []).append(symbol)
+
+    for start, group in groups.items():
+        if download is None:
+            # 只有确实需要下载时才导入 yfinance（导入耗时较长，缓存命中时不需要）
+            import yfinance as yf
+            download = yf.download
+        progress(f"下载行情: {', '.join(group)}，起始日期 {start.strftime('%Y-%m-%d')}")
+        try:
+            with metrics.timer('yf_download'):
+                raw = download(group, start=start.strftime('%Y-%m-%d'), progress=False)
+        except Exception as e:
+            metrics.count('yf_download_errors')
+            print(f"⚠️ 行情下载失败，使用缓存数据: {e}")
+            continue
+        metrics.count('yf_symbols_downloaded', len(group))
+        fresh = _split_by_ticker(raw, group)
+        for symbol in group:
+            new_bars = fresh.get(symbol)
+            if new_bars is None or new_bars.empty:
+                print(f"⚠️ 未下载到 {symbol} 的新数据")
+                continue
+            old_bars = cached[symbol]
+            if old_bars is not None:
+                new_bars = pd.concat([old_bars[old_bars.index < new_bars.index[0]], new_bars])
+            new_bars = new_bars[new_bars.index >= today - timedelta(days=max_history_days)]
+            cached[symbol] = new_bars
+            _save_bars(cache_dir, symbol, new_bars)
+            entry = meta.setdefault(symbol, {})
+            entry['checked_at'] = now.isoformat()
+            # 最后一根日线所在交易日尚未收盘时记录下来，收盘后重新下载覆盖
+            if new_bars.index[-1] > expected:
+                entry['partial'] = new_bars.index[-1].strftime('%Y-%m-%d')
+            else:
+                entry.pop('partial', None)
+            if start == window_start:
+                entry['requested_from'] = start.strftime('%Y-%m-%d')
+
+    result = {}
+    for symbol in symbols:
+        bars = cached[symbol]
+        if bars is None or bars.empty:
+            continue
+        result[symbol] = bars[bars.index >= window_start]
+        meta.setdefault(symbol, {})['used_at'] = now.isoformat()
+
+    _evict(cache_dir, meta, max_symbols, keep=symbols)
+    _save_meta(cache_dir, meta)
+    return result
+
+
+def get_daily_closes(symbols, lookback_days=90, **kwargs):
+    """
+    获取多个代码的收盘价，返回 日期 × 代码 的宽表
+    """
+    bars = get_daily_bars(symbols, lookback_days=lookback_days, **kwargs)
+    if not bars:
+        raise ValueError("DataFrame is empty")
+    return pd.DataFrame({symbol: frame['Close'] for symbol, frame in bars.items()})
+
+
+def _series_path(cache_dir, metric):
+    return os.path.join(cache_dir, f'{metric}.csv')
+
+
+def _load_series(cache_dir, metric):
+    name = metric.upper()
+    try:
+        return pd.read_csv(_series_path(cache_dir, metric), index_col=0, parse_dates=True)[name]
+    except FileNotFoundError:
+        return pd.Series(dtype='float64', name=name)
+
+
+def _save_series(cache_dir, metric, history):
+    path = _series_path(cache_dir, metric)
+    os.makedirs(cache_dir, exist_ok=True)
+    history.to_frame(metric.upper()).to_csv(path + '.tmp', index_label='Date')
+    os.replace(path + '.tmp', path)
+
+
+def _merge_series(history, new):
+    """合并观测值，同一日期以新值为准"""
+    history = history[~history.index.isin(new.index)]
+    return pd.concat([history, new.rename(history.name)]).sort_index()
+
+
+def _rows_to_series(rows, name):
+    return pd.Series([value for _, value in rows], index=pd.DatetimeIndex([date for date, _ in rows]),
+                     name=name, dtype='float64').sort_index()
+
+
+def fetch_valuation(metrics_wanted=None, fetcher=None):
+    """
+    并发请求各估值数据源（见 valuation.ValuationFetcher）
+    :return: {指标: (日期, 数值)}，只包含取到的指标；页面没有日期时为当天
+    """
+    observations = (fetcher or valuation.default_fetcher()).fetch(metrics_wanted)
+    today = pd.Timestamp.now().normalize()
+    return {metric: (pd.Timestamp(o.date) if o.date else today, o.value) for metric, o in observations.items()}
+
+
+def fetch_valuation_history(metric, fetcher=None):
+    """获取一个估值指标的全部月度历史，返回按日期升序的 Series"""
+    rows = (fetcher or valuation.default_fetcher()).fetch_history(metric)
+    return _rows_to_series(rows, metric.upper())
+
+
+def fetch_sp500_pe_observation(fetcher=None):
+    """获取最新的 S&P 500 PE Ratio（取最快的有效数据源），返回 (日期, PE)"""
+    result = fetch_valuation(['pe'], fetcher)
+    if 'pe' not in result:
+        raise ValueError("所有PE数据源均失败")
+    return result['pe']
+
+
+def fetch_sp500_pe_history(fetcher=None):
+    """获取 S&P 500 PE Ratio 的全部月度历史，返回按日期升序的 Series"""
+    return fetch_valuation_history('pe', fetcher)
+
+
+def get_valuation_history(metric='pe', cache_dir=CACHE_DIR, ttl=timedelta(days=7), fetch=None, now=None):
+    """
+    获取估值指标的月度历史（回测用），与 get_valuation 共用 <指标>.csv
+    :return: 按日期升序的 Series；获取失败时返回已缓存的部分
+    """
+    fetch = fetch or (lambda: fetch_valuation_history(metric))
+    now = pd.Timestamp.now(tz=MARKET_TZ) if now is None else pd.Timestamp(now).tz_convert(MARKET_TZ)
+    key = VALUATION_KEYS[metric][1]
+    meta = _load_meta(cache_dir)
+    history = _load_series(cache_dir, metric)
+
+    checked_at = meta.get(key, {}).get('checked_at')
+    if not history.empty and checked_at and now - pd.Timestamp(checked_at) < ttl:
+        metrics.count('valuation_cache', metric=metric, result='hit')
+        return history
+
+    try:
+        with metrics.timer('valuation_fetch', kind='history'):
+            fetched = fetch()
+    except Exception as e:
+        metrics.count('valuation_cache', metric=metric, result='fallback')
+        print(f"⚠️ 无法获取 {metric} 历史: {e}")
+        return history
+    metrics.count('valuation_cache', metric=metric, result='miss')
+
+    history = _merge_series(history, fetched)
+    _save_series(cache_dir, metric, history)
+    meta.setdefault(key, {})['checked_at'] = now.isoformat()
+    _save_meta(cache_dir, meta)
+    return history
+
+
+def get_sp500_pe_history(cache_dir=CACHE_DIR, ttl=timedelta(days=7), fetch=None, now=None):
+    """获取 S&P 500 PE Ratio 的月度历史（回测用），见 get_valuation_history"""
+    return get_valuation_history('pe', cache_dir, ttl, fetch or fetch_sp500_pe_history, now)
+
+
+def get_valuation(metrics_wanted=valuation.METRICS, cache_dir=CACHE_DIR, ttl=PE_TTL, fetch=None, now=None):
+    """
+    获取最新的估值指标（PE、CAPE、盈利收益率），优先使用 ttl 内的缓存；
+    需要请求的指标一次并发获取，某个指标获取失败时退回它最近一次的缓存值
+    观测值按日期保存在 <指标>.csv，同一日期只保留最新值
+    :param fetch: 函数 指标列表 -> {指标: (日期, 数值)}，默认 fetch_valuation
+    :return: {指标: 数值}；既无缓存又获取失败的指标为 None
+    """
+    fetch = fetch or fetch_valuation
+    now = pd.Timestamp.now(tz=MARKET_TZ) if now is None else pd.Timestamp(now).tz_convert(MARKET_TZ)
+    meta = _load_meta(cache_dir)
+
+    result, histories, stale = {}, {}, []
+    for metric in metrics_wanted:
+        history = histories[metric] = _load_series(cache_dir, metric)
+        checked_at = meta.get(VALUATION_KEYS[metric][0], {}).get('checked_at')
+        if not history.empty and checked_at and now - pd.Timestamp(checked_at) < ttl:
+            metrics.count('valuation_cache', metric=metric, result='hit')
+            result[metric] = float(history.iloc[-1])
+        else:
+            stale.append(metric)
+    if not stale:
+        return result
+
+    try:
+        with metrics.timer('valuation_fetch', kind='latest'):
+            fetched = fetch(stale)
+    except Exception as e:
+        print(f"⚠️ 无法获取估值指标: {e}")
+        fetched = {}
+
+    for metric in stale:
+        history = histories[metric]
+        if metric not in fetched:
+            metrics.count('valuation_cache', metric=metric, result='fallback')
+            if history.empty:
+                print(f"⚠️ 无法获取 {metric}，且没有缓存值")
+                result[metric] = None
+            else:
+                print(f"⚠️ 无法获取 {metric}，使用缓存值")
+                result[metric] = float(history.iloc[-1])
+            continue
+        metrics.count('valuation_cache', metric=metric, result='miss')
+        date, value = fetched[metric]
+        _save_series(cache_dir, metric, _merge_series(history, pd.Series([value], index=pd.DatetimeIndex([date]))))
+        meta.setdefault(VALUATION_KEYS[metric][0], {})['checked_at'] = now.isoformat()
+        result[metric] = value
+    _save_meta(cache_dir, meta)
+    return result
+
+
+def get_sp500_pe(cache_dir=CACHE_DIR, ttl=PE_TTL, fetch=None, now=None):
+    """
+    获取 S&P 500 PE Ratio（见 get_valuation）
+    :param fetch: 函数 () -> (日期, PE)，默认 fetch_sp500_pe_observation
+    :return: PE 数值；既无缓存又获取失败时返回 None
+    """
+    fetch = fetch or fetch_sp500_pe_observation
+    return get_valuation(['pe'], cache_dir, ttl, lambda _: {'pe': fetch()}, now)['pe']
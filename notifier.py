@@ -0,0 +1,190 @@
+"""
+通知发送：连接池复用、限并发异步发送、指数退避重试、单次运行内去重和按接收人合并
+
+- 传输层可替换：默认 ServerChanTransport（Server酱），base_url 可指向本地替身服务器用于测试
+- 同一次运行中内容完全相同的通知只发送一次
+- 同一接收人（SendKey）的多条通知合并为一条发送，减少请求数并避免触发频率限制
+- 未传入 session 的分发器共用进程内的连接池，常驻运行（scheduler.py）时多次发送复用连接
+"""
+import asyncio
+import hashlib
+import random
+import threading
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import metrics
+
+
+Notification = namedtuple('Notification', ['send_key', 'title', 'content'])
+
+# 单条通知的发送结果：error 为 None 表示成功
+SendResult = namedtuple('SendResult', ['notification', 'result', 'error', 'attempts'])
+
+
+_shared_session = None
+_shared_pool_size = 0
+_shared_lock = threading.Lock()
+
+
+def shared_session(pool_size=4):
+    """
+    进程内共用的带连接池的Session（首次调用时创建）
+    之后请求更大的 pool_size 时换上该大小的连接池，连接池始终按请求过的最大并发数设置
+    """
+    global _shared_session, _shared_pool_size
+    with _shared_lock:
+        if _shared_session is None:
+            _shared_session = requests.Session()
+        if pool_size > _shared_pool_size:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _shared_session.mount('https://', adapter)
+            _shared_session.mount('http://', adapter)
+            _shared_pool_size = pool_size
+        return _shared_session
+
+
+class NotificationError(Exception):
+    """发送失败；retryable 表示是否值得重试（网络错误、限流、5xx 等）"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class ServerChanTransport:
+    """
+    Server酱 传输层
+    :param base_url: 接口地址，测试时可指向本地替身服务器
+    """
+
+    def __init__(self, base_url='https://sctapi.ftqq.com'):
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, session, notification, timeout):
+        url = f"{self.base_url}/{notification.send_key}.send"
+        data = {
+            "title": notification.title,
+            "desp": notification.content  # 支持 Markdown，如换行用 \n\n，加粗用 **text**
+        }
+        response = session.post(url, data=data, timeout=timeout)
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise NotificationError(f"状态码: {response.status_code}", retryable=True)
+        if response.status_code != 200:
+            raise NotificationError(f"状态码: {response.status_code}", retryable=False)
+        try:
+            result = response.json()
+        except ValueError:
+            raise NotificationError(f"响应不是JSON: {response.text[:200]}", retryable=True)
+        if result.get("code") != 0:
+            raise NotificationError(result.get("message") or f"code={result.get('code')}", retryable=False)
+        return result
+
+
+class NotificationDispatcher:
+    """
+    通知分发器
+    用法：
+        dispatcher = NotificationDispatcher()
+        dispatcher.add(title, content, send_key)
+        results = dispatcher.flush()
+    :param transport: 传输层对象，需提供 send(session, notification, timeout)
+    :param max_concurrency: 最大并发请求数（共用连接池至少扩大到该大小）
+    :param max_retries: 可重试错误的最大重试次数
+    :param backoff: 首次重试的等待秒数，之后按 2 的指数增长（带随机抖动），最多 max_backoff 秒
+    :param timeout: 单次请求超时（秒）
+    :param merge: 是否将同一接收人的多条通知合并为一条
+    :param session: 发送用的Session；默认使用 shared_session()，close() 不会关闭共用的Session
+    """
+
+    def __init__(self, transport=None, max_concurrency=4, max_retries=3, backoff=0.5, max_backoff=8.0,
+                 timeout=10, merge=True, session=None):
+        self.transport = transport or ServerChanTransport()
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.merge = merge
+
+        self.session = session if session is not None else shared_session(max_concurrency)
+
+        self._pending = []
+        self._seen = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """丢弃未发送的通知；Session由调用方或共用连接池管理，这里不关闭"""
+        self._pending = []
+
+    def add(self, title, content, send_key):
+        """
+        加入待发送队列；本次运行中已加入过的相同通知会被忽略
+        :return: 是否加入（False 表示重复）
+        """
+        key = hashlib.sha1(f"{send_key}\0{title}\0{content}".encode('utf-8')).hexdigest()
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        self._pending.append(Notification(send_key, title, content))
+        return True
+
+    def _batches(self, notifications):
+        """按接收人合并通知，保持加入顺序"""
+        if not self.merge:
+            return notifications
+        groups = {}
+        for notification in notifications:
+            groups.setdefault(notification.send_key, []).append(notification)
+
+        batches = []
+        for send_key, group in groups.items():
+            if len(group) == 1:
+                batches.append(group[0])
+                continue
+            title = f"{group[0].title}（共{len(group)}条）"
+            content = "\n\n---\n\n".join(f"### {n.title}\n\n{n.content}" for n in group)
+            batches.append(Notification(send_key, title, content))
+        return batches
+
+    async def _send_with_retry(self, notification, semaphore):
+        async with semaphore:
+            for attempt in range(1, self.max_retries + 2):
+                try:
+                    with metrics.timer('notify_send'):
+                        result = await asyncio.to_thread(self.transport.send, self.session, notification,
+                                                         self.timeout)
+                    metrics.count('notify_attempts', result='ok')
+                    return SendResult(notification, result, None, attempt)
+                except NotificationError as e:
+                    error = e
+                except requests.exceptions.RequestException as e:
+                    error = NotificationError(str(e), retryable=True)
+
+                if not error.retryable or attempt > self.max_retries:
+                    metrics.count('notify_attempts', result='failed')
+                    return SendResult(notification, None, error, attempt)
+                metrics.count('notify_attempts', result='retry')
+                delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def flush_async(self):
+        """并发发送所有待发送通知，返回 SendResult 列表（顺序与合并后的批次一致）"""
+        batches = self._batches(self._pending)
+        self._pending = []
+        if not batches:
+            return []
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        return list(await asyncio.gather(*(self._send_with_retry(n, semaphore) for n in batches)))
+
+    def flush(self):
+        """同步接口：在新的事件循环中执行 flush_async"""
+        return asyncio.run(self.flush_async())
@@ -0,0 +1,218 @@
+"""
+常驻调度：在一个进程中按计划反复运行 vix-strategy、盘中监控（intraday_monitor）和 hk_ipo_scraper
+
+- pandas / yfinance / lxml 只导入一次；HTTP连接池、HTTP缓存索引、盘中监控的最高点和已通知档位等状态在各次运行间保留
+- 计划见 schedule.json（或环境变量 SCHEDULE_CONFIG 指定的文件）：
+  vix 任务只读取日线，收盘后（SESSION_CLOSE 之后）运行一次；
+  intraday 任务在交易时段内每隔几分钟轮询一次分钟线，档位变化时立即通知（同一档位不重复通知）
+    every_minutes + between  交易时段内每 N 分钟运行一次（从时段开始对齐）
+    at                       每天的固定时刻
+    weekdays                 运行的星期（0=周一），timezone 为以上时刻所在时区
+    kwargs                   传给任务 main() 的参数
+- 每个任务在独立的线程中运行：某个任务出错或耗时较长不影响其他任务；上一次还没结束时跳过本次
+- 每次任务结束后按 METRICS_JSONL / METRICS_TEXTFILE 导出累计指标（见 instrumentation）
+
+用法：
+    python scheduler.py              # 常驻运行，Ctrl+C / SIGTERM 退出（等待正在运行的任务结束）
+    python scheduler.py --list       # 显示各任务接下来的运行时间
+    python scheduler.py --once vix   # 立即运行一次指定任务后退出
+"""
+import argparse
+import importlib.util
+import json
+import os
+import signal
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from instrumentation import export_metrics, metrics, progress
+
+
+SCHEDULE_PATH = os.environ.get('SCHEDULE_CONFIG',
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schedule.json'))
+
+# 无任务到期时最长的等待时间（秒），便于及时响应退出信号
+MAX_SLEEP = 60
+
+
+_scripts = {}
+
+
+def _load_script(filename, module_name):
+    """按文件路径导入脚本（vix-strategy.py 文件名含连字符，不能直接 import）"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _vix_main(**kwargs):
+    _scripts.setdefault('vix', _load_script('vix-strategy.py', 'vix_strategy')).main(**kwargs)
+
+
+def _intraday_main(**kwargs):
+    import intraday_monitor
+    intraday_monitor.check(**kwargs)
+
+
+def _ipo_main(**kwargs):
+    import hk_ipo_scraper
+    hk_ipo_scraper.main(**kwargs)
+
+
+# 可调度的任务：名称 -> 入口函数
+JOBS = {
+    'vix': _vix_main,
+    'intraday': _intraday_main,
+    'ipo': _ipo_main,
+}
+
+
+def _parse_time(text):
+    hour, minute = text.split(':')
+    return int(hour), int(minute)
+
+
+class Schedule:
+    """
+    单个任务的运行计划
+    :param every_minutes: 运行间隔（分钟），与 at 二选一
+    :param between: (开始, 结束) 时刻，如 ('09:30', '16:15')；every_minutes 在此时段内从开始时刻对齐
+    :param at: 每天的固定运行时刻列表，如 ['18:30']
+    :param weekdays: 运行的星期（0=周一）
+    :param timezone: 以上时刻所在的时区
+    """
+
+    def __init__(self, every_minutes=None, between=None, at=None, weekdays=range(7), timezone='UTC'):
+        if (every_minutes is None) == (at is None):
+            raise ValueError("every_minutes 和 at 必须且只能指定一个")
+        self.tz = ZoneInfo(timezone)
+        self.weekdays = set(weekdays)
+        if at is not None:
+            self.times = sorted(_parse_time(t) for t in at)
+        else:
+            start, end = (_parse_time(t) for t in (between or ('00:00', '23:59')))
+            first, last = start[0] * 60 + start[1], end[0] * 60 + end[1]
+            self.times = [divmod(m, 60) for m in range(first, last + 1, int(every_minutes))]
+
+    def next_run(self, after):
+        """after 之后的下一次运行时间（带时区）"""
+        local = after.astimezone(self.tz)
+        for offset in range(8):
+            day = (local + timedelta(days=offset)).date()
+            if day.weekday() not in self.weekdays:
+                continue
+            for hour, minute in self.times:
+                candidate = datetime(day.year, day.month, day.day, hour, minute, tzinfo=self.tz)
+                if candidate > local:
+                    return candidate
+        raise ValueError("计划中没有可运行的时间")
+
+
+class Job:
+    def __init__(self, name, func, schedule, kwargs=None):
+        self.name = name
+        self.func = func
+        self.schedule = schedule
+        self.kwargs = kwargs or {}
+
+
+def load_jobs(path=SCHEDULE_PATH):
+    """读取计划文件，返回 [Job]"""
+    with open(path, encoding='utf-8') as f:
+        spec = json.load(f)
+    jobs = []
+    for name, options in spec['jobs'].items():
+        if name not in JOBS:
+            raise ValueError(f"未知的任务: {name}（可用: {', '.join(JOBS)}）")
+        options = dict(options)
+        kwargs = options.pop('kwargs', None)
+        jobs.append(Job(name, JOBS[name], Schedule(**options), kwargs))
+    return jobs
+
+
+def run_job(job):
+    """运行一次任务；异常只记录，不影响调度器和其他任务"""
+    progress(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始任务 {job.name}")
+    try:
+        with metrics.timer('scheduler_job', job=job.name):
+            job.func(**job.kwargs)
+        result = 'ok'
+    except Exception:
+        print(f"❌ 任务 {job.name} 出错:")
+        traceback.print_exc()
+        result = 'error'
+    metrics.count('scheduler_job_runs', job=job.name, result=result)
+    try:
+        export_metrics('scheduler')
+    except OSError as e:
+        print(f"⚠️ 指标导出失败: {e}")
+    return result
+
+
+def run_forever(jobs, stop_event=None):
+    """
+    按计划运行任务，直到 stop_event 被设置
+    错过的运行（如任务耗时超过间隔）不补跑，直接排到下一个计划时间
+    """
+    stop_event = stop_event or threading.Event()
+    now = datetime.now(timezone.utc)
+    next_runs = {job.name: job.schedule.next_run(now) for job in jobs}
+    running = {}
+    for job in jobs:
+        progress(f"任务 {job.name} 下次运行: {next_runs[job.name].strftime('%Y-%m-%d %H:%M %Z')}")
+
+    with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix='job') as executor:
+        while not stop_event.is_set():
+            now = datetime.now(timezone.utc)
+            for job in jobs:
+                if next_runs[job.name] > now:
+                    continue
+                if job.name in running and not running[job.name].done():
+                    print(f"⚠️ 任务 {job.name} 上一次运行尚未结束，跳过本次")
+                    metrics.count('scheduler_job_runs', job=job.name, result='skipped')
+                else:
+                    running[job.name] = executor.submit(run_job, job)
+                next_runs[job.name] = job.schedule.next_run(now)
+            wait = (min(next_runs.values()) - datetime.now(timezone.utc)).total_seconds()
+            stop_event.wait(min(max(wait, 0), MAX_SLEEP))
+        progress("正在退出，等待运行中的任务结束...")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻调度 vix-strategy、盘中监控和 hk_ipo_scraper")
+    parser.add_argument('--config', default=SCHEDULE_PATH, help="计划文件（JSON）")
+    parser.add_argument('--list', action='store_true', help="显示各任务接下来的运行时间")
+    parser.add_argument('--once', choices=sorted(JOBS), help="立即运行一次指定任务后退出")
+    args = parser.parse_args()
+
+    jobs = load_jobs(args.config)
+    if args.once:
+        job = next((job for job in jobs if job.name == args.once), None) or Job(args.once, JOBS[args.once], None)
+        run_job(job)
+        return
+    if args.list:
+        now = datetime.now(timezone.utc)
+        for job in jobs:
+            when = now
+            runs = []
+            for _ in range(5):
+                when = job.schedule.next_run(when)
+                runs.append(when.strftime('%m-%d %H:%M'))
+            print(f"{job.name}: {', '.join(runs)} ({job.schedule.tz.key})")
+        return
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    try:
+        run_forever(jobs, stop_event)
+    except KeyboardInterrupt:
+        stop_event.set()
+
+
+if __name__ == "__main__":
+    main()
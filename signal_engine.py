@@ -0,0 +1,259 @@
+"""
+VIX / 回撤 / PE 策略的多代码信号计算
+
+输入为 日期 × 代码 的收盘价宽表，所有计算都是整表的 pandas/NumPy 运算，
+不按代码循环：
+- 前 window 个交易日（不含当日）的最高点：rolling max 后整体下移一行
+- 回撤幅度、各条件和建议档位：整表布尔运算 + np.select
+VIX 和 PE 为全市场指标（按日期的序列或标量），按行广播到所有代码
+
+条件和档位由规则表（strategy_rules.json）描述，编译一次后既用于每日提醒，也用于批量扫描和回测：
+- params: 阈值，条件中以 "$名称" 引用，可在编译时覆盖（如回测时扫描参数）
+- conditions: 条件名 -> {"field": 字段, 比较符: 阈值, ...}，比较符为 gt/ge/lt/le，同一条件内为"且"
+- tiers: 按优先级排列的档位，{"advice": 建议, "direction": 1/-1, "all": [...], "any": [...]}
+- default: 所有档位都不满足时的建议
+"""
+import json
+import os
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+
+WINDOW = 60
+
+RULES_PATH = os.environ.get('STRATEGY_RULES',
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'strategy_rules.json'))
+
+_COMPARATORS = {
+    'gt': np.greater,
+    'ge': np.greater_equal,
+    'lt': np.less,
+    'le': np.less_equal,
+}
+
+
+def load_rules(path=RULES_PATH):
+    """读取规则表（JSON）"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class CompiledRules:
+    """
+    编译后的规则表
+    条件展开为 (字段, 比较函数, 阈值) 列表，档位展开为条件名列表；
+    evaluate 对任意形状的字段数组（最后一天或整段历史）做整表比较，求值时不按代码或日期分支
+    """
+
+    def __init__(self, spec, params=None):
+        self.spec = spec
+        self.params = dict(spec.get('params', {}))
+        unknown = set(params or {}) - set(self.params)
+        if unknown:
+            raise ValueError(f"未知的阈值: {sorted(unknown)}")
+        self.params.update(params or {})
+
+        self.conditions = {}
+        for name, condition in spec['conditions'].items():
+            checks = []
+            for key, value in condition.items():
+                if key == 'field':
+                    continue
+                if key not in _COMPARATORS:
+                    raise ValueError(f"条件 {name} 中不支持的比较符: {key}")
+                if isinstance(value, str) and value.startswith('$'):
+                    if value[1:] not in self.params:
+                        raise ValueError(f"条件 {name} 引用了未定义的阈值: {value}")
+                    value = self.params[value[1:]]
+                checks.append((_COMPARATORS[key], float(value)))
+            self.conditions[name] = (condition['field'], checks)
+
+        self.tiers = []
+        for tier in spec['tiers']:
+            names = list(tier.get('all', [])) + list(tier.get('any', []))
+            missing = [n for n in names if n not in self.conditions]
+            if missing:
+                raise ValueError(f"档位 {tier['advice']} 引用了未定义的条件: {missing}")
+            self.tiers.append((list(tier.get('all', [])), list(tier.get('any', []))))
+
+        # 档位编号即在 labels 中的下标，最后一个为默认档位；整表计算时只保存编号，避免生成大量字符串
+        self.labels = [tier['advice'] for tier in spec['tiers']] + [spec['default']]
+        self.hold = len(self.labels) - 1
+        self.directions = np.array([tier.get('direction', 0) for tier in spec['tiers']] + [0])
+        self.fields = sorted({field for field, _ in self.conditions.values()})
+
+    def with_params(self, params):
+        """用新的阈值重新编译"""
+        return CompiledRules(self.spec, {**self.params, **params})
+
+    def empty_conditions(self):
+        """
+        区间为空的条件名列表（下限不小于上限，如 vix_low >= vix_high），
+        这样的条件永远不成立，依赖它的档位也永远不会出现
+        """
+        lower_ops = (_COMPARATORS['gt'], _COMPARATORS['ge'])
+        empty = []
+        for name, (_, checks) in self.conditions.items():
+            lower = [threshold for compare, threshold in checks if compare in lower_ops]
+            upper = [threshold for compare, threshold in checks if compare not in lower_ops]
+            if lower and upper and max(lower) >= min(upper):
+                empty.append(name)
+        return empty
+
+    def evaluate_conditions(self, fields):
+        """
+        :param fields: {字段名: 数组}，各数组可广播到同一形状（如 VIX 为 (日期数, 1)，回撤为 (日期数, 代码数)）
+        :return: {条件名: 布尔数组}
+        """
+        result = {}
+        for name, (field, checks) in self.conditions.items():
+            values = fields[field]
+            mask = None
+            for compare, threshold in checks:
+                check = compare(values, threshold)
+                mask = check if mask is None else mask & check
+            result[name] = mask
+        return result
+
+    def classify(self, conditions):
+        """按优先级把条件组合映射到档位编号数组（labels 的下标）"""
+        choices = []
+        for all_names, any_names in self.tiers:
+            # 各条件形状可能不同（按日期 / 按日期 × 代码），用逐个广播的 & | 合并
+            mask = reduce(np.logical_and, [conditions[n] for n in all_names], True)
+            if any_names:
+                mask = mask & reduce(np.logical_or, [conditions[n] for n in any_names])
+            choices.append(mask)
+        return np.select(choices, range(len(choices)), default=self.hold).astype(np.int8)
+
+    def evaluate(self, fields):
+        """返回 (条件字典, 档位编号数组)"""
+        conditions = self.evaluate_conditions(fields)
+        return conditions, self.classify(conditions)
+
+
+def compile_rules(spec=None, params=None):
+    """
+    编译规则表
+    :param spec: 规则表 dict 或 JSON 文件路径；None 表示 RULES_PATH
+    :param params: 覆盖规则表中的部分阈值
+    """
+    if spec is None or isinstance(spec, str):
+        spec = load_rules(spec or RULES_PATH)
+    return CompiledRules(spec, params)
+
+
+DEFAULT_RULES = compile_rules()
+
+# 默认规则表的阈值和档位
+DEFAULT_THRESHOLDS = dict(DEFAULT_RULES.params)
+ADVICE_LABELS = DEFAULT_RULES.labels
+TIER_HOLD = DEFAULT_RULES.hold
+
+
+def _resolve_rules(rules=None, thresholds=None):
+    rules = rules or DEFAULT_RULES
+    return rules.with_params(thresholds) if thresholds else rules
+
+
+def _as_column(values, index):
+    """将按日期的序列、已对齐的数组或标量转成 (日期数, 1) 的数组，便于按行广播"""
+    if isinstance(values, np.ndarray):
+        return values.reshape(len(index), 1)
+    if isinstance(values, pd.Series):
+        # 按日期向前取最近一个观测值（如月度PE对齐到每个交易日）
+        values = values[~values.index.duplicated(keep='last')].sort_index()
+        values = values.reindex(values.index.union(index)).ffill().reindex(index)
+        return values.to_numpy(dtype='float64')[:, None]
+    return np.full((len(index), 1), np.nan if values is None else float(values))
+
+
+def rolling_pullback(prices, window=WINDOW):
+    """
+    计算每个交易日相对前 window 个交易日（不含当日）最高点的回撤
+    :param prices: 日期 × 代码 的收盘价宽表
+    :return: (最高点宽表, 回撤百分比宽表)；历史不足 window+1 个交易日的位置为 NaN
+    """
+    high = prices.rolling(window, min_periods=window).max().shift(1)
+    pullback = (high - prices) / high * 100
+    return high, pullback
+
+
+def compute_conditions(pullback, vix, pe, thresholds=None, rules=None):
+    """
+    计算规则表中的各个条件，返回 {条件名: 布尔数组}
+    PE 缺失（NaN）时所有 PE 条件均为 False
+    :param thresholds: 覆盖规则表中的部分阈值
+    :param rules: CompiledRules，默认 DEFAULT_RULES
+    """
+    rules = _resolve_rules(rules, thresholds)
+    return rules.evaluate_conditions({
+        'vix': _as_column(vix, pullback.index),
+        'pullback': pullback.to_numpy(dtype='float64'),
+        'pe': _as_column(pe, pullback.index),
+    })
+
+
+def classify_advice(conditions, rules=None):
+    """按优先级把条件组合映射到建议档位，返回档位编号数组（rules.labels 的下标）"""
+    return (rules or DEFAULT_RULES).classify(conditions)
+
+
+def compute_signal_panel(prices, vix, pe, window=WINDOW, thresholds=None, rules=None):
+    """
+    对整个价格面板计算信号
+    :param prices: 日期 × 代码 的收盘价宽表
+    :param vix: 按日期的 VIX 序列（缺失日期向前填充）或标量
+    :param pe: 按日期的 PE 序列或标量（None 表示缺失）
+    :param thresholds: 覆盖规则表中的部分阈值
+    :param rules: CompiledRules，默认 DEFAULT_RULES
+    :return: dict，包含 'high'、'pullback'、各条件以及档位编号 'tier'（均为 日期 × 代码 DataFrame）
+    """
+    rules = _resolve_rules(rules, thresholds)
+    high, pullback = rolling_pullback(prices, window)
+    conditions = compute_conditions(pullback, vix, pe, rules=rules)
+    shape = pullback.shape
+
+    panel = {'high': high, 'pullback': pullback}
+    for name, mask in conditions.items():
+        panel[name] = pd.DataFrame(np.broadcast_to(mask, shape), index=prices.index, columns=prices.columns)
+    panel['tier'] = pd.DataFrame(rules.classify(conditions), index=prices.index, columns=prices.columns)
+    return panel
+
+
+def latest_signals(prices, vix, pe, window=WINDOW, thresholds=None, rules=None):
+    """
+    计算最后一个交易日所有代码的信号
+    :return: DataFrame，行为代码，列为 close/high/pullback/vix/pe/各条件/tier/advice
+    """
+    rules = _resolve_rules(rules, thresholds)
+    # 只需要最后 window+1 行即可得到最后一天的结果
+    tail = prices.iloc[-(window + 1):]
+    panel = compute_signal_panel(tail, vix, pe, window, rules=rules)
+    last = tail.index[-1]
+
+    table = pd.DataFrame({
+        'close': tail.iloc[-1],
+        'high': panel['high'].iloc[-1],
+        'pullback': panel['pullback'].iloc[-1],
+    })
+    table['vix'] = _as_column(vix, tail.index)[-1, 0]
+    table['pe'] = _as_column(pe, tail.index)[-1, 0]
+    for name in list(rules.conditions) + ['tier']:
+        table[name] = panel[name].loc[last]
+    table['advice'] = np.asarray(rules.labels, dtype=object)[table['tier'].to_numpy()]
+    table.index.name = 'symbol'
+    return table
+
+
+def scan_symbols(symbols, pe=None, lookback_days=120, window=WINDOW, vix_symbol='^VIX', rules=None):
+    """
+    下载（或读取缓存）多个代码和 VIX 的收盘价，一次性计算所有代码最新的信号
+    """
+    from market_data import get_daily_closes
+
+    closes = get_daily_closes(list(symbols) + [vix_symbol], lookback_days=lookback_days)
+    vix = closes.pop(vix_symbol).dropna()
+    return latest_signals(closes, vix, pe, window, rules=rules)
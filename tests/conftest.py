@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# 仓库是平铺的脚本，测试直接从仓库根目录和 benchmarks 导入
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+
+@pytest.fixture(autouse=True)
+def http_cache_dir(tmp_path):
+    """每个测试使用独立的HTTP缓存目录，不读写 .market_cache"""
+    import http_cache
+
+    cache = http_cache.configure(str(tmp_path / 'http'))
+    yield cache
+    http_cache.configure()
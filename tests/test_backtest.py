@@ -0,0 +1,84 @@
+"""回测：网格扫描与逐组 run_backtest 一致、跳过上下限颠倒的组合、月度PE不提前使用"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import forward_returns, lag_monthly, run_backtest, sweep_thresholds
+from signal_engine import DEFAULT_RULES, compute_signal_panel
+
+
+def synthetic_market(n=1500, seed=0):
+    """两个代码的日线、与回撤相关的 VIX 和每月1日标注的月度PE"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2015-01-02', periods=n)
+    prices = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n, 2)), axis=0)), index=dates,
+                          columns=['AAA', 'BBB'])
+    drawdown = (1 - prices['AAA'] / prices['AAA'].cummax()) * 100
+    vix = (12 + 1.2 * drawdown + rng.normal(0, 3, n)).clip(lower=9)
+    months = pd.date_range(dates[0] - pd.offsets.MonthBegin(1), dates[-1], freq='MS')
+    pe = pd.Series(rng.uniform(12, 32, len(months)), index=months)
+    return prices, vix, pe
+
+
+GRID = {'vix_low': [20, 30], 'vix_high': [30, 40], 'pullback_mid': [10, 15], 'pullback_high': [10, 20]}
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_sweep_matches_run_backtest(max_workers):
+    prices, vix, pe = synthetic_market()
+    sweep = sweep_thresholds(prices, vix, pe, GRID, horizons=(5, 20), max_workers=max_workers)
+
+    combos = sweep[list(GRID)].drop_duplicates().to_dict('records')
+    # 16 组中 vix_low=30/vix_high=30 与 pullback_mid>=pullback_high 的组合区间为空，被跳过
+    assert len(combos) == 6
+    for thresholds in combos:
+        assert thresholds['vix_low'] < thresholds['vix_high']
+        assert thresholds['pullback_mid'] < thresholds['pullback_high']
+        rows = sweep.loc[(sweep[list(GRID)] == pd.Series(thresholds)).all(axis=1)].drop(columns=list(GRID))
+        _, expected = run_backtest(prices, vix, pe, horizons=(5, 20), thresholds=thresholds)
+        pd.testing.assert_frame_equal(rows.reset_index(drop=True), expected, check_dtype=False)
+    assert (sweep['signals'] > 0).any()
+
+
+def test_sweep_rejects_grid_without_valid_combinations():
+    prices, vix, pe = synthetic_market(300)
+    with pytest.raises(ValueError):
+        sweep_thresholds(prices, vix, pe, {'vix_low': [40, 45], 'vix_high': [40]}, max_workers=1)
+    with pytest.raises(ValueError):
+        sweep_thresholds(prices, vix, pe, {'unknown': [1]}, max_workers=1)
+
+
+def test_signals_match_signal_panel_and_forward_returns():
+    prices, vix, pe = synthetic_market()
+    signals, stats = run_backtest(prices, vix, pe, horizons=(5,))
+    tiers = compute_signal_panel(prices, vix, lag_monthly(pe))['tier']
+    expected = tiers.stack()
+    expected = expected[expected != DEFAULT_RULES.hold]
+    assert len(signals) == len(expected)
+    assert (signals.set_index(['date', 'symbol'])['tier'] == expected).all()
+
+    forward = forward_returns(prices, (5,))[5]
+    row = signals.iloc[len(signals) // 2]
+    i, j = prices.index.get_loc(row['date']), prices.columns.get_loc(row['symbol'])
+    assert row['fwd_5'] == pytest.approx((prices.iloc[i + 5, j] / prices.iloc[i, j] - 1) * 100)
+    active = stats[(stats['horizon'] == 5) & (stats['tier'] != DEFAULT_RULES.hold)]
+    assert active['signals'].sum() == np.count_nonzero(~np.isnan(forward[tiers.to_numpy() != DEFAULT_RULES.hold]))
+
+
+def test_monthly_pe_is_used_from_month_end():
+    pe = pd.Series([10.0, 20.0, 31.5], index=pd.to_datetime(['2024-01-01', '2024-02-01', '2024-02-14']))
+    lagged = lag_monthly(pe)
+    # 月初标注的观测值移到月末；非月初的观测值（当天记录的最新值）不移动
+    assert list(lagged.index) == list(pd.to_datetime(['2024-01-31', '2024-02-14', '2024-02-29']))
+    assert list(lagged) == [10.0, 31.5, 20.0]
+    assert lag_monthly(25.0) == 25.0
+
+    # 2月的交易日在月末前只能看到1月的PE：1月PE<20（低估），2月PE>27 时2月中旬不应出现"高估"类档位
+    dates = pd.bdate_range('2023-11-01', '2024-03-15')
+    prices = pd.DataFrame({'SPY': 100.0}, index=dates)
+    prices.loc['2024-02-01':'2024-02-09', 'SPY'] = 93.0
+    monthly = pd.Series([15.0, 15.0, 15.0, 15.0, 30.0, 30.0],
+                        index=pd.date_range('2023-10-01', '2024-03-01', freq='MS'))
+    signals, _ = run_backtest(prices, pd.Series(35.0, index=dates), monthly, horizons=(5,))
+    february = signals[(signals['date'] >= '2024-02-01') & (signals['date'] < '2024-02-29')]
+    assert february.empty
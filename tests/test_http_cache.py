@@ -0,0 +1,166 @@
+"""HTTP响应缓存：对本地替身服务器验证 ETag / 304 条件请求、内容未变时复用解析结果、超过容量时按最近使用淘汰"""
+import hashlib
+import http.server
+import os
+import threading
+
+import pytest
+
+from http_cache import HttpCache, _url_key
+
+
+def etag_of(body):
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+class EtagStandIn:
+    """
+    本地替身：GET /<名称> 返回 pages[名称]
+    - 路径以 /etag/ 开头时带 ETag（内容哈希），请求的 If-None-Match 与之相同时返回 304
+    - 其他路径不支持条件请求，每次返回 200 和完整内容
+    - 不存在的名称返回 404；requests 记录 (路径, If-None-Match, 状态码)
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = stand_in.pages.get(self.path.rsplit('/', 1)[-1])
+                etag = etag_of(body) if body is not None else None
+                condition = self.headers.get('If-None-Match')
+                if body is None:
+                    status = 404
+                elif self.path.startswith('/etag/') and condition == etag:
+                    status = 304
+                else:
+                    status = 200
+                stand_in.requests.append((self.path, condition, status))
+                self.send_response(status)
+                if status == 200:
+                    if self.path.startswith('/etag/'):
+                        self.send_header('ETag', etag)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self._server.server_port}'
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def server():
+    with EtagStandIn() as stand_in:
+        yield stand_in
+
+
+class CountingParser:
+    """记录被调用次数的解析函数，结果为 [内容长度, 内容前10字节]"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, body):
+        self.calls += 1
+        return [len(body), body[:10].decode('utf-8')]
+
+
+def test_etag_revalidation_reuses_body_and_parse_result(tmp_path, server):
+    server.pages['a'] = b'<html>version 1</html>'
+    cache, parse = HttpCache(str(tmp_path)), CountingParser()
+    url = server.base_url + '/etag/a'
+
+    first = cache.get(url)
+    assert first.changed and not first.revalidated
+    assert cache.parse(first, 'rows', parse) == [22, '<html>vers']
+
+    second = cache.get(url)
+    assert second.revalidated and not second.changed and second.content == first.content
+    assert cache.parse(second, 'rows', parse) == [22, '<html>vers'] and parse.calls == 1
+    # 第二次请求带上次的 ETag，服务器返回 304
+    assert server.requests[-1] == ('/etag/a', etag_of(server.pages['a']), 304)
+
+    # 内容变化：服务器返回 200 和新内容，解析结果重新计算
+    server.pages['a'] = b'<html>version 2 longer</html>'
+    third = cache.get(url)
+    assert third.changed and not third.revalidated
+    assert cache.parse(third, 'rows', parse)[0] == 29 and parse.calls == 2
+
+
+def test_unchanged_body_without_etag_skips_parsing(tmp_path, server):
+    server.pages['b'] = b'plain body'
+    cache, parse = HttpCache(str(tmp_path)), CountingParser()
+    url = server.base_url + '/plain/b'
+
+    cache.parse(cache.get(url), 'rows', parse)
+    response = cache.get(url)
+    # 服务器不支持条件请求：仍返回 200，但内容哈希与上次相同
+    assert server.requests[-1] == ('/plain/b', None, 200)
+    assert not response.changed and not response.revalidated
+    cache.parse(response, 'rows', parse)
+    assert parse.calls == 1
+
+    # 新的实例（如下次运行）从磁盘读取索引和解析结果
+    reopened = HttpCache(str(tmp_path))
+    reopened.parse(reopened.get(url), 'rows', parse)
+    assert parse.calls == 1
+
+
+def test_non_200_is_not_cached(tmp_path, server):
+    cache = HttpCache(str(tmp_path))
+    response = cache.get(server.base_url + '/etag/missing')
+    assert response.status_code == 404 and response.digest is None
+    assert cache._load_index() == {}
+
+
+def test_lru_eviction_under_size_bound(tmp_path, server):
+    for name in 'xyz':
+        server.pages[name] = name.encode() * 1000
+    cache = HttpCache(str(tmp_path), max_bytes=2500)
+    url = {name: server.base_url + f'/etag/{name}' for name in 'xyz'}
+
+    cache.get(url['x'])
+    cache.get(url['y'])
+    cache.get(url['x'])  # 304，更新 x 的最近使用时间
+    cache.get(url['z'])  # 超过 2500 字节：淘汰最久未使用的 y
+
+    index = cache._load_index()
+    assert sorted(entry['url'] for entry in index.values()) == [url['x'], url['z']]
+    assert not os.path.exists(os.path.join(str(tmp_path), _url_key(url['y']) + '.body'))
+    assert sum(entry['size'] for entry in index.values()) <= 2500
+
+    # 被淘汰的 URL 再次请求时不带 If-None-Match，重新下载
+    assert cache.get(url['y']).changed
+    assert server.requests[-1] == ('/etag/y', None, 200)
+
+
+def test_parse_results_count_toward_size_bound(tmp_path, server):
+    server.pages['p'] = b'p' * 100
+    server.pages['q'] = b'q' * 100
+    cache = HttpCache(str(tmp_path), max_bytes=400)
+    p = cache.get(server.base_url + '/etag/p')
+    cache.parse(p, 'rows', lambda body: ['x' * 150])
+    q = cache.get(server.base_url + '/etag/q')
+    cache.parse(q, 'rows', lambda body: ['x' * 150])
+
+    # p 的内容和解析结果合计超过一半容量，加入 q 的解析结果后 p 被整体淘汰（包括解析结果文件）
+    index = cache._load_index()
+    assert [entry['url'] for entry in index.values()] == [server.base_url + '/etag/q']
+    assert not os.path.exists(os.path.join(str(tmp_path), _url_key(p.url) + '.rows.json'))
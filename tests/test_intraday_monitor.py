@@ -0,0 +1,139 @@
+"""盘中监控：单调队列最高点与 rolling_pullback 一致；回放行情时各交易日的档位与整表计算一致，滞回只在阈值附近起作用"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from intraday_monitor import IntradayMonitor, ReplayFeed, RunningMax
+from signal_engine import DEFAULT_RULES, compute_signal_panel, rolling_pullback
+
+NO_BANDS = {'vix': 0.0, 'pullback': 0.0, 'pe': 0.0}
+
+
+def synthetic_days(n=400, seed=0):
+    """n 个交易日的收盘价和 VIX：价格波动较大，VIX 随回撤升高，使各档位都能出现"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2024-01-02', periods=n)
+    prices = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.025, n))), index=dates)
+    _, pullback = rolling_pullback(prices.to_frame('SPY'))
+    vix = 15 + 1.3 * pullback['SPY'].fillna(0) + rng.normal(0, 3, n)
+    return prices, vix.clip(lower=9)
+
+
+def replay_frame(prices, vix):
+    """每个交易日一笔 SPY（15:59）和一笔 VIX（16:00）行情，时间不带时区（按纽约时间解释）"""
+    spy = pd.DataFrame({'time': prices.index + pd.Timedelta('15h59min'), 'symbol': 'SPY', 'price': prices.to_numpy()})
+    vix = pd.DataFrame({'time': vix.index + pd.Timedelta('16h'), 'symbol': '^VIX', 'price': vix.to_numpy()})
+    return pd.concat([spy, vix]).sort_values('time', kind='stable', ignore_index=True)
+
+
+def daily_tiers(monitor, feed):
+    """逐笔回放，记录每个交易日最后一笔行情后 SPY 的档位"""
+    tiers = {}
+    for tick in feed:
+        monitor.on_tick(tick)
+        tiers[tick.time.tz_localize(None).normalize()] = monitor._states['SPY'].tier
+    return pd.Series(tiers)
+
+
+@pytest.mark.parametrize('window', [1, 5, 60])
+def test_running_max_matches_rolling_pullback(window):
+    prices, _ = synthetic_days(300, seed=window)
+    high, _ = rolling_pullback(prices.to_frame('SPY'), window)
+    running = RunningMax(window)
+    got = []
+    for price in prices:
+        got.append(running.max)
+        running.push(price)
+    np.testing.assert_array_equal(np.array(got), high['SPY'].to_numpy())
+
+
+@pytest.mark.parametrize('pe', [15.0, 30.0])
+def test_replay_without_bands_matches_panel(tmp_path, pe):
+    prices, vix = synthetic_days()
+    path = tmp_path / 'ticks.csv'
+    replay_frame(prices, vix).to_csv(path, index=False)
+
+    got = daily_tiers(IntradayMonitor(['SPY'], pe=pe, bands=NO_BANDS, cooldown=pd.Timedelta(0)), ReplayFeed(str(path)))
+    expected = compute_signal_panel(prices.to_frame('SPY'), vix, pe)['tier']['SPY']
+    assert got.to_numpy().tolist() == expected.to_numpy().tolist()
+    # 样本中至少出现持有以外的两个档位，比较才有意义
+    assert len(set(expected) - {DEFAULT_RULES.hold}) >= 2
+
+
+@pytest.mark.parametrize('pe', [15.0, 30.0])
+def test_replay_hysteresis_only_differs_near_thresholds(pe):
+    prices, vix = synthetic_days()
+    frame = replay_frame(prices, vix)
+    plain = daily_tiers(IntradayMonitor(['SPY'], pe=pe, bands=NO_BANDS), ReplayFeed(frame))
+    banded = daily_tiers(IntradayMonitor(['SPY'], pe=pe), ReplayFeed(frame))
+
+    _, pullback = rolling_pullback(prices.to_frame('SPY'))
+    fields = {'vix': vix.to_numpy(), 'pullback': pullback['SPY'].to_numpy()}
+    bands = {'vix': 0.5, 'pullback': 0.25}
+    near = np.zeros(len(prices), dtype=bool)
+    for field, checks in DEFAULT_RULES.conditions.values():
+        if field in bands:
+            for _, threshold in checks:
+                near |= np.abs(fields[field] - threshold) <= bands[field]
+
+    differs = plain.to_numpy() != banded.to_numpy()
+    assert not (differs & ~near).any()
+    # 滞回不会增加档位切换次数
+    assert (np.diff(banded.to_numpy()) != 0).sum() <= (np.diff(plain.to_numpy()) != 0).sum()
+
+
+def test_hysteresis_keeps_tier_until_band_is_crossed():
+    # 61个交易日：前60日最高 100，最后一日跌到 75（回撤25%），当日 VIX 在 40 附近来回
+    dates = pd.bdate_range('2024-01-02', periods=61)
+    closes = pd.DataFrame({'SPY': [100.0] * 60 + [75.0]}, index=dates)
+    day = dates[-1]
+    ticks = pd.DataFrame({
+        'time': [day + pd.Timedelta(hours=10), day + pd.Timedelta(hours=10, minutes=1)]
+                + [day + pd.Timedelta(hours=11, minutes=m) for m in range(4)],
+        'symbol': ['SPY', '^VIX', '^VIX', '^VIX', '^VIX', '^VIX'],
+        'price': [75.0, 39.8, 40.2, 39.7, 39.4, 40.1],
+    })
+    alerts = []
+    monitor = IntradayMonitor(['SPY'], daily_closes=closes.iloc[:-1], pe=15.0, notify=alerts.append)
+    tiers = []
+    for tick in ReplayFeed(ticks):
+        monitor.on_tick(tick)
+        tiers.append(monitor._states['SPY'].tier)
+
+    # 39.8 未触发；升破 40 进入大量加仓；39.7 在滞回带内保持；39.4 跌出后解除；40.1 再次进入但在冷却期内不重复通知
+    assert tiers == [DEFAULT_RULES.hold, DEFAULT_RULES.hold, 0, 0, DEFAULT_RULES.hold, 0]
+    assert [alert.tier for alert in alerts] == [0]
+
+
+def test_scheduled_checks_share_one_monitor_per_session(monkeypatch):
+    import intraday_monitor
+    import market_data
+
+    dates = pd.bdate_range('2024-01-02', periods=60)
+    monkeypatch.setattr(market_data, 'get_daily_closes', lambda symbols, **kwargs: pd.DataFrame({'SPY': 100.0}, index=dates))
+    monkeypatch.setattr(market_data, 'get_sp500_pe', lambda: 15.0)
+    monkeypatch.setattr(intraday_monitor, '_resident', {})
+
+    quotes = {}
+
+    def download(symbols, **kwargs):
+        """分钟线替身：每次返回 quotes 中的最新一分钟"""
+        when = pd.DatetimeIndex([quotes['time']]).tz_localize(intraday_monitor.MARKET_TZ)
+        columns = pd.MultiIndex.from_product([['Close'], symbols])
+        return pd.DataFrame([[quotes[symbol] for symbol in symbols]], index=when, columns=columns)
+
+    def check(time, spy, vix):
+        quotes.update(time=pd.Timestamp(time), SPY=spy, **{'^VIX': vix})
+        return intraday_monitor.check(['SPY'], download=download, now=pd.Timestamp(time).tz_localize('America/New_York'))
+
+    day = dates[-1] + pd.offsets.BDay(1)
+    # 回撤25%、VIX 45、PE 15：大量加仓；之后几次检查档位不变，不重复通知
+    assert [alert.tier for alert in check(day + pd.Timedelta('10h'), 75.0, 45.0)] == [0]
+    assert check(day + pd.Timedelta('10h5min'), 74.0, 44.0) == []
+    assert check(day + pd.Timedelta('10h10min'), 76.0, 41.0) == []
+    monitor = intraday_monitor._resident[('SPY',)][1]
+
+    # 下一个交易日重建监控器（重新读取日线和PE）
+    next_day = day + pd.offsets.BDay(1)
+    check(next_day + pd.Timedelta('10h'), 99.0, 20.0)
+    assert intraday_monitor._resident[('SPY',)][1] is not monitor
@@ -0,0 +1,107 @@
+"""港股IPO流式抓取：翻页上限与断点、从断点继续、超出末页的旧断点、增量抓取遇到已知代號停止"""
+import json
+import os
+
+import pytest
+import requests
+
+import fixtures
+import hk_ipo_scraper
+from hk_ipo_scraper import crawl_to_store, load_checkpoint, load_ipo_store
+
+TOTAL_PAGES = 5
+ROWS = 10
+
+
+@pytest.fixture
+def server(monkeypatch):
+    pages = {p: fixtures.synthetic_ipo_page(p, ROWS, TOTAL_PAGES) for p in range(1, TOTAL_PAGES + 1)}
+    with fixtures.StandInServer(pages.items(), b'') as stand_in:
+        monkeypatch.setattr(hk_ipo_scraper, 'IPO_LIST_URL', stand_in.ipo_url)
+
+        # 离线环境：Session 方式的预热（访问 aastocks 主页）立即失败，未安装 selenium 时该方式被跳过，
+        # 超出末页的页只经 requests 方式请求一次
+        def offline(timeout=None):
+            raise requests.exceptions.ConnectionError("offline")
+        monkeypatch.setattr(hk_ipo_scraper, 'warm_up_session', offline)
+        yield stand_in
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'store.csv'), str(tmp_path / 'history')
+
+
+def crawl(server, paths, **kwargs):
+    """抓取一次，返回 (结果, 本次请求的页码)"""
+    server.requested.clear()
+    kwargs = {'incremental': False, 'max_workers': 2, 'requests_per_second': None, 'chunk_pages': 2, **kwargs}
+    store, added, updated, complete = crawl_to_store(*paths, **kwargs)
+    return (store, added, updated, complete), sorted(server.requested)
+
+
+def test_full_crawl_stops_at_last_page(server, paths):
+    (store, added, _, complete), requested = crawl(server, paths)
+    assert complete and added == TOTAL_PAGES * ROWS == len(store)
+    assert requested == list(range(1, TOTAL_PAGES + 1))
+    assert load_checkpoint(paths[0]) is None
+
+
+def test_page_cap_on_last_page_completes(server, paths):
+    (_, added, _, complete), _ = crawl(server, paths, max_pages=TOTAL_PAGES)
+    assert complete and added == TOTAL_PAGES * ROWS
+    assert load_checkpoint(paths[0]) is None
+
+
+def test_page_cap_saves_checkpoint_and_resume_removes_it(server, paths):
+    (_, added, _, complete), requested = crawl(server, paths, max_pages=2)
+    assert not complete and added == 2 * ROWS and requested == [1, 2]
+    checkpoint = load_checkpoint(paths[0])
+    assert checkpoint['next_page'] == 3 and checkpoint['added'] == 2 * ROWS
+
+    (store, added, _, complete), requested = crawl(server, paths)
+    assert complete and requested == [3, 4, 5]
+    # 断点中记录的新增数累计到本次结果，本地库完整且没有重复
+    assert added == TOTAL_PAGES * ROWS == len(store) == store['代號'].nunique()
+    assert load_checkpoint(paths[0]) is None
+
+
+def test_stale_checkpoint_past_last_page_is_removed(server, paths):
+    crawl(server, paths)
+    # 上次在末页之后的页中断（如末页之后的空页请求失败）留下的断点
+    with open(paths[0] + hk_ipo_scraper.CHECKPOINT_SUFFIX, 'w', encoding='utf-8') as f:
+        json.dump({'next_page': TOTAL_PAGES + 1, 'added': 0, 'updated': 0, 'incremental': False,
+                   'updated_at': '2026-10-01T00:00:00'}, f)
+
+    (_, _, _, complete), requested = crawl(server, paths)
+    assert complete
+    # 断点页失败后只回看前一页确认其为末页
+    assert requested == [TOTAL_PAGES, TOTAL_PAGES + 1]
+    assert not os.path.exists(paths[0] + hk_ipo_scraper.CHECKPOINT_SUFFIX)
+
+    _, requested = crawl(server, paths, max_pages=1)
+    assert requested == [1]
+
+
+def test_failed_page_keeps_checkpoint(server, paths, monkeypatch):
+    pages = {p: fixtures.synthetic_ipo_page(p, ROWS, TOTAL_PAGES) for p in (1, 2, 3, 5)}
+    with fixtures.StandInServer(pages.items(), b'') as broken:
+        monkeypatch.setattr(hk_ipo_scraper, 'IPO_LIST_URL', broken.ipo_url)
+        (_, added, _, complete), _ = crawl(broken, paths, max_workers=1)
+    assert not complete and added == 3 * ROWS
+    assert load_checkpoint(paths[0])['next_page'] == 4
+
+
+def test_incremental_crawl_stops_when_no_new_codes(server, paths):
+    crawl(server, paths)
+
+    (store, added, updated, complete), requested = crawl(server, paths, incremental=True)
+    assert complete and added == 0 and requested == [1]
+
+    # 删去最新的一页记录（第1页的代號），增量抓取在没有新代號的第2页停止
+    store = load_ipo_store(paths[0])
+    store.iloc[ROWS:].to_csv(paths[0], index=False, encoding='utf-8-sig')
+    (store, added, _, complete), requested = crawl(server, paths, incremental=True)
+    assert complete and added == ROWS and requested == [1, 2]
+    assert len(store) == TOTAL_PAGES * ROWS
+    assert load_checkpoint(paths[0]) is None
@@ -0,0 +1,71 @@
+"""多市场IPO抓取：纯配置（JSON）的数据源经共用引擎抓取为 IPO_SCHEMA，并可与代码定义的适配器同时抓取"""
+import json
+
+import pandas as pd
+import pytest
+
+import fixtures
+import hk_ipo_scraper
+from ipo_sources import IPO_SCHEMA, TableAdapter, crawl_sources, crawl_to_csv, load_adapters
+
+
+def calendar_source(base_url):
+    """与 ipo_sources 模块说明中的示例相同结构的纯配置数据源"""
+    return {
+        "name": "calendar_us", "market": "US", "url": base_url + "/calendar/listedipo.aspx?page={page_num}",
+        "header": ["Symbol"], "fields": {"代號": 0, "名稱": 1, "上市日期": 2, "上市價": 3, "首日表現": 4},
+        "code_pattern": "^([A-Z][A-Z.]*)$", "next_page_text": "Next", "prev_page_text": "Prev",
+        "date_format": "%m-%d-%Y", "unit_pattern": "[%+$\\s]", "requests_per_second": None,
+    }
+
+
+def write_config(path, sources):
+    path.write_text(json.dumps({"sources": sources}), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def calendar_server():
+    pages = {p: fixtures.synthetic_calendar_page(p, rows=20, total_pages=3) for p in range(1, 4)}
+    with fixtures.StandInServer(pages.items(), b'') as server:
+        yield server
+
+
+def test_json_only_source_crawls_into_schema(tmp_path, calendar_server):
+    [adapter] = load_adapters(write_config(tmp_path / 'sources.json', [calendar_source(calendar_server.base_url)]))
+    assert type(adapter) is TableAdapter
+
+    out = tmp_path / 'markets.csv'
+    counts = crawl_to_csv(str(out), [adapter], chunk_pages=2)
+    df = pd.read_csv(out, encoding='utf-8-sig', dtype={'代號': str})
+
+    assert counts == {'calendar_us': 60}
+    assert list(df.columns) == IPO_SCHEMA
+    assert (df['市場'] == 'US').all() and (df['數據源'] == 'calendar_us').all()
+    assert df['代號'].str.fullmatch('[A-Z]{3}').all() and df['代號'].is_unique
+    assert df['名稱'].str.startswith('Company ').all()
+    # 日期（MM/DD/YYYY）、价格（$）和百分比都转换成功，其他市场没有的字段为空
+    assert pd.to_datetime(df['上市日期']).notna().all()
+    assert df['上市價'].between(5, 40).all() and df['首日表現'].notna().all()
+    assert df['超額倍數'].isna().all()
+
+
+def test_json_and_code_adapters_crawl_together(tmp_path, calendar_server, monkeypatch):
+    hk_pages = {p: fixtures.synthetic_ipo_page(p, rows=10, total_pages=2) for p in range(1, 3)}
+    with fixtures.StandInServer(hk_pages.items(), b'') as hk_server:
+        monkeypatch.setattr(hk_ipo_scraper, 'IPO_LIST_URL', hk_server.ipo_url)
+        config = write_config(tmp_path / 'sources.json', [
+            {"name": "aastocks", "adapter": "hk_ipo_scraper:AastocksAdapter", "requests_per_second": None},
+            calendar_source(calendar_server.base_url),
+        ])
+        combined = crawl_sources(load_adapters(config))
+
+    assert list(combined.columns) == IPO_SCHEMA
+    assert combined.groupby('市場').size().to_dict() == {'HK': 20, 'US': 60}
+    assert combined.loc[combined['市場'] == 'HK', '超額倍數'].notna().all()
+
+
+def test_unknown_config_key_is_rejected(tmp_path):
+    source = dict(calendar_source('http://127.0.0.1'), colums={"代號": 0})
+    with pytest.raises(ValueError, match='colums'):
+        load_adapters(write_config(tmp_path / 'sources.json', [source]))
@@ -0,0 +1,131 @@
+"""行情缓存：按已收盘交易日判断是否过期、ttl 内不重复检查、盘中日线收盘后重新下载、淘汰时保留本次请求的代码"""
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import fixtures
+import market_data
+from market_data import MARKET_TZ, get_daily_bars, get_daily_closes
+
+
+def ny(text):
+    return pd.Timestamp(text, tz=MARKET_TZ)
+
+
+class FakeDownload:
+    """
+    替代 yf.download：返回截至 available 日（含）的日线，intraday 不为 None 时最后一根日线的收盘价为盘中价格
+    calls 记录每次请求的 (代码列表, start)
+    """
+
+    def __init__(self, available='2026-10-16'):
+        self.available = pd.Timestamp(available)
+        self.intraday = None
+        self.calls = []
+        self.closes = fixtures.synthetic_closes([f'S{i}' for i in range(10)] + ['SPY', '^VIX'], 300,
+                                                end='2026-10-30')
+
+    def __call__(self, tickers, start=None, progress=False, **kwargs):
+        self.calls.append((list(tickers), start))
+        closes = self.closes.loc[pd.Timestamp(start):self.available, list(tickers)].copy()
+        if self.intraday is not None:
+            closes.iloc[-1] = self.intraday
+        frames = {ticker: pd.DataFrame({'Close': closes[ticker], 'Open': closes[ticker]}) for ticker in tickers}
+        raw = pd.concat(frames, axis=1).swaplevel(0, 1, axis=1).sort_index(axis=1)
+        raw.columns.names = ['Price', 'Ticker']
+        return raw
+
+
+@pytest.fixture
+def download():
+    return FakeDownload()
+
+
+def bars(cache_dir, download, now, symbols=('SPY',), **kwargs):
+    return get_daily_bars(list(symbols), lookback_days=60, cache_dir=str(cache_dir), download=download,
+                          now=ny(now), **kwargs)
+
+
+def test_fresh_cache_is_not_downloaded_again(tmp_path, download):
+    first = bars(tmp_path, download, '2026-10-16 20:00')
+    again = bars(tmp_path, download, '2026-10-17 09:00')  # 周六：最近已收盘交易日仍为周五
+    assert len(download.calls) == 1
+    assert again['SPY'].index[-1] == first['SPY'].index[-1] == pd.Timestamp('2026-10-16')
+
+
+def test_stale_cache_downloads_from_last_cached_bar(tmp_path, download):
+    download.available = pd.Timestamp('2026-10-15')
+    bars(tmp_path, download, '2026-10-15 20:00')
+
+    download.available = pd.Timestamp('2026-10-16')
+    result = bars(tmp_path, download, '2026-10-16 20:00')
+    assert download.calls[-1] == (['SPY'], '2026-10-15')
+    assert result['SPY'].index[-1] == pd.Timestamp('2026-10-16')
+    assert result['SPY'].index.is_unique
+
+
+def test_missing_session_is_rechecked_only_after_ttl(tmp_path, download):
+    download.available = pd.Timestamp('2026-10-15')
+    bars(tmp_path, download, '2026-10-15 20:00')
+    # 数据源尚未更新 10-16 的日线（或为节假日）：ttl 内不再请求，超过 ttl 后再检查
+    bars(tmp_path, download, '2026-10-16 20:00')
+    bars(tmp_path, download, '2026-10-16 20:30')
+    assert len(download.calls) == 2
+    bars(tmp_path, download, '2026-10-16 21:30')
+    assert len(download.calls) == 3
+
+
+def test_intraday_bar_is_replaced_after_close(tmp_path, download):
+    download.intraday = 111.0
+    morning = bars(tmp_path, download, '2026-10-16 11:00')
+    assert morning['SPY'].loc['2026-10-16', 'Close'] == 111.0
+    meta = json.loads((tmp_path / 'meta.json').read_text(encoding='utf-8'))
+    assert meta['SPY']['partial'] == '2026-10-16'
+
+    # 收盘前：已包含最近已收盘交易日（10-15），不重新下载
+    bars(tmp_path, download, '2026-10-16 14:00')
+    assert len(download.calls) == 1
+
+    # 收盘后（即使在 ttl 内）：重新下载当日日线，覆盖盘中价格
+    download.intraday = None
+    evening = bars(tmp_path, download, '2026-10-16 16:30')
+    assert download.calls[-1] == (['SPY'], '2026-10-16')
+    assert evening['SPY'].loc['2026-10-16', 'Close'] == pytest.approx(download.closes.loc['2026-10-16', 'SPY'])
+    meta = json.loads((tmp_path / 'meta.json').read_text(encoding='utf-8'))
+    assert 'partial' not in meta['SPY']
+
+    bars(tmp_path, download, '2026-10-16 18:00')
+    assert len(download.calls) == 2
+
+
+def cached_symbols(cache_dir):
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(cache_dir / 'bars'))
+
+
+def test_eviction_keeps_symbols_of_the_current_call(tmp_path, download):
+    bars(tmp_path, download, '2026-10-16 20:00', ['S0', 'S1'], max_symbols=3)
+    # 一次请求的代码数超过上限：本次的代码全部保留，只淘汰更早使用的
+    result = bars(tmp_path, download, '2026-10-16 21:00', ['S2', 'S3', 'S4', 'S5'], max_symbols=3)
+    assert sorted(result) == ['S2', 'S3', 'S4', 'S5']
+    assert cached_symbols(tmp_path) == ['S2', 'S3', 'S4', 'S5']
+
+    bars(tmp_path, download, '2026-10-16 22:00', ['S6'], max_symbols=3)
+    remaining = cached_symbols(tmp_path)
+    assert len(remaining) == 3 and 'S6' in remaining
+
+
+def test_evict_skips_kept_and_valuation_entries(tmp_path):
+    meta = {symbol: {'used_at': f'2026-10-0{i + 1}T00:00:00'} for i, symbol in enumerate(['A', 'B', 'C', 'D'])}
+    meta[market_data.PE_SYMBOL] = {'checked_at': '2026-01-01T00:00:00'}
+    market_data._evict(str(tmp_path), meta, max_symbols=2, keep=['A'])
+    # A 最久未使用但在本次请求中；估值指标不计入代码数
+    assert sorted(meta) == sorted(['A', 'D', market_data.PE_SYMBOL])
+
+
+def test_get_daily_closes_aligns_symbols(tmp_path, download):
+    closes = get_daily_closes(['SPY', '^VIX'], lookback_days=60, cache_dir=str(tmp_path), download=download,
+                              now=ny('2026-10-16 20:00'))
+    assert list(closes.columns) == ['SPY', '^VIX'] and closes.index[-1] == pd.Timestamp('2026-10-16')
+    assert os.path.exists(tmp_path / 'bars' / '_VIX.csv')
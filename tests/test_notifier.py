@@ -0,0 +1,146 @@
+"""通知分发器：对本地 Server酱 替身服务器验证重试、去重和按接收人合并"""
+import http.server
+import json
+import threading
+from collections import Counter
+from urllib.parse import parse_qs
+
+import pytest
+import requests
+
+import notifier
+from notifier import NotificationDispatcher, ServerChanTransport
+
+
+class ServerChanStandIn:
+    """
+    本地替身：POST /<SendKey>.send，按 SendKey 决定响应
+    - ok：成功
+    - flaky：前两次返回 503，之后成功
+    - limited：总是 429
+    - badkey：200 但 code 非 0（不可重试）
+    - html：200 但响应不是JSON
+    """
+
+    def __init__(self):
+        self.requests = []
+        calls = Counter()
+        lock = threading.Lock()
+        recorded = self.requests
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                key = self.path.strip('/').removesuffix('.send')
+                form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+                with lock:
+                    calls[key] += 1
+                    count = calls[key]
+                    recorded.append((key, form['title'][0], form.get('desp', [''])[0]))
+                if key == 'limited' or (key == 'flaky' and count <= 2):
+                    status, body = (429 if key == 'limited' else 503), b'busy'
+                elif key == 'badkey':
+                    status, body = 200, json.dumps({'code': 40001, 'message': 'bad key'}).encode()
+                elif key == 'html':
+                    status, body = 200, b'<html>maintenance</html>'
+                else:
+                    status, body = 200, json.dumps({'code': 0, 'data': {'pushid': str(count)}}).encode()
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self._server.server_port}'
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def calls(self, key):
+        return sum(1 for k, _, _ in self.requests if k == key)
+
+
+@pytest.fixture
+def server():
+    with ServerChanStandIn() as stand_in:
+        yield stand_in
+
+
+def make_dispatcher(server, **kwargs):
+    return NotificationDispatcher(ServerChanTransport(server.base_url), max_retries=3, backoff=0,
+                                  timeout=5, session=requests.Session(), **kwargs)
+
+
+def test_retries_only_retryable_errors(server):
+    with make_dispatcher(server) as dispatcher:
+        for key in ('ok', 'flaky', 'limited', 'badkey', 'html'):
+            dispatcher.add('标题', f'内容 {key}', key)
+        results = {result.notification.send_key: result for result in dispatcher.flush()}
+
+    assert results['ok'].error is None and results['ok'].attempts == 1
+    assert results['flaky'].error is None and results['flaky'].attempts == 3
+    # 429 和非JSON响应可重试：首次 + max_retries 次后放弃
+    assert results['limited'].error is not None and results['limited'].attempts == 4
+    assert results['html'].error is not None and results['html'].attempts == 4
+    # code 非 0（如 SendKey 无效）不重试
+    assert results['badkey'].error is not None and results['badkey'].attempts == 1
+    for key, result in results.items():
+        assert server.calls(key) == result.attempts
+
+
+def test_duplicates_are_sent_once(server):
+    with make_dispatcher(server) as dispatcher:
+        assert dispatcher.add('标题', '内容', 'ok')
+        assert not dispatcher.add('标题', '内容', 'ok')
+        assert dispatcher.add('标题', '内容', 'flaky')
+        first = dispatcher.flush()
+        # 同一次运行中之后再加入相同通知也不会重发
+        assert not dispatcher.add('标题', '内容', 'ok')
+        assert dispatcher.flush() == []
+
+    assert [result.error for result in first] == [None, None]
+    assert server.calls('ok') == 1
+
+
+def test_notifications_are_merged_per_recipient(server):
+    with make_dispatcher(server) as dispatcher:
+        dispatcher.add('信号 A', '内容 A', 'ok')
+        dispatcher.add('信号 B', '内容 B', 'ok')
+        results = dispatcher.flush()
+
+    assert len(results) == 1 and results[0].error is None
+    [(key, title, content)] = server.requests
+    assert title == '信号 A（共2条）'
+    assert content.index('### 信号 A') < content.index('### 信号 B')
+
+
+def test_merge_can_be_disabled(server):
+    with make_dispatcher(server, merge=False) as dispatcher:
+        dispatcher.add('信号 A', '内容 A', 'ok')
+        dispatcher.add('信号 B', '内容 B', 'ok')
+        results = dispatcher.flush()
+
+    assert [result.error for result in results] == [None, None]
+    assert sorted(title for _, title, _ in server.requests) == ['信号 A', '信号 B']
+
+
+def test_shared_pool_grows_to_largest_concurrency(monkeypatch):
+    monkeypatch.setattr(notifier, '_shared_session', None)
+    monkeypatch.setattr(notifier, '_shared_pool_size', 0)
+
+    def pool_size(dispatcher):
+        return dispatcher.session.get_adapter('https://sctapi.ftqq.com')._pool_maxsize
+
+    small = NotificationDispatcher(max_concurrency=2)
+    large = NotificationDispatcher(max_concurrency=8)
+    assert large.session is small.session and pool_size(large) == 8
+    # 之后较小的并发数不会缩小连接池
+    assert pool_size(NotificationDispatcher(max_concurrency=4)) == 8
@@ -0,0 +1,53 @@
+"""规则表（strategy_rules.json）与原 vix-strategy.py 中 if/elif 判断链的一致性"""
+import numpy as np
+
+from signal_engine import DEFAULT_RULES
+
+
+def legacy_advice(curr_vix, pullback, curr_pe):
+    """原 vix-strategy.py 中的判断链（逐字保留条件）"""
+    vixcon1 = (30 < curr_vix < 40)
+    vixcon2 = (curr_vix >= 40)
+    pullbackcon1 = (5 < pullback <= 10)
+    pullbackcon2 = (10 < pullback <= 20)
+    pullbackcon3 = (pullback > 20)
+    pecon1 = (curr_pe < 20)
+    pecon3 = (curr_pe > 27)
+
+    if vixcon2 and pullbackcon3 and pecon1:
+        return "✅✅✅ 大量加仓"
+    elif vixcon1 and pullbackcon2 and pecon1:
+        return "✅✅ 适度加仓"
+    elif vixcon2 and pullbackcon3 and pecon3:
+        return "✅ 建议关注"
+    elif pecon3 and (vixcon1 or vixcon2) and pullbackcon1:
+        return "主动减仓"
+    return "当前不满足任何预设条件，建议持有"
+
+
+def random_cases(n, seed=0):
+    """随机取值，其中约一半取阈值本身，覆盖边界上的比较"""
+    rng = np.random.default_rng(seed)
+    vix = np.where(rng.random(n) < 0.5, rng.choice([30, 40], n), rng.uniform(10, 60, n))
+    pullback = np.where(rng.random(n) < 0.5, rng.choice([5, 10, 20], n), rng.uniform(0, 40, n))
+    pe = np.where(rng.random(n) < 0.5, rng.choice([20, 27], n), rng.uniform(10, 35, n))
+    return vix, pullback, pe
+
+
+def test_rule_table_matches_legacy_chain():
+    vix, pullback, pe = random_cases(2000)
+    _, tiers = DEFAULT_RULES.evaluate({'vix': vix, 'pullback': pullback, 'pe': pe})
+    advice = np.asarray(DEFAULT_RULES.labels, dtype=object)[tiers]
+    expected = [legacy_advice(*case) for case in zip(vix, pullback, pe)]
+    mismatches = [(case, got, want) for case, got, want in zip(zip(vix, pullback, pe), advice, expected)
+                  if got != want]
+    assert not mismatches, mismatches[:5]
+    # 随机样本覆盖到每一个档位
+    assert set(expected) == set(DEFAULT_RULES.labels)
+
+
+def test_missing_pe_never_matches_pe_conditions():
+    vix, pullback, _ = random_cases(200, seed=1)
+    conditions, tiers = DEFAULT_RULES.evaluate({'vix': vix, 'pullback': pullback, 'pe': np.full(200, np.nan)})
+    assert not any(conditions[name].any() for name in ('pecon1', 'pecon2', 'pecon3'))
+    assert (tiers == DEFAULT_RULES.hold).all()
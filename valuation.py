@@ -0,0 +1,296 @@
+"""
+估值指标（S&P 500 PE、Shiller CAPE、盈利收益率）的多数据源并发获取
+
+- 数据源在 valuation_sources.json 中配置（可用环境变量 VALUATION_SOURCES 指定其他文件），
+  每个数据源有自己的超时；所有指标的所有数据源同时发出请求
+- quorum 为 1 时取最先返回的有效值；大于 1 时等到 quorum 个数据源的值彼此相差不超过 tolerance，
+  取其中位数；任一指标满足条件后不再等待它其余较慢的数据源
+- 只解析需要的行：最新值只取表格第一行（或页面顶部的当前值），不用 pd.read_html 解析整张表
+- 数值超出合理范围（VALID_RANGES）视为解析错误；盈利收益率取不到时由 PE 推算（100 / PE）
+- 响应经 http_cache 条件请求，页面内容未变时直接使用上次的解析结果
+本模块只负责获取，按日期的历史序列由 market_data.get_valuation 缓存
+"""
+import html
+import json
+import math
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError, as_completed, wait
+from datetime import datetime
+
+import requests
+
+from http_cache import default_cache
+from instrumentation import metrics, progress
+
+
+SOURCES_PATH = os.environ.get('VALUATION_SOURCES',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'valuation_sources.json'))
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+DEFAULT_TIMEOUT = 8
+
+METRICS = ('pe', 'cape', 'earnings_yield')
+
+# 超出范围的值视为页面结构变化导致的解析错误
+VALID_RANGES = {'pe': (1, 200), 'cape': (1, 200), 'earnings_yield': (0.1, 50)}
+
+# 指标取不到时由其他指标推算：指标 -> (来源指标, 换算函数)
+DERIVED = {'earnings_yield': ('pe', lambda pe: 100 / pe)}
+
+Source = namedtuple('Source', ['name', 'metric', 'url', 'format', 'timeout'])
+
+# date 为 'YYYY-MM-DD'（页面没有日期时为 None）；source 为参与结果的数据源，agreed 为其个数
+Observation = namedtuple('Observation', ['metric', 'date', 'value', 'source', 'agreed'])
+
+_ROW = re.compile(rb'<tr[^>]*>\s*<td[^>]*>(.*?)</td>\s*<td[^>]*>(.*?)</td>', re.S | re.I)
+_CURRENT = re.compile(rb'id="current"[^>]*>(.*?)</div>', re.S | re.I)
+_TAG = re.compile(r'<[^>]+>')
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+
+
+def _cell_text(raw):
+    return html.unescape(_TAG.sub(' ', raw.decode('utf-8', errors='replace'))).strip()
+
+
+def _parse_value(text):
+    # 处理可能存在的换行符、特殊符号 (†) 和百分号
+    return float(text.replace('†', ' ').replace('%', ' ').split()[-1])
+
+
+def _parse_date(text):
+    try:
+        return datetime.strptime(' '.join(text.split()), '%b %d, %Y').strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def _parse_table_first_row(content):
+    """multpl.com 表格页：只取第一行数据（最新值）"""
+    match = _ROW.search(content)
+    if not match:
+        raise ValueError("页面中没有数据行")
+    return [_parse_date(_cell_text(match.group(1))), _parse_value(_cell_text(match.group(2)))]
+
+
+def _parse_table_rows(content):
+    """multpl.com 表格页：全部数据行 [[日期, 数值], ...]，跳过无法解析的行"""
+    rows = []
+    for match in _ROW.finditer(content):
+        date = _parse_date(_cell_text(match.group(1)))
+        try:
+            value = _parse_value(_cell_text(match.group(2)))
+        except (ValueError, IndexError):
+            continue
+        if date:
+            rows.append([date, value])
+    return rows
+
+
+def _parse_current(content):
+    """multpl.com 指标首页：页面顶部的当前值（没有日期）"""
+    match = _CURRENT.search(content)
+    if not match:
+        raise ValueError("页面中没有当前值")
+    # 形如 "Current S&P 500 PE Ratio: 31.12 -0.09 (-0.28%) 4:00 PM EDT"，取冒号后的第一个数
+    number = _NUMBER.search(_cell_text(match.group(1)).split(':', 1)[-1])
+    if not number:
+        raise ValueError("无法识别当前值")
+    return [None, float(number.group())]
+
+
+# 页面格式 -> (最新值解析函数, 历史解析函数或None)
+FORMATS = {
+    'multpl_table': (_parse_table_first_row, _parse_table_rows),
+    'multpl_current': (_parse_current, None),
+}
+
+
+def load_sources(path=SOURCES_PATH):
+    """读取数据源配置，返回 (数据源列表, 配置字典)"""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    sources = []
+    for spec in config['sources']:
+        if spec['metric'] not in METRICS:
+            raise ValueError(f"数据源 {spec['name']} 的指标未知: {spec['metric']}")
+        if spec['format'] not in FORMATS:
+            raise ValueError(f"数据源 {spec['name']} 的页面格式未知: {spec['format']}")
+        sources.append(Source(spec['name'], spec['metric'], spec['url'], spec['format'],
+                              float(spec.get('timeout', DEFAULT_TIMEOUT))))
+    return sources, config
+
+
+def _check_range(metric, value):
+    low, high = VALID_RANGES[metric]
+    if not (math.isfinite(value) and low <= value <= high):
+        raise ValueError(f"{metric} 数值超出合理范围: {value}")
+
+
+def _fetch(source, parse, name, cache=None):
+    cache = cache or default_cache()
+    response = cache.get(source.url, headers=HEADERS, timeout=source.timeout)
+    if response.status_code != 200:
+        raise requests.HTTPError(f"{source.name} 状态码: {response.status_code}")
+    return cache.parse(response, f'{source.name}_{name}', parse)
+
+
+def fetch_source(source, cache=None):
+    """请求一个数据源的最新值，返回 Observation"""
+    with metrics.timer('valuation_source', source=source.name):
+        date, value = _fetch(source, FORMATS[source.format][0], 'latest', cache)
+    _check_range(source.metric, value)
+    return Observation(source.metric, date, value, source.name, 1)
+
+
+def _agree(observations, quorum, tolerance):
+    """至少 quorum 个值与中位数相差不超过 tolerance（相对误差）时返回合并结果，否则返回 None"""
+    if len(observations) < quorum:
+        return None
+    values = sorted(o.value for o in observations)
+    median = values[len(values) // 2]
+    agreeing = [o for o in observations if abs(o.value - median) <= tolerance * abs(median)]
+    if len(agreeing) < quorum:
+        return None
+    return _combine(agreeing)
+
+
+def _combine(observations):
+    values = sorted(o.value for o in observations)
+    dates = [o.date for o in observations if o.date]
+    return Observation(observations[0].metric, max(dates) if dates else None, values[len(values) // 2],
+                       '+'.join(o.source for o in observations), len(observations))
+
+
+class ValuationFetcher:
+    """
+    并发请求各数据源，按指标取最快的有效值（或满足 quorum 的一致值）
+    用法：
+        fetcher = ValuationFetcher(*load_sources())
+        fetcher.fetch()             # {'pe': Observation(...), 'cape': ..., 'earnings_yield': ...}
+        fetcher.fetch(['pe'])
+    """
+
+    def __init__(self, sources, config=None, cache=None):
+        config = config or {}
+        self.sources = list(sources)
+        self.quorum = int(config.get('quorum', 1))
+        self.tolerance = float(config.get('tolerance', 0.02))
+        self.cache = cache
+
+    def fetch(self, metrics_wanted=None):
+        """
+        :param metrics_wanted: 要获取的指标（默认所有配置了数据源的指标）
+        :return: {指标: Observation}，只包含取到的指标
+        """
+        wanted = list(metrics_wanted or dict.fromkeys(s.metric for s in self.sources))
+        # 可推算的指标同时请求来源指标
+        requested = set(wanted) | {DERIVED[m][0] for m in wanted if m in DERIVED}
+        sources = [s for s in self.sources if s.metric in requested]
+        answers = {metric: [] for metric in requested}
+        results = {}
+        if not sources:
+            return {}
+
+        start = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix='valuation')
+        pending = {executor.submit(fetch_source, source, self.cache): source for source in sources}
+        try:
+            while pending and not requested <= set(results):
+                deadline = min(start + source.timeout for source in pending.values())
+                done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    source = pending.pop(future)
+                    try:
+                        observation = future.result()
+                    except Exception as e:
+                        metrics.count('valuation_attempts', source=source.name, result='error')
+                        progress(f"估值数据源 {source.name} 失败: {e}")
+                        continue
+                    metrics.count('valuation_attempts', source=source.name, result='ok')
+                    if source.metric in results:
+                        continue
+                    answers[source.metric].append(observation)
+                    agreed = _agree(answers[source.metric], self.quorum, self.tolerance)
+                    if agreed:
+                        results[source.metric] = agreed
+
+                now = time.monotonic()
+                for future, source in list(pending.items()):
+                    if source.metric in results or now >= start + source.timeout:
+                        del pending[future]
+                        future.cancel()
+                        if source.metric not in results:
+                            metrics.count('valuation_attempts', source=source.name, result='timeout')
+                            progress(f"估值数据源 {source.name} 超时（{source.timeout:g}秒）")
+        finally:
+            # 已经得到结果的请求不再等待，让它们在后台结束
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        # 数据源都已返回或超时仍不足 quorum 时，使用已有的值
+        for metric, observations in answers.items():
+            if metric not in results and observations:
+                results[metric] = _combine(observations)
+                print(f"⚠️ {metric} 只有 {len(observations)} 个数据源返回有效值，未达到 quorum={self.quorum}")
+
+        for metric in wanted:
+            if metric not in results and metric in DERIVED and DERIVED[metric][0] in results:
+                base = results[DERIVED[metric][0]]
+                results[metric] = Observation(metric, base.date, DERIVED[metric][1](base.value),
+                                              f'derived:{base.source}', base.agreed)
+        return {metric: results[metric] for metric in wanted if metric in results}
+
+    def fetch_history(self, metric, cache=None):
+        """请求能提供历史表格的数据源，返回最先成功的 [[日期, 数值], ...]（按页面顺序）"""
+        sources = [s for s in self.sources if s.metric == metric and FORMATS[s.format][1]]
+        if not sources:
+            raise ValueError(f"没有提供 {metric} 历史的数据源")
+        errors = []
+        executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix='valuation')
+        futures = {executor.submit(_fetch, s, FORMATS[s.format][1], 'history', cache or self.cache): s
+                   for s in sources}
+        try:
+            for future in as_completed(futures, timeout=max(s.timeout for s in sources)):
+                source = futures[future]
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    errors.append(f"{source.name}: {e}")
+                    continue
+                if rows:
+                    return rows
+                errors.append(f"{source.name}: 没有数据行")
+        except TimeoutError:
+            errors.append("请求超时")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        raise ValueError('；'.join(errors))
+
+
+_default_fetcher = None
+
+
+def default_fetcher():
+    """进程内共用的 ValuationFetcher（首次使用时读取 valuation_sources.json）"""
+    global _default_fetcher
+    if _default_fetcher is None:
+        _default_fetcher = ValuationFetcher(*load_sources())
+    return _default_fetcher
+
+
+def configure(path=SOURCES_PATH, sources=None, **config):
+    """
+    替换默认的 ValuationFetcher（如基准测试指向本地替身服务器）
+    :param sources: 直接指定数据源列表，此时不读取配置文件；其余关键字参数为 quorum / tolerance
+    """
+    global _default_fetcher
+    if sources is None:
+        sources, file_config = load_sources(path)
+        config = {**file_config, **config}
+    _default_fetcher = ValuationFetcher(sources, config)
+    return _default_fetcher